@@ -17,29 +17,64 @@ if "bpy" in locals():
     import importlib
     if "addon" in locals():
         importlib.reload(addon)
+    if "profiling" in locals():
+        importlib.reload(profiling)
     if "binary_io" in locals():
         importlib.reload(binary_io)
     if "yaz0" in locals():
         importlib.reload(yaz0)
     if "bfres_common" in locals():
         importlib.reload(bfres_common)
+    if "bfres_fmaa" in locals():
+        importlib.reload(bfres_fmaa)
+    if "bfres_fska" in locals():
+        importlib.reload(bfres_fska)
+    if "bfres_fvis" in locals():
+        importlib.reload(bfres_fvis)
     if "bfres_fmdl" in locals():
         importlib.reload(bfres_fmdl)
     if "bfres_embedded" in locals():
         importlib.reload(bfres_embedded)
     if "bfres_file" in locals():
         importlib.reload(bfres_file)
+    if "vertex_cache" in locals():
+        importlib.reload(vertex_cache)
+    if "bfres_writer" in locals():
+        importlib.reload(bfres_writer)
+    if "skeleton" in locals():
+        importlib.reload(skeleton)
+    if "geometry" in locals():
+        importlib.reload(geometry)
     if "importing" in locals():
         importlib.reload(importing)
     if "swizzle" in locals():
         importlib.reload(swizzle)
+    if "astc" in locals():
+        importlib.reload(astc)
+    if "bcn" in locals():
+        importlib.reload(bcn)
+    if "bptc" in locals():
+        importlib.reload(bptc)
     if "dds" in locals():
         importlib.reload(dds)
+    if "rgba" in locals():
+        importlib.reload(rgba)
+    if "texture_cache" in locals():
+        importlib.reload(texture_cache)
     if "bntx_extract" in locals():
         importlib.reload(bntx_extract)
+    if "batch_parse" in locals():
+        importlib.reload(batch_parse)
+    if "catalog" in locals():
+        importlib.reload(catalog)
 		
-import bpy
-from . import importing
+# The parsing modules can also be used without Blender, e.g. by the batch_parse command-line tool.
+try:
+    import bpy
+except ImportError:
+    bpy = None
+if bpy:
+    from . import importing
 
 
 def register():
@@ -1,28 +1,47 @@
-import bpy
 import os
+import tempfile
+try:
+    import bpy
+except ImportError:
+    bpy = None  # Only logging is available without Blender, the preferences are not defined.
 
 # ---- Preferences ----
 
-class BfresAddonPreferences(bpy.types.AddonPreferences):
-    bl_idname = __package__
-
-    def _get_tex_conv_path(self):
-        return self.tex_conv_path
-
-    def _set_tex_conv_path(self, value):
-        # Check if the selected path is the executable.
-        if os.path.isfile(value):
-            self.tex_conv_path = value
-        else:
-            raise AssertionError("The selected path is not the TexConv executable.")
-
-    # General
-    tex_conv_path = bpy.props.StringProperty()
-    tex_conv_path_ui = bpy.props.StringProperty(name="Texconv.exe Path", description="Path of the proprietary Texconv executable by Microsoft to convert BC5, BC7, and many more to png.", subtype='FILE_PATH', get=_get_tex_conv_path, set=_set_tex_conv_path)
-
-    def draw(self, context):
-        layout = self.layout
-        layout.prop(self, "tex_conv_path_ui")
+if bpy:
+    class BfresAddonPreferences(bpy.types.AddonPreferences):
+        bl_idname = __package__
+
+        def _get_tex_conv_path(self):
+            return self.tex_conv_path
+
+        def _set_tex_conv_path(self, value):
+            # Check if the selected path is the executable.
+            if os.path.isfile(value):
+                self.tex_conv_path = value
+            else:
+                raise AssertionError("The selected path is not the TexConv executable.")
+
+        # General
+        tex_conv_path = bpy.props.StringProperty()
+        tex_conv_path_ui = bpy.props.StringProperty(name="Texconv.exe Path", description="Path of the proprietary Texconv executable by Microsoft to convert BC5, BC7, and many more to png.", subtype='FILE_PATH', get=_get_tex_conv_path, set=_set_tex_conv_path)
+        # Texture Cache
+        tex_cache_path = bpy.props.StringProperty(name="Texture Cache Path", description="Folder storing decoded textures shared by all imported files. Uses the temporary folder if empty.", subtype='DIR_PATH')
+        tex_cache_size = bpy.props.IntProperty(name="Texture Cache Size (MB)", description="Size after which the least recently used textures are removed from the cache. 0 disables the cache.", min=0, default=2048)
+        # Profiling
+        profile_imports = bpy.props.BoolProperty(name="Profile Imports", description="Reports the time spent in each stage of an import.")
+        profile_trace_path = bpy.props.StringProperty(name="Trace File Path", description="JSON file to save the timeline of profiled imports to, which can be viewed in chrome://tracing. Not saved if empty.", subtype='FILE_PATH')
+
+        def draw(self, context):
+            layout = self.layout
+            layout.prop(self, "tex_conv_path_ui")
+            layout.prop(self, "tex_cache_path")
+            layout.prop(self, "tex_cache_size")
+            layout.prop(self, "profile_imports")
+            if self.profile_imports:
+                layout.prop(self, "profile_trace_path")
+
+        def get_tex_cache_path(self):
+            return self.tex_cache_path or os.path.join(tempfile.gettempdir(), "io_scene_bfres_textures")
 
 
 # ---- Methods & Mixins ----
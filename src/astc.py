@@ -0,0 +1,596 @@
+import functools
+import numpy
+
+'''
+ASTC compressed textures store blocks of 128 bits covering a footprint from 4x4 up to 12x12 texels. A block consists of:
+- A block mode (bits 0-10) giving the size of the weight grid, its quantization range and whether it has two weight
+  planes. Void-extent blocks instead store a single constant color.
+- The partition count (bits 11-12), the partition seed selecting a hashed partition pattern and the color endpoint
+  modes (CEM) of each partition.
+- The color endpoint values of all partitions and the weights, both stored with the bounded integer sequence encoding
+  (ISE) which packs values of a quantization range into bits, trits or quints. The weights are stored bit-reversed from
+  the end of the block.
+Blocks are not decoded one by one. The block modes, partition counts and endpoint modes of all blocks are read at once,
+then the blocks are grouped by their layout (block mode, partition count, number and range of the color values). Each
+group decodes the integer sequences, unquantizes the weights and endpoints, infills the weight grid and interpolates
+its texels with array operations for all of its blocks. Only the LDR profile is supported; HDR endpoints and malformed
+blocks decode to the error color (magenta).
+The result is an RGBA uint8 array of the shape (height, width, 4), with the first row being the top of the image.
+'''
+
+_COLOR_RANGES = [2, 3, 4, 5, 6, 8, 10, 12, 16, 20, 24, 32, 40, 48, 64, 80, 96, 128, 160, 192, 256]
+_WEIGHT_RANGES = [2, 3, 4, 5, 6, 8, 10, 12, 16, 20, 24, 32]
+_ERROR_COLOR = (0xFF, 0x00, 0xFF, 0xFF)
+_HDR_ENDPOINT_MODES = (2, 3, 7, 11, 14, 15)
+
+# Number of blocks decoded at once, limiting the memory needed for the unpacked bits.
+_CHUNK_SIZE = 0x8000
+
+
+# ---- Integer sequence encoding ----
+
+def _get_encoding(range_):
+    # Return the number of bits, and whether a trit or quint is stored additionally for each value of the range.
+    if range_ % 3 == 0:
+        return (range_ // 3).bit_length() - 1, True, False
+    elif range_ % 5 == 0:
+        return (range_ // 5).bit_length() - 1, False, True
+    return range_.bit_length() - 1, False, False
+
+
+def _get_ise_size(count, range_):
+    bits, trit, quint = _get_encoding(range_)
+    if trit:
+        return bits * count + (8 * count + 4) // 5
+    elif quint:
+        return bits * count + (7 * count + 2) // 3
+    return bits * count
+
+
+def _build_trits():
+    # Decode all 8-bit packings of 5 trits.
+    trits = numpy.zeros((256, 5), numpy.intp)
+    for t in range(256):
+        if (t >> 2) & 7 == 7:
+            c = ((t >> 5) << 2) | (t & 3)
+            t4 = t3 = 2
+        else:
+            c = t & 0x1F
+            if (t >> 5) & 3 == 3:
+                t4 = 2
+                t3 = t >> 7
+            else:
+                t4 = t >> 7
+                t3 = (t >> 5) & 3
+        if c & 3 == 3:
+            t2 = 2
+            t1 = c >> 4
+            t0 = (((c >> 3) & 1) << 1) | ((c >> 2) & 1 & ~(c >> 3))
+        elif (c >> 2) & 3 == 3:
+            t2 = t1 = 2
+            t0 = c & 3
+        else:
+            t2 = c >> 4
+            t1 = (c >> 2) & 3
+            t0 = (((c >> 1) & 1) << 1) | (c & 1 & ~(c >> 1))
+        trits[t] = (t0, t1, t2, t3, t4)
+    return trits
+
+
+def _build_quints():
+    # Decode all 7-bit packings of 3 quints.
+    quints = numpy.zeros((128, 3), numpy.intp)
+    for q in range(128):
+        if (q >> 1) & 3 == 3 and (q >> 5) & 3 == 0:
+            q2 = ((q & 1) << 2) | ((((q >> 4) & 1) & ~q & 1) << 1) | (((q >> 3) & 1) & ~q & 1)
+            q1 = q0 = 4
+        else:
+            if (q >> 1) & 3 == 3:
+                q2 = 4
+                c = (((q >> 3) & 3) << 3) | ((~(q >> 5) & 3) << 1) | (q & 1)
+            else:
+                q2 = (q >> 5) & 3
+                c = q & 0x1F
+            if c & 7 == 5:
+                q1 = 4
+                q0 = (c >> 3) & 3
+            else:
+                q1 = (c >> 3) & 3
+                q0 = c & 7
+        quints[q] = (q0, q1, q2)
+    return quints
+
+
+_TRITS = _build_trits()
+_QUINTS = _build_quints()
+
+
+@functools.lru_cache(maxsize=None)
+def _get_ise_layout(start, count, range_):
+    # Compute the bit positions of the value bits and the trit or quint packing bits of a sequence. Bits beyond the end
+    # of the sequence map to position 128, which is always 0.
+    bits, trit, quint = _get_encoding(range_)
+    end = start + _get_ise_size(count, range_)
+    value_positions = numpy.zeros((count, bits), numpy.intp)
+    packing_positions = []
+    if trit or quint:
+        group_size = 5 if trit else 3
+        # Number of packing bits following each value of a group.
+        packing_bits = (2, 2, 1, 2, 1) if trit else (3, 2, 2)
+        pos = start
+        for group in range((count + group_size - 1) // group_size):
+            positions = []
+            for i in range(group_size):
+                if group * group_size + i < count:
+                    value_positions[group * group_size + i] = numpy.arange(pos, pos + bits)
+                pos += bits
+                positions.extend(range(pos, pos + packing_bits[i]))
+                pos += packing_bits[i]
+            packing_positions.append(positions)
+    else:
+        value_positions[:] = start + numpy.arange(count)[:, None] * bits + numpy.arange(bits)
+    packing_positions = numpy.array(packing_positions, numpy.intp).reshape(-1, 8 if trit else 7)
+    packing_positions[packing_positions >= end] = 128
+    return value_positions, packing_positions
+
+
+def _decode_ise(bits, start, count, range_):
+    # Decode a sequence into values of the form (trit or quint) << bits | bits for all blocks.
+    value_positions, packing_positions = _get_ise_layout(start, count, range_)
+    value_bits, trit, quint = _get_encoding(range_)
+    values = bits[:, value_positions].astype(numpy.intp) @ (1 << numpy.arange(value_bits))
+    if trit or quint:
+        packing = bits[:, packing_positions].astype(numpy.intp) @ (1 << numpy.arange(packing_positions.shape[1]))
+        digits = (_TRITS if trit else _QUINTS)[packing].reshape(len(bits), -1)[:, :count]
+        values |= digits << value_bits
+    return values
+
+
+# ---- Unquantization ----
+
+def _replicate(value, bits, to_bits):
+    result = 0
+    shift = to_bits
+    while shift > 0:
+        shift -= bits
+        result |= value << shift if shift >= 0 else value >> -shift
+    return result
+
+
+def _unquantize_color(value, range_):
+    bits, trit, quint = _get_encoding(range_)
+    if not trit and not quint:
+        return _replicate(value, bits, 8)
+    m = value & ((1 << bits) - 1)
+    d = value >> bits
+    a = 0x1FF if m & 1 else 0
+    b = m >> 1
+    if bits == 1:
+        b_value, c = 0, 204 if trit else 113
+    elif bits == 2:
+        b_value, c = ((b << 8) | (b << 4) | (b << 2) | (b << 1), 93) if trit else ((b << 8) | (b << 3) | (b << 2), 54)
+    elif bits == 3:
+        b_value, c = ((b << 7) | (b << 2) | b, 44) if trit else ((b << 7) | (b << 1) | (b >> 1), 26)
+    elif bits == 4:
+        b_value, c = ((b << 6) | b, 22) if trit else ((b << 6) | (b >> 1), 13)
+    elif bits == 5:
+        b_value, c = ((b << 5) | (b >> 2), 11) if trit else ((b << 5) | (b >> 3), 6)
+    else:
+        b_value, c = (b << 4) | (b >> 4), 5
+    t = (d * c + b_value) ^ a
+    return (a & 0x80) | (t >> 2)
+
+
+def _unquantize_weight(value, range_):
+    bits, trit, quint = _get_encoding(range_)
+    if not trit and not quint:
+        result = _replicate(value, bits, 6)
+    elif bits == 0:
+        result = (0, 32, 63)[value] if trit else (0, 16, 32, 47, 63)[value]
+    else:
+        m = value & ((1 << bits) - 1)
+        d = value >> bits
+        a = 0x7F if m & 1 else 0
+        b = m >> 1
+        if bits == 1:
+            b_value, c = 0, 50 if trit else 28
+        elif bits == 2:
+            b_value, c = ((b << 6) | (b << 2) | b, 23) if trit else ((b << 6) | (b << 1), 13)
+        else:
+            b_value, c = (b << 5) | b, 11
+        t = (d * c + b_value) ^ a
+        result = (a & 0x20) | (t >> 2)
+    return result + 1 if result > 32 else result
+
+
+_COLOR_UNQUANTIZATION = [numpy.array([_unquantize_color(v, r) for v in range(r)], numpy.int32) for r in _COLOR_RANGES]
+_WEIGHT_UNQUANTIZATION = [numpy.array([_unquantize_weight(v, r) for v in range(r)], numpy.int32)
+                          for r in _WEIGHT_RANGES]
+
+
+def _build_color_ranges():
+    # Find the highest color range index fitting the given number of values into the given number of bits.
+    ranges = numpy.full((19, 129), -1, numpy.intp)
+    for count in range(2, 19, 2):
+        for index, range_ in enumerate(_COLOR_RANGES):
+            size = _get_ise_size(count, range_)
+            if size <= 128:
+                ranges[count, size:] = index
+    return ranges
+
+
+_COLOR_RANGE_INDICES = _build_color_ranges()
+
+
+# ---- Block modes ----
+
+def _decode_block_mode(mode):
+    # Return the weight grid width and height, whether there are two weight planes, and the weight range index, or
+    # None for reserved block modes.
+    a = (mode >> 5) & 3
+    r = (mode >> 4) & 1
+    h = (mode >> 9) & 1
+    d = (mode >> 10) & 1
+    if mode & 3:
+        r |= (mode & 3) << 1
+        b = (mode >> 7) & 3
+        layout = (mode >> 2) & 3
+        if layout == 0:
+            x, y = b + 4, a + 2
+        elif layout == 1:
+            x, y = b + 8, a + 2
+        elif layout == 2:
+            x, y = a + 2, b + 8
+        elif mode & 0x100:
+            x, y = (b & 1) + 2, a + 2
+        else:
+            x, y = a + 2, (b & 1) + 6
+    else:
+        r |= ((mode >> 2) & 3) << 1
+        if (mode >> 2) & 3 == 0:
+            return None
+        b = (mode >> 9) & 3
+        layout = (mode >> 7) & 3
+        if layout == 0:
+            x, y = 12, a + 2
+        elif layout == 1:
+            x, y = a + 2, 12
+        elif layout == 2:
+            x, y = a + 6, b + 6
+            d = h = 0
+        elif a == 0:
+            x, y = 6, 10
+        elif a == 1:
+            x, y = 10, 6
+        else:
+            return None
+    range_index = r - 2 + 6 * h
+    weight_count = x * y * (d + 1)
+    weight_bits = _get_ise_size(weight_count, _WEIGHT_RANGES[range_index])
+    if weight_count > 64 or not 24 <= weight_bits <= 96:
+        return None
+    return x, y, d, range_index
+
+
+def _build_block_modes():
+    modes = numpy.zeros((2048, 6), numpy.intp)  # valid, grid width, grid height, dual plane, weight range, weight bits
+    for mode in range(2048):
+        decoded = _decode_block_mode(mode)
+        if decoded:
+            x, y, d, range_index = decoded
+            weight_bits = _get_ise_size(x * y * (d + 1), _WEIGHT_RANGES[range_index])
+            modes[mode] = (1, x, y, d, range_index, weight_bits)
+    return modes
+
+
+_BLOCK_MODES = _build_block_modes()
+
+
+@functools.lru_cache(maxsize=None)
+def _get_infill_matrix(block_width, block_height, grid_width, grid_height):
+    # Compute the bilinear weights of the grid points contributing to each texel, scaled by 16.
+    matrix = numpy.zeros((block_width * block_height, grid_width * grid_height + grid_width + 1), numpy.int32)
+    ds = (1024 + block_width // 2) // (block_width - 1)
+    dt = (1024 + block_height // 2) // (block_height - 1)
+    for t in range(block_height):
+        for s in range(block_width):
+            gs = (ds * s * (grid_width - 1) + 32) >> 6
+            gt = (dt * t * (grid_height - 1) + 32) >> 6
+            fs = gs & 0xF
+            ft = gt & 0xF
+            v0 = (gs >> 4) + (gt >> 4) * grid_width
+            w11 = (fs * ft + 8) >> 4
+            texel = t * block_width + s
+            matrix[texel, v0] += 16 - fs - ft + w11
+            matrix[texel, v0 + 1] += fs - w11
+            matrix[texel, v0 + grid_width] += ft - w11
+            matrix[texel, v0 + grid_width + 1] += w11
+    return numpy.ascontiguousarray(matrix[:, :grid_width * grid_height].T)
+
+
+# ---- Decoding ----
+
+def decode_astc(data, width, height, block_width, block_height, srgb=False):
+    blocks_x = (width + block_width - 1) // block_width
+    blocks_y = (height + block_height - 1) // block_height
+    count = blocks_x * blocks_y
+    blocks = numpy.frombuffer(data, numpy.uint8, count * 16).reshape(count, 16)
+    texels = numpy.empty((count, block_width * block_height, 4), numpy.uint8)
+    for start in range(0, count, _CHUNK_SIZE):
+        texels[start:start + _CHUNK_SIZE] = _decode_blocks(blocks[start:start + _CHUNK_SIZE], block_width,
+                                                           block_height, srgb)
+    # Reorder the texels of all blocks into rows of the image and crop the padding.
+    image = texels.reshape(blocks_y, blocks_x, block_height, block_width, 4).swapaxes(1, 2)
+    image = image.reshape(blocks_y * block_height, blocks_x * block_width, 4)
+    return numpy.ascontiguousarray(image[:height, :width])
+
+
+def _decode_blocks(blocks, block_width, block_height, srgb):
+    count = len(blocks)
+    result = numpy.empty((count, block_width * block_height, 4), numpy.uint8)
+    result[:] = _ERROR_COLOR
+    # Unpack the bits of each block, padded with zeros which positions past a sequence end can point to.
+    bits = numpy.zeros((count, 136), numpy.uint8)
+    bits[:, :128] = ((blocks[:, :, None] >> numpy.arange(8, dtype=numpy.uint8)) & 1).reshape(count, 128)
+    modes = _read_field(bits, 0, 11)
+    # Void-extent blocks store a constant 16-bit UNORM color. HDR void-extent blocks are errors in the LDR profile.
+    void_extent = (modes & 0x1FF) == 0x1FC
+    ldr_void_extent = numpy.flatnonzero(void_extent & (bits[:, 9] == 0))
+    if len(ldr_void_extent):
+        colors = blocks[ldr_void_extent, 8:16].copy().view("<u2") >> 8
+        result[ldr_void_extent] = colors[:, None, :]
+    # Read the block mode properties.
+    valid, grid_width, grid_height, dual_plane, weight_range, weight_bits = _BLOCK_MODES[modes].T
+    valid = (valid == 1) & ~void_extent & (grid_width <= block_width) & (grid_height <= block_height)
+    partition_count = _read_field(bits, 11, 2) + 1
+    valid &= ~(dual_plane.astype(bool) & (partition_count == 4))
+    # Read the color endpoint modes. Multiple partitions either share one mode, or store a base class with per
+    # partition offsets, partially in extra bits below the weights.
+    single = partition_count == 1
+    encoded_modes = numpy.where(single, _read_field(bits, 13, 4), _read_field(bits, 23, 6))
+    shared = single | ((encoded_modes & 3) == 0)
+    extra_bits = numpy.where(shared, 0, 3 * partition_count - 4)
+    extra_pos = 128 - weight_bits - extra_bits
+    extra = _read_varying_field(bits, extra_pos, extra_bits)
+    endpoint_modes = numpy.zeros((count, 4), numpy.intp)
+    endpoint_modes[:] = numpy.where(single, encoded_modes, encoded_modes >> 2)[:, None]
+    packed = (encoded_modes >> 2) | (extra << 4)
+    base_class = (encoded_modes & 3) - 1
+    for partition in range(4):
+        c = (packed >> partition) & 1
+        m = (packed >> (partition_count + 2 * partition)) & 3
+        endpoint_modes[:, partition] = numpy.where(shared, endpoint_modes[:, partition], ((base_class + c) << 2) | m)
+    in_use = numpy.arange(4) < partition_count[:, None]
+    endpoint_modes[~in_use] = 0
+    # HDR endpoint modes are errors in the LDR profile.
+    hdr = (endpoint_modes[:, :, None] == _HDR_ENDPOINT_MODES).any(axis=2)
+    valid &= ~(hdr & in_use).any(axis=1)
+    # Find the range of the color values fitting into the remaining bits.
+    color_count = (((endpoint_modes >> 2) + 1) * 2 * in_use).sum(axis=1)
+    color_start = numpy.where(single, 17, 29)
+    color_bits = 128 - weight_bits - color_start - extra_bits - 2 * dual_plane
+    valid &= color_count <= 18
+    color_range = _COLOR_RANGE_INDICES[numpy.minimum(color_count, 18), numpy.clip(color_bits, 0, 128)]
+    valid &= color_range >= 4
+    # Read the color component selector of the second weight plane and the partition seed.
+    plane_channels = _read_varying_field(bits, extra_pos - 2, 2 * dual_plane)
+    seeds = _read_field(bits, 13, 10)
+    # Decode the groups of blocks sharing the same layout.
+    keys = modes | (partition_count << 11) | (color_count << 14) | (color_range << 19)
+    group_keys, group_indices = numpy.unique(keys[valid], return_inverse=True)
+    valid_blocks = numpy.flatnonzero(valid)
+    for i, key in enumerate(group_keys):
+        group = valid_blocks[group_indices.ravel() == i]
+        first = group[0]
+        result[group] = _decode_group(bits[group], block_width, block_height, srgb, grid_width[first],
+                                      grid_height[first], dual_plane[first], weight_range[first],
+                                      partition_count[first], color_start[first], color_count[first],
+                                      color_range[first], endpoint_modes[group], plane_channels[group], seeds[group])
+    return result
+
+
+def _decode_group(bits, block_width, block_height, srgb, grid_width, grid_height, dual_plane, weight_range,
+                  partition_count, color_start, color_count, color_range, endpoint_modes, plane_channels, seeds):
+    count = len(bits)
+    rows = numpy.arange(count)[:, None]
+    # Decode the weights, stored in reverse bit order from the end of the block, and infill them to the texels.
+    reversed_bits = numpy.zeros_like(bits)
+    reversed_bits[:, :128] = bits[:, 127::-1]
+    planes = dual_plane + 1
+    weights = _decode_ise(reversed_bits, 0, grid_width * grid_height * planes, _WEIGHT_RANGES[weight_range])
+    weights = _WEIGHT_UNQUANTIZATION[weight_range][weights].reshape(count, grid_width * grid_height, planes)
+    infill = _get_infill_matrix(block_width, block_height, grid_width, grid_height)
+    weights = (numpy.einsum("ngp,gt->ntp", weights, infill) + 8) >> 4
+    # Decode the color values and the endpoints of each partition.
+    values = _decode_ise(bits, color_start, color_count, _COLOR_RANGES[color_range])
+    values = _COLOR_UNQUANTIZATION[color_range][values]
+    endpoints = _decode_endpoints(values, endpoint_modes, partition_count)
+    # Find the partition of each texel and interpolate the endpoints of it.
+    if partition_count > 1:
+        partitions = _select_partitions(seeds, partition_count, block_width, block_height)
+    else:
+        partitions = numpy.zeros((count, block_width * block_height), numpy.intp)
+    endpoint0 = endpoints[rows, partitions, 0]
+    endpoint1 = endpoints[rows, partitions, 1]
+    # Expand the endpoints to 16 bits. sRGB endpoints are not replicated but centered.
+    if srgb:
+        endpoint0 = (endpoint0 << 8) | 0x80
+        endpoint1 = (endpoint1 << 8) | 0x80
+    else:
+        endpoint0 = endpoint0 * 0x101
+        endpoint1 = endpoint1 * 0x101
+    # The channel selected for the second plane uses its weights.
+    if dual_plane:
+        weights = numpy.where(numpy.arange(4) == plane_channels[:, None, None], weights[:, :, 1:2],
+                              weights[:, :, 0:1])
+    texels = (endpoint0 * (64 - weights) + endpoint1 * weights + 32) >> 6
+    return (texels >> 8).astype(numpy.uint8)
+
+
+def _decode_endpoints(values, endpoint_modes, partition_count):
+    # Return the endpoints of the shape (blocks, 4 partitions, 2 endpoints, 4 channels).
+    count = len(values)
+    # Gather the (up to 8) values of each partition, as the value count of previous partitions varies by mode.
+    value_counts = ((endpoint_modes >> 2) + 1) * 2
+    value_counts[:, partition_count:] = 0
+    offsets = numpy.cumsum(value_counts, axis=1) - value_counts
+    padded = numpy.zeros((count, 26), numpy.int32)
+    padded[:, :values.shape[1]] = values
+    v = padded[numpy.arange(count)[:, None, None], offsets[:, :, None] + numpy.arange(8)].reshape(-1, 8)
+    modes = endpoint_modes.ravel()
+    e0 = numpy.zeros((len(v), 4), numpy.int32)
+    e1 = numpy.zeros((len(v), 4), numpy.int32)
+    for mode in numpy.unique(modes):
+        m = modes == mode
+        e0[m], e1[m] = _ENDPOINT_DECODERS[mode](v[m])
+    endpoints = numpy.stack((e0, e1), axis=1).clip(0, 0xFF)
+    return endpoints.reshape(count, 4, 2, 4)
+
+
+def _bit_transfer_signed(a, b):
+    b = (b >> 1) | (a & 0x80)
+    a = (a >> 1) & 0x3F
+    a = numpy.where(a & 0x20, a - 0x40, a)
+    return a, b
+
+
+def _blue_contract(r, g, b, a):
+    return numpy.stack(((r + b) >> 1, (g + b) >> 1, b, a), axis=1)
+
+
+def _rgba(r, g, b, a):
+    return numpy.stack((r, g, b, a), axis=1)
+
+
+def _decode_luminance_direct(v):
+    full = numpy.full(len(v), 0xFF)
+    return _rgba(v[:, 0], v[:, 0], v[:, 0], full), _rgba(v[:, 1], v[:, 1], v[:, 1], full)
+
+
+def _decode_luminance_delta(v):
+    full = numpy.full(len(v), 0xFF)
+    l0 = (v[:, 0] >> 2) | (v[:, 1] & 0xC0)
+    l1 = numpy.minimum(l0 + (v[:, 1] & 0x3F), 0xFF)
+    return _rgba(l0, l0, l0, full), _rgba(l1, l1, l1, full)
+
+
+def _decode_luminance_alpha_direct(v):
+    return _rgba(v[:, 0], v[:, 0], v[:, 0], v[:, 2]), _rgba(v[:, 1], v[:, 1], v[:, 1], v[:, 3])
+
+
+def _decode_luminance_alpha_delta(v):
+    d0, b0 = _bit_transfer_signed(v[:, 1], v[:, 0])
+    d1, b1 = _bit_transfer_signed(v[:, 3], v[:, 2])
+    l1 = b0 + d0
+    return _rgba(b0, b0, b0, b1), _rgba(l1, l1, l1, b1 + d1)
+
+
+def _decode_rgb_scale(v):
+    full = numpy.full(len(v), 0xFF)
+    scale = v[:, 3]
+    return (_rgba((v[:, 0] * scale) >> 8, (v[:, 1] * scale) >> 8, (v[:, 2] * scale) >> 8, full),
+            _rgba(v[:, 0], v[:, 1], v[:, 2], full))
+
+
+def _decode_rgb_scale_alpha(v):
+    scale = v[:, 3]
+    return (_rgba((v[:, 0] * scale) >> 8, (v[:, 1] * scale) >> 8, (v[:, 2] * scale) >> 8, v[:, 4]),
+            _rgba(v[:, 0], v[:, 1], v[:, 2], v[:, 5]))
+
+
+def _decode_rgba_direct(v, alpha=True):
+    a0 = v[:, 6] if alpha else numpy.full(len(v), 0xFF)
+    a1 = v[:, 7] if alpha else numpy.full(len(v), 0xFF)
+    # Endpoints are swapped and blue contracted if the second one is darker.
+    contract = (v[:, 1] + v[:, 3] + v[:, 5] < v[:, 0] + v[:, 2] + v[:, 4])[:, None]
+    e0 = _rgba(v[:, 0], v[:, 2], v[:, 4], a0)
+    e1 = _rgba(v[:, 1], v[:, 3], v[:, 5], a1)
+    return (numpy.where(contract, _blue_contract(v[:, 1], v[:, 3], v[:, 5], a1), e0),
+            numpy.where(contract, _blue_contract(v[:, 0], v[:, 2], v[:, 4], a0), e1))
+
+
+def _decode_rgba_delta(v, alpha=True):
+    dr, r = _bit_transfer_signed(v[:, 1], v[:, 0])
+    dg, g = _bit_transfer_signed(v[:, 3], v[:, 2])
+    db, b = _bit_transfer_signed(v[:, 5], v[:, 4])
+    if alpha:
+        da, a = _bit_transfer_signed(v[:, 7], v[:, 6])
+    else:
+        da, a = numpy.zeros(len(v), numpy.int32), numpy.full(len(v), 0xFF)
+    # Endpoints are swapped and blue contracted if the deltas are negative.
+    contract = (dr + dg + db < 0)[:, None]
+    e0 = _rgba(r, g, b, a)
+    e1 = _rgba(r + dr, g + dg, b + db, a + da)
+    return (numpy.where(contract, _blue_contract(r + dr, g + dg, b + db, a + da), e0),
+            numpy.where(contract, _blue_contract(r, g, b, a), e1))
+
+
+_ENDPOINT_DECODERS = {
+    0: _decode_luminance_direct,
+    1: _decode_luminance_delta,
+    4: _decode_luminance_alpha_direct,
+    5: _decode_luminance_alpha_delta,
+    6: _decode_rgb_scale,
+    8: lambda v: _decode_rgba_direct(v, False),
+    9: lambda v: _decode_rgba_delta(v, False),
+    10: _decode_rgb_scale_alpha,
+    12: _decode_rgba_direct,
+    13: _decode_rgba_delta,
+}
+
+
+def _hash52(p):
+    p = p.astype(numpy.uint32)
+    p ^= p >> 15
+    p -= p << 17
+    p += p << 7
+    p += p << 4
+    p ^= p >> 5
+    p += p << 16
+    p ^= p >> 7
+    p ^= p >> 3
+    p ^= p << 6
+    p ^= p >> 17
+    return p
+
+
+def _select_partitions(seeds, partition_count, block_width, block_height):
+    # Evaluate the partition hash function for all texels of all blocks.
+    texels = numpy.arange(block_width * block_height, dtype=numpy.int64)
+    y = texels // block_width
+    x = texels % block_width
+    if block_width * block_height < 31:
+        x = x << 1
+        y = y << 1
+    seeds = seeds.astype(numpy.int64) + (partition_count - 1) * 1024
+    rnum = _hash52(seeds).astype(numpy.int64)
+    s = [((rnum >> shift) & 0xF) ** 2 for shift in (0, 4, 8, 12, 16, 20, 24, 28, 18, 22, 26)]
+    s.append((((rnum >> 30) | (rnum << 2)) & 0xF) ** 2)
+    odd = (seeds & 1) == 1
+    sh1 = numpy.where(odd, numpy.where(seeds & 2, 4, 5), 6 if partition_count == 3 else 5)
+    sh2 = numpy.where(odd, 6 if partition_count == 3 else 5, numpy.where(seeds & 2, 4, 5))
+    sh3 = numpy.where(seeds & 0x10, sh1, sh2)
+    shifts = (sh1, sh2, sh1, sh2, sh1, sh2, sh1, sh2, sh3, sh3, sh3, sh3)
+    s = [(seed >> shift)[:, None] for seed, shift in zip(s, shifts)]
+    # The z coordinate is always 0 for 2D textures, so seeds 11, 12, 9 and 10 do not contribute.
+    a = (s[0] * x + s[1] * y + (rnum >> 14)[:, None]) & 0x3F
+    b = (s[2] * x + s[3] * y + (rnum >> 10)[:, None]) & 0x3F
+    c = (s[4] * x + s[5] * y + (rnum >> 6)[:, None]) & 0x3F
+    d = (s[6] * x + s[7] * y + (rnum >> 2)[:, None]) & 0x3F
+    if partition_count < 4:
+        d = numpy.zeros_like(d)
+    if partition_count < 3:
+        c = numpy.zeros_like(c)
+    return numpy.where((a >= b) & (a >= c) & (a >= d), 0, numpy.where((b >= c) & (b >= d), 1, numpy.where(c >= d, 2, 3)))
+
+
+def _read_field(bits, pos, count):
+    # Read a field of the given bit count at the same position of all blocks.
+    return bits[:, pos:pos + count].astype(numpy.intp) @ (1 << numpy.arange(count))
+
+
+def _read_varying_field(bits, pos, count):
+    # Read fields of up to 8 bits at a different position and with a different bit count for each block.
+    offsets = numpy.arange(8)
+    positions = numpy.where(offsets < count[:, None], pos[:, None] + offsets, 128).clip(0, 128)
+    return bits[numpy.arange(len(bits))[:, None], positions].astype(numpy.intp) @ (1 << offsets)
@@ -0,0 +1,87 @@
+import argparse
+import concurrent.futures
+import contextlib
+import os
+import sys
+import time
+from . import bfres_file
+from . import bntx_extract
+
+'''
+Parses all BFRES and SZS files in a directory tree without Blender, to validate the parser or pre-process a game dump:
+    python -m io_scene_bfres.batch_parse <directory> [--textures] [--processes N]
+The files are parsed in a process pool, scheduling the largest files first so that no single big file is left running at
+the end. The throughput and the error of each failed file are reported.
+'''
+
+_EXTENSIONS = (".bfres", ".szs")
+
+
+def find_files(directory):
+    # Return (size, path) tuples of all BFRES and SZS files in the directory tree, the largest first.
+    files = []
+    for root, _, names in os.walk(directory):
+        for name in names:
+            if name.lower().endswith(_EXTENSIONS):
+                path = os.path.join(root, name)
+                files.append((os.path.getsize(path), path))
+    files.sort(reverse=True)
+    return files
+
+
+def parse_file(path, textures=False, verbose=False):
+    # Parse the file and optionally decode all textures, returning (path, seconds, error or None). The parser output is
+    # suppressed unless verbose.
+    start_time = time.perf_counter()
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(sys.stdout if verbose else devnull):
+            bfres = bfres_file.BfresFile(bfres_file.read_file_data(path))
+            if textures:
+                for bntx in bfres.bntx_files:
+                    index = bntx_extract.readBNTX(bntx)
+                    for name in index:
+                        bntx_extract.decodeTexture(index.get(name))
+    except Exception as e:
+        return path, time.perf_counter() - start_time, "{}: {}".format(type(e).__name__, e)
+    return path, time.perf_counter() - start_time, None
+
+
+def parse_files(files, textures=False, processes=None, verbose=False):
+    # Parse the (size, path) tuples in a process pool in the given order, yielding the result of each file when done.
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [executor.submit(parse_file, path, textures, verbose) for _, path in files]
+        for future in concurrent.futures.as_completed(futures):
+            yield future.result()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parse all BFRES and SZS files in a directory tree.")
+    parser.add_argument("directory", help="directory to search for files recursively")
+    parser.add_argument("--textures", action="store_true", help="also decode all embedded textures")
+    parser.add_argument("--processes", type=int, help="number of worker processes (default: CPU count)")
+    parser.add_argument("--verbose", action="store_true", help="print the parser output")
+    args = parser.parse_args(argv)
+
+    files = find_files(args.directory)
+    total_size = sum(size for size, _ in files)
+    print("Parsing {} files ({:.1f} MB)...".format(len(files), total_size / 1024 / 1024))
+    start_time = time.perf_counter()
+    failures = []
+    for i, (path, seconds, error) in enumerate(parse_files(files, args.textures, args.processes, args.verbose)):
+        if error:
+            failures.append((path, error))
+            print("[{}/{}] FAILED {}: {}".format(i + 1, len(files), path, error))
+        elif args.verbose:
+            print("[{}/{}] {} ({:.2f} s)".format(i + 1, len(files), path, seconds))
+    elapsed = time.perf_counter() - start_time
+
+    print("Parsed {} files in {:.2f} s ({:.1f} files/s, {:.1f} MB/s), {} failed.".format(
+        len(files), elapsed, len(files) / elapsed if elapsed else 0, total_size / 1024 / 1024 / elapsed if elapsed else 0,
+        len(failures)))
+    for path, error in failures:
+        print("  {}: {}".format(path, error))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
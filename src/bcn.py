@@ -0,0 +1,136 @@
+import numpy
+
+'''
+BCn compressed textures (also known as S3TC, DXTn and RGTC) store the texels in blocks of 4x4, each 8 or 16 bytes long.
+Every block encodes two endpoints and per-texel indices selecting a value interpolated between those endpoints:
+- BC1: RGB565 color block (2 endpoints, 2-bit indices), with an optional 1-bit alpha mode if endpoint 0 <= endpoint 1.
+- BC2: 4-bit explicit alpha values, followed by a BC1 color block always using the 4 color mode.
+- BC3: BC4 block for the alpha channel, followed by a BC1 color block always using the 4 color mode.
+- BC4: single channel block (2 8-bit endpoints, 3-bit indices).
+- BC5: two BC4 blocks for the red and green channel.
+The decoders do not iterate over blocks. They read all blocks of a (deswizzled) surface into NumPy arrays, interpolate
+the palettes of every block at once, unpack the indices of every texel and look them up in one step. The result is an
+RGBA uint8 array of the shape (height, width, 4), with the first row being the top of the image.
+'''
+
+
+def decode_bc1(data, width, height):
+    blocks = _read_blocks(data, width, height, 8)
+    return _blocks_to_image(_decode_color_blocks(blocks, True), width, height)
+
+
+def decode_bc2(data, width, height):
+    blocks = _read_blocks(data, width, height, 16)
+    texels = _decode_color_blocks(blocks[:, 8:], False)
+    # Alpha is stored as 4-bit values for each texel, which are expanded to 8 bits.
+    alpha = numpy.empty((len(blocks), 16), numpy.uint8)
+    alpha[:, 0::2] = blocks[:, :8] & 0x0F
+    alpha[:, 1::2] = blocks[:, :8] >> 4
+    texels[:, :, 3] = alpha * 0x11
+    return _blocks_to_image(texels, width, height)
+
+
+def decode_bc3(data, width, height):
+    blocks = _read_blocks(data, width, height, 16)
+    texels = _decode_color_blocks(blocks[:, 8:], False)
+    texels[:, :, 3] = _decode_channel_blocks(blocks[:, :8], False)
+    return _blocks_to_image(texels, width, height)
+
+
+def decode_bc4(data, width, height, signed=False):
+    blocks = _read_blocks(data, width, height, 8)
+    texels = numpy.zeros((len(blocks), 16, 4), numpy.uint8)
+    texels[:, :, 0] = _decode_channel_blocks(blocks, signed)
+    texels[:, :, 3] = 0xFF
+    return _blocks_to_image(texels, width, height)
+
+
+def decode_bc5(data, width, height, signed=False):
+    blocks = _read_blocks(data, width, height, 16)
+    texels = numpy.zeros((len(blocks), 16, 4), numpy.uint8)
+    texels[:, :, 0] = _decode_channel_blocks(blocks[:, :8], signed)
+    texels[:, :, 1] = _decode_channel_blocks(blocks[:, 8:], signed)
+    texels[:, :, 3] = 0xFF
+    return _blocks_to_image(texels, width, height)
+
+
+def _read_blocks(data, width, height, block_size):
+    # Return the blocks as an array of the shape (block count, block size) without copying the data.
+    count = ((width + 3) // 4) * ((height + 3) // 4)
+    return numpy.frombuffer(data, numpy.uint8, count * block_size).reshape(count, block_size)
+
+
+def _blocks_to_image(texels, width, height):
+    # Reorder the (block count, 16, channels) texels of all blocks into rows of the image and crop the padding.
+    blocks_x = (width + 3) // 4
+    blocks_y = (height + 3) // 4
+    channels = texels.shape[-1]
+    image = texels.reshape(blocks_y, blocks_x, 4, 4, channels).swapaxes(1, 2).reshape(blocks_y * 4, blocks_x * 4,
+                                                                                      channels)
+    return numpy.ascontiguousarray(image[:height, :width])
+
+
+def _unpack_indices(blocks, bits):
+    # Combine the little-endian index bytes of each block into one integer and split it into the 16 texel indices.
+    packed = numpy.zeros((len(blocks), 8), numpy.uint8)
+    packed[:, :blocks.shape[1]] = blocks
+    packed = packed.view("<u8")
+    shifts = numpy.arange(16, dtype=numpy.uint64) * numpy.uint64(bits)
+    return ((packed >> shifts) & numpy.uint64((1 << bits) - 1)).astype(numpy.intp)
+
+
+def _decode_color_blocks(blocks, alpha_mode):
+    # Expand the RGB565 endpoints of all blocks to 8 bits per channel.
+    endpoints = blocks[:, :4].copy().view("<u2")
+    r = (endpoints >> 11) & 0x1F
+    g = (endpoints >> 5) & 0x3F
+    b = endpoints & 0x1F
+    colors = numpy.empty((len(blocks), 4, 4), numpy.uint16)
+    colors[:, :2, 0] = (r << 3) | (r >> 2)
+    colors[:, :2, 1] = (g << 2) | (g >> 4)
+    colors[:, :2, 2] = (b << 3) | (b >> 2)
+    colors[:, :, 3] = 0xFF
+    # Interpolate the two remaining palette colors. BC1 blocks with endpoint 0 <= endpoint 1 use the 3 color mode, in
+    # which the last color is transparent black.
+    c0 = colors[:, 0, :3]
+    c1 = colors[:, 1, :3]
+    if alpha_mode:
+        four_colors = (endpoints[:, 0] > endpoints[:, 1])[:, None]
+        colors[:, 2, :3] = numpy.where(four_colors, (2 * c0 + c1) // 3, (c0 + c1) // 2)
+        colors[:, 3, :3] = numpy.where(four_colors, (c0 + 2 * c1) // 3, 0)
+        colors[:, 3, 3] = numpy.where(four_colors[:, 0], 0xFF, 0)
+    else:
+        colors[:, 2, :3] = (2 * c0 + c1) // 3
+        colors[:, 3, :3] = (c0 + 2 * c1) // 3
+    # Look up the palette colors of all texels.
+    indices = _unpack_indices(blocks[:, 4:8], 2)
+    return colors.astype(numpy.uint8)[numpy.arange(len(blocks))[:, None], indices]
+
+
+def _decode_channel_blocks(blocks, signed):
+    # Read the two endpoints of all blocks, interpreting them as signed values for SNORM formats.
+    if signed:
+        endpoints = numpy.maximum(blocks[:, :2].view(numpy.int8), -127).astype(numpy.int32)
+    else:
+        endpoints = blocks[:, :2].astype(numpy.int32)
+    a0 = endpoints[:, 0:1]
+    a1 = endpoints[:, 1:2]
+    # Interpolate 6 values between the endpoints if endpoint 0 > endpoint 1, otherwise 4 values followed by the
+    # minimum and maximum value.
+    eight_values = a0 > a1
+    weights8 = numpy.arange(1, 7)
+    weights6 = numpy.arange(1, 5)
+    palette = numpy.empty((len(blocks), 8), numpy.int32)
+    palette[:, 0:1] = a0
+    palette[:, 1:2] = a1
+    palette[:, 2:8] = ((7 - weights8) * a0 + weights8 * a1) // 7
+    six = ((5 - weights6) * a0 + weights6 * a1) // 5
+    palette[:, 2:6] = numpy.where(eight_values, palette[:, 2:6], six)
+    palette[:, 6:7] = numpy.where(eight_values, palette[:, 6:7], -127 if signed else 0)
+    palette[:, 7:8] = numpy.where(eight_values, palette[:, 7:8], 127 if signed else 0xFF)
+    if signed:
+        # Map the range -127..127 to 0..255.
+        palette = ((palette + 127) * 0xFF + 127) // 254
+    # Look up the palette values of all texels.
+    indices = _unpack_indices(blocks[:, 2:8], 3)
+    return palette.astype(numpy.uint8)[numpy.arange(len(blocks))[:, None], indices]
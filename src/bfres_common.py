@@ -1,3 +1,7 @@
+import enum
+import numpy
+
+
 class BfresOffset:
     def __init__(self, reader):
         self.address = reader.tell()
@@ -21,6 +25,23 @@ class BfresNameOffset(BfresOffset):
         reader.seek(current_pos)
 
 
+def read_name(reader, offset):
+    # Return the string at the given offset into the string table, which points to the length preceding the string.
+    current_pos = reader.tell()
+    reader.seek(offset + 2)
+    name = reader.read_0_string()
+    reader.seek(current_pos)
+    return name
+
+
+def read_bits(reader, count):
+    # Read an array of count bits packed into 32-bit integers, least significant bit first, as a bool array.
+    data = numpy.frombuffer(reader.read_view((count + 31) // 32 * 4), numpy.uint8)
+    if reader.endianness == ">":
+        data = data.reshape(-1, 4)[:, ::-1].ravel()
+    return (data[:, None] >> numpy.arange(8, dtype=numpy.uint8) & 1).ravel()[:count].astype(bool)
+
+
 class IndexGroup:
     class Node:
         def __init__(self, reader):
@@ -66,3 +87,113 @@ class IndexGroup:
 
     def __iter__(self):
         return iter(self.nodes)
+
+
+def build_index_group(names):
+    # Return the search value, left and right node index of the root node and a node per name of an Index Group, which
+    # is a Patricia tree: each node tests the bit of a name given by its search value, counting from the least
+    # significant bit of the last character, and links to a node with a smaller or equal search value end the lookup.
+    # Names are inserted in order as the original tools did, each insertion descending the tree twice (to find the most
+    # similar name, then where the first bit differing from it belongs), which takes O(n log n) for typical names.
+    # Names are compared as integers, so the bit of a search value is a shift and the first differing bit comes from the
+    # lowest set bit of their XOR.
+    keys = [0] + [int.from_bytes(name.encode("ascii"), "big") for name in names]
+    refs = [-1]  # The root node tests no bit and links to the first node with its left index.
+    lefts = [0]
+    rights = [0]
+    for index in range(1, len(keys)):
+        key = keys[index]
+        # Find the most similar name by descending until a link points back up.
+        parent, node = 0, lefts[0]
+        while refs[parent] < refs[node]:
+            parent, node = node, (rights if key >> refs[node] & 1 else lefts)[node]
+        difference = key ^ keys[node]
+        if not difference:
+            raise AssertionError("Duplicate or empty Index Group name '" + names[index - 1] + "'.")
+        ref = (difference & -difference).bit_length() - 1
+        # Descend again to the link the bit belongs in, and insert the node there, linking itself for the new name.
+        parent, node = 0, lefts[0]
+        while refs[parent] < refs[node] < ref:
+            parent, node = node, (rights if key >> refs[node] & 1 else lefts)[node]
+        refs.append(ref)
+        lefts.append(node if key >> ref & 1 else index)
+        rights.append(index if key >> ref & 1 else node)
+        (rights if parent and key >> refs[parent] & 1 else lefts)[parent] = index
+    return [(ref & 0xFFFFFFFF, left, right) for ref, left, right in zip(refs, lefts, rights)]
+
+
+class AnimCurve:
+    # A curve animating a single value of an animation target. Its frames and keys are decoded into NumPy arrays at once.
+    class FrameType(enum.IntEnum):
+        SINGLE = 0  # 32-bit float
+        DECIMAL10X5 = 1  # 16-bit fixed point with 5 fractional bits
+        BYTE = 2  # 8-bit unsigned integer
+
+    class KeyType(enum.IntEnum):
+        SINGLE = 0  # 32-bit float
+        INT16 = 1
+        SBYTE = 2
+
+    class CurveType(enum.IntEnum):
+        CUBIC = 0  # 4 coefficients of a cubic polynomial per key
+        LINEAR = 1  # 2 coefficients of a linear polynomial per key
+        BAKED_FLOAT = 2
+        STEP_INT = 3
+        BAKED_INT = 4
+        STEP_BOOL = 5  # 1 bit per key
+        BAKED_BOOL = 6  # 1 bit per key
+
+    _frame_formats = {FrameType.SINGLE: ("f4", 1), FrameType.DECIMAL10X5: ("i2", 1 / 32), FrameType.BYTE: ("u1", 1)}
+    _key_formats = {KeyType.SINGLE: "f4", KeyType.INT16: "i2", KeyType.SBYTE: "i1"}
+    _coefficient_counts = {CurveType.CUBIC: 4, CurveType.LINEAR: 2}
+
+    def __init__(self, reader):
+        self.frame_array_offset = reader.read_uint64()
+        self.key_array_offset = reader.read_uint64()
+        self.flags = reader.read_uint16()
+        self.key_count = reader.read_uint16()
+        self.anim_data_offset = reader.read_uint32()  # The byte offset of the animated value in the target data.
+        self.start_frame = reader.read_single()
+        self.end_frame = reader.read_single()
+        self.scale = reader.read_single()  # Multiplied with all coefficients.
+        self.offset = reader.read_single()  # Added to the first coefficient.
+        self.delta = reader.read_single()  # Difference between the first and last value.
+        self.padding = reader.read_uint32()
+        self.frame_type = self.FrameType(self.flags & 0x3)
+        self.key_type = self.KeyType(self.flags >> 2 & 0x3)
+        self.curve_type = self.CurveType(self.flags >> 4 & 0x7)
+        current_pos = reader.tell()
+        # Load the frames at which each key starts.
+        reader.seek(self.frame_array_offset)
+        frame_format, frame_scale = self._frame_formats[self.frame_type]
+        frame_format = numpy.dtype(reader.endianness + frame_format)
+        self.frames = numpy.frombuffer(reader.read_view(frame_format.itemsize * self.key_count), frame_format) \
+            .astype(numpy.float32) * frame_scale
+        # Load the keys, as an array of the shape (key count, coefficient count) with the final values.
+        reader.seek(self.key_array_offset)
+        if self.curve_type in (self.CurveType.STEP_BOOL, self.CurveType.BAKED_BOOL):
+            self.keys = read_bits(reader, self.key_count)[:, None].astype(numpy.float32)
+        else:
+            key_format = numpy.dtype(reader.endianness + self._key_formats[self.key_type])
+            coefficient_count = self._coefficient_counts.get(self.curve_type, 1)
+            self.keys = numpy.frombuffer(reader.read_view(key_format.itemsize * self.key_count * coefficient_count),
+                                         key_format).reshape(self.key_count, coefficient_count).astype(numpy.float32)
+            # Float keys may have no scale set.
+            self.keys *= self.scale if self.scale or self.key_type != self.KeyType.SINGLE else 1
+            self.keys[:, 0] += self.offset
+        reader.seek(current_pos)
+
+    def evaluate(self, frames):
+        # Return the values of the curve at all given frames at once. Frames before the first key get its value.
+        segments = numpy.clip(numpy.searchsorted(self.frames, frames, "right") - 1, 0, self.key_count - 1)
+        keys = self.keys[segments]
+        if keys.shape[1] == 1:
+            return keys[:, 0]
+        # Evaluate the polynomial of each segment with the relative position in it, from 0 at its key to 1 at the next.
+        starts = self.frames[segments]
+        lengths = numpy.append(self.frames[1:], self.end_frame)[segments] - starts
+        t = numpy.where(lengths > 0, (frames - starts) / numpy.where(lengths > 0, lengths, 1), 0).clip(0, 1)
+        values = keys[:, -1]
+        for i in range(keys.shape[1] - 2, -1, -1):
+            values = keys[:, i] + t * values
+        return values
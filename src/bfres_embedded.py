@@ -5,6 +5,6 @@ class EmbeddedFile:
     def __init__(self, reader):
         self.offset = BfresOffset(reader)
         self.size_in_bytes = reader.read_uint32()
-        # Load the raw data.
+        # Reference the raw data, which is not copied if the file is memory-mapped.
         reader.seek(self.offset.to_file)
-        self.data = reader.read_bytes(self.size_in_bytes)
+        self.data = reader.read_view(self.size_in_bytes)
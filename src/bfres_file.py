@@ -1,9 +1,15 @@
 import enum
+import mmap
 import subprocess
 from . import addon
 from . import binary_io
+from . import profiling
+from . import yaz0
 from .bfres_common import BfresOffset, BfresNameOffset, IndexGroup
 from .bfres_fmdl import FmdlSection
+from .bfres_fmaa import FmaaSection
+from .bfres_fska import FskaSection
+from .bfres_fvis import FvisSection
 from .bfres_embedded import EmbeddedFile
 
 
@@ -74,8 +80,8 @@ with the array, they are easier to imagine as an OrderedDict which items can be
 wraps the logic inside IndexGroup classes however, preserving the index group node information and allowing access to
 entries via name, index or offset.
 
-All this makes it quite non-trivial to create an exporter later on, as offsets have to be satisfied after the file is
-completely written. This needs some brain-storming as it was probably solved with C pointer maths originally.
+All this makes it quite non-trivial to create an exporter, as offsets have to be satisfied after the file is completely
+written. BfresWriter solves this by writing into memory and resolving all pointers at once in the end, see bfres_writer.
 '''
 
 
@@ -157,41 +163,56 @@ class BfresFile:
         Fscn10 = 10
         EmbeddedFile11 = 11
 
-    def __init__(self, raw):
-        # Open a little-endian binary reader on the stream.
+    def __init__(self, raw, metadata_only=False):
+        # Open a little-endian binary reader on the stream. With metadata_only, only the headers and names of the
+        # models, materials and embedded files are read, skipping the skeletons and animations.
         with binary_io.BinaryReader(raw) as reader:
             reader.endianness = "<"
             # Read the header.
 			
             self.header = self.Header(reader)
             addon.log(0, "FRES " + self.header.file_name_offet.name)
-            print(str(self.header.externalfile_offset))
 			
             reader.seek(self.header.model_offset)
             for i in range(0, self.header.model_count):
-                self.header.fmdl_array.append(FmdlSection(reader))
+                self.header.fmdl_array.append(FmdlSection(reader, metadata_only))
+            # Load the skeletal, material and visibility animations.
+            self.fska_array = []
+            self.fmaa_array = []
+            self.fvis_array = []
+            if not metadata_only:
+                reader.seek(self.header.skeletal_anim_offset)
+                for i in range(0, self.header.skeletal_anim_count):
+                    self.fska_array.append(FskaSection(reader))
+                reader.seek(self.header.material_anim_offset)
+                for i in range(0, self.header.material_anim_count):
+                    self.fmaa_array.append(FmaaSection(reader))
+                reader.seek(self.header.bonevis_anim_offset)
+                for i in range(0, self.header.visual_anim_count):
+                    self.fvis_array.append(FvisSection(reader))
             reader.seek(self.header.externalfile_offset)
+            # Keep views of all embedded files, which do not copy the data if the file is memory-mapped.
+            self.embedded_files = []
+            self.bntx_files = []
             for i in range(0, self.header.exteralfile_count): #Read Textures
                 self.header.ext_array.append(self.External(reader))
                 current_pos = reader.tell()
-               
-                print(self.header.ext_array[i].dataOffset)
                 reader.seek(self.header.ext_array[i].dataOffset)
-                if reader.read_raw_string(4) == "BNTX":
-                    print("Found BNTX Texture container")
-                    reader.seek(-4, 1) #Seek back once bntx is found
-                    self.bntx_file = reader.read_bytes(self.header.ext_array[i].Size)  #Create a byte array for entire bntx      
+                data = reader.read_view(self.header.ext_array[i].Size)
+                self.embedded_files.append(data)
+                if data[:4] == b"BNTX":
+                    self.bntx_files.append(data)
                 reader.seek(current_pos)
                  # TODO: Read other sub file formats
-				 
-				 
-				 
-				 
-				 
-				 
-				 
-				 
-				 
-				 
-				 
-				 
+
+
+def read_file_data(filepath):
+    # Return a buffer with the data of a BFRES file, decompressing it if it is a Yaz0 compressed SZS file. Uncompressed
+    # files are memory-mapped, so embedded files are never copied. The mapping stays valid after closing the file and is
+    # released with the last view of it.
+    with open(filepath, "rb") as raw:
+        if raw.read(4) == b"Yaz0":
+            raw.seek(0)
+            with profiling.span("decompression"):
+                return yaz0.decompress(raw)
+        return mmap.mmap(raw.fileno(), 0, access=mmap.ACCESS_READ)
@@ -0,0 +1,105 @@
+import numpy
+from . import addon
+from .bfres_common import AnimCurve, BfresNameOffset, read_name
+
+'''
+An FMAA section animates the materials of a model. Per material, it can animate shader parameters and swap the textures
+of samplers over time (texture pattern animations). A texture pattern animation either has a curve returning the index
+of the texture in the FMAA texture name array for each frame, or a constant index if it is not animated.
+Only texture pattern animations are decoded, as shader parameters have no equivalent in Blender materials.
+'''
+
+
+class FmaaSection:
+    class Header:
+        def __init__(self, reader):
+            if reader.read_raw_string(4) != "FMAA":
+                raise AssertionError("Invalid FMAA section header.")
+            self.headerLength1 = reader.read_uint32()
+            self.headerLength2 = reader.read_uint32()
+            self.padding = reader.read_uint32()
+            self.name_offset = BfresNameOffset(reader)
+            self.padding = reader.read_uint32()
+            self.path_offset = reader.read_uint64()
+            self.model_offset = reader.read_uint64()
+            self.bind_index_array_offset = reader.read_uint64()
+            self.material_anim_array_offset = reader.read_uint64()
+            self.texture_name_array_offset = reader.read_uint64()
+            self.user_data_offset = reader.read_uint64()
+            self.user_data_index_group_offset = reader.read_uint64()
+            self.texture_bind_array_offset = reader.read_uint64()
+            self.flags = reader.read_uint32()
+            self.frame_count = reader.read_int32()
+            self.baked_size = reader.read_uint32()
+            self.user_data_count = reader.read_uint16()
+            self.material_anim_count = reader.read_uint16()
+            self.curve_count = reader.read_int32()
+            self.shader_param_anim_count = reader.read_uint16()
+            self.texture_pattern_anim_count = reader.read_uint16()
+            self.visibility_anim_count = reader.read_uint16()
+            self.texture_count = reader.read_uint16()
+            self.padding = reader.read_uint32()
+
+    def __init__(self, reader):
+        self.header = self.Header(reader)
+        current_pos = reader.tell()
+        addon.log(1, "FMAA " + self.header.name_offset.name)
+        self.name = self.header.name_offset.name
+        self.frame_count = self.header.frame_count
+        # Load the names of the textures the texture pattern animations switch between.
+        reader.seek(self.header.texture_name_array_offset)
+        self.texture_names = [read_name(reader, offset) for offset in reader.read_uint64s(self.header.texture_count)]
+        # Load the animations of each material.
+        reader.seek(self.header.material_anim_array_offset)
+        self.material_anims = [MaterialAnim(reader) for _ in range(self.header.material_anim_count)]
+        reader.seek(current_pos)
+
+
+class MaterialAnim:
+    class TexturePatternAnim:
+        def __init__(self, reader):
+            self.name_offset = BfresNameOffset(reader)  # The name of the sampler.
+            self.padding = reader.read_uint32()
+            self.curve_index = reader.read_int16()  # -1 if not animated.
+            self.constant_index = reader.read_int16()  # Used if not animated.
+            self.sub_bind_index = reader.read_sbyte()
+            self.padding = reader.read_bytes(3)
+            self.name = self.name_offset.name
+
+    def __init__(self, reader):
+        self.name_offset = BfresNameOffset(reader)  # The name of the material.
+        self.padding = reader.read_uint32()
+        self.shader_param_anim_array_offset = reader.read_uint64()
+        self.texture_pattern_anim_array_offset = reader.read_uint64()
+        self.curve_array_offset = reader.read_uint64()
+        self.constant_array_offset = reader.read_uint64()
+        self.shader_param_curve_index = reader.read_uint16()
+        self.texture_pattern_curve_index = reader.read_uint16()
+        self.visibility_curve_index = reader.read_uint16()
+        self.visibility_constant_index = reader.read_uint16()
+        self.shader_param_anim_count = reader.read_uint16()
+        self.texture_pattern_anim_count = reader.read_uint16()
+        self.constant_count = reader.read_uint16()
+        self.curve_count = reader.read_uint16()
+        self.padding = reader.read_uint64()
+        current_pos = reader.tell()
+        self.name = self.name_offset.name
+        # Load the texture pattern animations.
+        reader.seek(self.texture_pattern_anim_array_offset)
+        self.texture_pattern_anims = [self.TexturePatternAnim(reader) for _ in range(self.texture_pattern_anim_count)]
+        # Load the curves and constants, which are (target offset, 32-bit value) pairs, the value being a texture index.
+        reader.seek(self.curve_array_offset)
+        self.curves = [AnimCurve(reader) for _ in range(self.curve_count)]
+        reader.seek(self.constant_array_offset)
+        constant_dtype = numpy.dtype([("anim_data_offset", reader.endianness + "u4"), ("value", reader.endianness + "i4")])
+        self.constants = numpy.frombuffer(reader.read_view(constant_dtype.itemsize * self.constant_count),
+                                          constant_dtype)
+        reader.seek(current_pos)
+
+    def evaluate_texture_pattern(self, anim, frames):
+        # Return the index of the texture in the FMAA texture name array at the given frames.
+        if anim.curve_index >= 0:
+            curve = self.curves[self.texture_pattern_curve_index + anim.curve_index]
+            return numpy.rint(curve.evaluate(frames)).astype(numpy.int32)
+        value = self.constants["value"][anim.constant_index] if anim.constant_index < len(self.constants) else 0
+        return numpy.full(len(frames), value, numpy.int32)
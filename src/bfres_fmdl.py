@@ -3,7 +3,6 @@ import numpy
 import struct
 from . import addon
 from .bfres_common import BfresOffset, BfresNameOffset, IndexGroup
-from .bfres_file import *
 
 '''
 To build the vertices of an FMDL model, the following steps have to be done:
@@ -65,14 +64,16 @@ class FmdlSection:
             self.unknown0x06 = reader.read_uint16()  # 0x0000
             self.unknown0x08 = reader.read_single()
 
-    def __init__(self, reader):
+    def __init__(self, reader, metadata_only=False):
         self.header = self.Header(reader)
         current_pos = reader.tell()
 		
         addon.log(1, "FMDL " + self.header.file_name_offset.name)
-        # Load the FSKL subsection.
-        reader.seek(self.header.fskl_offset)
-        self.fskl = FsklSubsection(reader)
+        # Load the FSKL subsection, which is not needed when only reading the metadata.
+        self.fskl = None
+        if not metadata_only:
+            reader.seek(self.header.fskl_offset)
+            self.fskl = FsklSubsection(reader)
         # Load the FVTX subsections.
         self.fvtx_array = []
         reader.seek(self.header.fvtx_array_offset)
@@ -127,48 +128,43 @@ class FsklSubsection:
             self.padding = reader.read_uint32()	
 
     class Bone:
-        CHILD_BONE_COUNT = 4  # Wiki says parent bones, but where does that make sense to have multiple parents?
-
-        def __init__(self, reader):
-            self.name_offset = BfresNameOffset(reader)
-            addon.log(3, "Bone " + self.name_offset.name)
-            self.padding = reader.read_uint32()
-            self.padding = reader.read_uint32()
-            self.padding = reader.read_uint32()
-            self.padding = reader.read_uint32()
-            self.padding = reader.read_uint32()
-            self.index = reader.read_uint16()
-            self.parent = reader.read_uint16()
-            self.smoothMatrixIndex = reader.read_uint16()
-            self.rigidMatrixIndex = reader.read_uint16()  # 0x1001
-            self.billboardIndex = reader.read_uint16()  # 0x1001
-            self.userDataCount = reader.read_uint16()  # 0x1001
-            self.flags = reader.read_uint32()  # Unknown purpose.
-            self.scale = reader.read_singles(3)
-            self.rotation = reader.read_singles(4)
-            self.translation = reader.read_singles(3)
+        # The bones are read all at once into a NumPy structured array with these fields.
+        FIELDS = [
+            ("name_offset", "i4"),
+            ("padding", "5u4"),
+            ("index", "u2"),
+            ("parent", "u2"),  # 0xFFFF for root bones.
+            ("smooth_matrix_index", "u2"),
+            ("rigid_matrix_index", "u2"),
+            ("billboard_index", "u2"),
+            ("user_data_count", "u2"),
+            ("flags", "u4"),  # The rotation mode is stored in ROTATION_MASK.
+            ("scale", "3f4"),
+            ("rotation", "4f4"),  # Quaternion XYZW, or XYZ Euler angles in radians.
+            ("translation", "3f4")]
+        ROTATION_MASK = 0x7000
+        ROTATION_EULER_XYZ = 0x1000
 
     def __init__(self, reader):
         self.header = self.Header(reader)
         addon.log(2, "FSKL")
+        # Load the bone array.
         reader.seek(self.header.bone_array_offset)
-        for bones in range (0, self.header.bone_count):
-            Bone_Info = self.Bone(reader)
-			
-            Bone_TellOff = reader.tell()
-			
-            reader.seek(Bone_TellOff)
-			
-        # Load the inverse index array.
+        dtype = numpy.dtype([(name, reader.endianness + format) for name, format in self.Bone.FIELDS])
+        self.bones = numpy.frombuffer(reader.read_view(dtype.itemsize * self.header.bone_count), dtype)
+        self.bone_names = []
+        for name_offset in self.bones["name_offset"].tolist():
+            reader.seek(name_offset + 2)
+            self.bone_names.append(reader.read_0_string())
+        addon.log(3, "{} bones".format(len(self.bone_names)))
+        # Load the inverse index array, mapping the indices used by skinned vertices to bone indices.
         reader.seek(self.header.inv_index_array_offset)
-        self.inv_indices = []
-        for i in range(0, self.header.inv_count + self.header.extra_index_count):
-            self.inv_indices.append(reader.read_uint16())
-        # Load the inverse matrix array.
+        self.inv_indices = numpy.frombuffer(
+            reader.read_view(2 * (self.header.inv_count + self.header.extra_index_count)), reader.endianness + "u2")
+        # Load the inverse matrix array, 3x4 row-major matrices.
         reader.seek(self.header.inv_matrix_array_offset)
-        self.inv_matrices = []
-        for i in range(0, self.header.inv_count):
-            self.inv_matrices.append((reader.read_singles(3), reader.read_singles(3), reader.read_singles(3), reader.read_singles(3)))
+        self.inv_matrices = numpy.frombuffer(
+            reader.read_view(48 * self.header.inv_count), reader.endianness + "f4").reshape(-1, 3, 4)
 
 
 class FvtxSubsection:
@@ -241,14 +237,11 @@ class FvtxSubsection:
         def _parse_3x_10bit_signed(self, buffData, offset):
             offset += self.element_offset
             integer = struct.unpack("<I", buffData.data[offset:offset + 4])[0]
-            # 8-bit values are aligned in 'integer' as follows:
-            #   Bit: 01 02 03 04 05 06 07 08 09 10 11 12 13 14 15 16 17 18 19 20 21 22 23 24 25 26 27 28 29 30 31 32
-            # Value:  0  1  x  x  x  x  x  x  x  x  0  1  y  y  y  y  y  y  y  y  0  1  z  z  z  z  z  z  z  z  0  0
-            # Those are then divided by 511 to retrieve the decimal value.
-            x = ((integer & 0x3FC00000) >> 22) / 511
-            y = ((integer & 0x000FF000) >> 12) / 511
-            z = ((integer & 0x000003FC) >> 2) / 511
-            return x, y, z
+            # Signed 10-bit values are aligned in 'integer' as follows, starting with the least significant bit:
+            #   Bit: 00-09 10-19 20-29 30-31
+            # Value:     x     y     z  unused
+            # Those are then divided by 511 to retrieve the decimal value, clamping -512 to -1.
+            return tuple(max(-1, (((integer >> shift & 0x3FF) ^ 0x200) - 0x200) / 511) for shift in (0, 10, 20))
 
         def _parse_2x_16bit_float(self, buffData, offset):
             offset += self.element_offset
@@ -283,6 +276,78 @@ class FvtxSubsection:
             0x00000518: _parse_3x_32bit_float
         }
 
+        # Formats which can be decoded with NumPy for all vertices at once: format -> (type, count, divisor or None).
+        _array_formats = {
+            0x00000109: ("u1", 2, 0xFF),
+            0x00000112: ("<u2", 2, 0xFFFF),
+            0x0000010B: ("u1", 4, None),
+            0x00000302: ("u1", 1, None),
+            0x00000309: ("u1", 2, None),
+            0x0000030B: ("u1", 4, None),
+            0x00000212: ("<u2", 2, 0x7FFF),
+            0x0000020b: ("i1", 4, None),
+            0x0000020e: ("<u4", 1, None),
+            0x00000512: ("<f2", 2, None),
+            0x00000517: ("<f4", 2, None),
+            0x00000515: ("<f2", 4, None),
+            0x00000518: ("<f4", 3, None)
+        }
+
+        def get_array(self, buffData, count):
+            # Decode the attribute of the first count vertices into an array of the shape (count, components), with
+            # the same values as the single vertex parsers. Returns None for unknown formats.
+            array_format = self._array_formats.get(self.format)
+            if not array_format:
+                return None
+            dtype, components, divisor = array_format
+            dtype = numpy.dtype(dtype)
+            # Select the bytes of this attribute in each element and reinterpret them.
+            elements = numpy.frombuffer(buffData.data, numpy.uint8, count * buffData.stride).reshape(count, buffData.stride)
+            size = dtype.itemsize * components
+            values = numpy.ascontiguousarray(elements[:, self.element_offset:self.element_offset + size])
+            values = values.view(dtype).reshape(count, components)
+            if self.format == 0x0000020e:
+                # Sign-extend the 10-bit components like _parse_3x_10bit_signed.
+                components = (values >> numpy.array([0, 10, 20], numpy.uint32) & 0x3FF).astype(numpy.int32)
+                components = (components ^ 0x200) - 0x200
+                return numpy.maximum(components.astype(numpy.float32) / 511, -1)
+            if divisor:
+                return values.astype(numpy.float32) / divisor
+            if dtype.kind == "f":
+                return values.astype(numpy.float32)
+            return values
+
+        @classmethod
+        def encode_array(cls, format, values, name=""):
+            # Encode an array of the shape (count, components) into a format of _array_formats, the inverse of
+            # get_array(). Missing components are 0. Returns the encoded array of the shape (count, stored components)
+            # and the values get_array() decodes from it, which differ from the given ones by the quantization error.
+            # The attribute name is only used in errors.
+            array_format = cls._array_formats.get(format)
+            if not array_format:
+                raise AssertionError("Attribute {}: cannot encode unknown format {:#x}.".format(name, format))
+            dtype, components, divisor = array_format
+            dtype = numpy.dtype(dtype)
+            values = numpy.asarray(values, numpy.float64).reshape(len(values), -1)
+            value_components = 3 if format == 0x0000020e else components
+            if values.shape[1] > value_components:
+                raise AssertionError("Attribute {}: format {:#x} stores only {} components.".format(name, format,
+                                                                                                   value_components))
+            values = numpy.pad(values, ((0, 0), (0, value_components - values.shape[1])), "constant")
+            if format == 0x0000020e:
+                # Pack signed 10-bit components like _parse_3x_10bit_signed() unpacks them, x in the lowest bits.
+                quantized = numpy.rint(numpy.clip(values, -1, 1) * 511).astype(numpy.int32)
+                encoded = ((quantized & 0x3FF).astype(numpy.uint32) << numpy.array([0, 10, 20], numpy.uint32)) \
+                    .sum(1, dtype=numpy.uint32).astype(dtype)[:, None]
+                return encoded, numpy.maximum(quantized.astype(numpy.float32) / 511, -1)
+            if dtype.kind == "f":
+                encoded = values.astype(dtype)
+                return encoded, encoded.astype(numpy.float32)
+            # Round integer and normalized formats to the nearest representable value.
+            limits = numpy.iinfo(dtype)
+            encoded = numpy.clip(numpy.rint(values * (divisor or 1)), limits.min, limits.max).astype(dtype)
+            return encoded, encoded.astype(numpy.float32) / divisor if divisor else encoded
+
     class buffData:
         def __init__(self,VertexBufferSize,stride,DataOffset,data):
             self.VertexBufferSize = VertexBufferSize
@@ -352,12 +417,11 @@ class FvtxSubsection:
                  DataOffset = DataOffset + ((8 - DataOffset) % 8)
 				
             reader.seek(DataOffset)
-            self.data = reader.read_bytes(self.VertexBufferSize)  
+            self.data = reader.read_view(self.VertexBufferSize)  # Not copied or touched before decoding vertices.
 
             self.buffers.append(self.buffData(self.VertexBufferSize,self.stride,DataOffset, self.data))
 			
       
-            print( 'DataOffset = %s VertexBufferSize = %s stride = %s' %(DataOffset, self.VertexBufferSize, self.stride))
 			
          
   
@@ -367,13 +431,22 @@ class FvtxSubsection:
 
 
 		
+    def get_attribute_arrays(self):
+        # Decode all attributes with a known format into a dictionary mapping their vertex member name (like "p0") to
+        # an array holding the values of all vertices.
+        arrays = {}
+        for attribute in self.att_array:
+            array = attribute.get_array(self.buffers[attribute.buffer_index], self.header.vertex_count)
+            if array is not None:
+                arrays[attribute.name_offset.name[1:]] = array
+        return arrays
+
     def get_vertices(self):
         # Create an array of empty vertex instances.
         vertices = [self.Vertex() for i in range(0, self.header.vertex_count)]
         # Get the data by attributes, as the data can be separated into different data arrays.
         for attribute in self.att_array:
             vertex_member = attribute.name_offset.name[1:]  # Remove the underscore of the attribute name.
-            print(vertex_member + " " + str(attribute.buffer_index) + " " + str(attribute.element_offset) + "format" + str(attribute.format))
             buffData =  self.buffers[attribute.buffer_index]
        
             if attribute.parser is None:
@@ -455,7 +528,9 @@ class FshpSubsection:
 
             indexBufferOffset = self.DataStart + self.FaceOffset
             reader.seek(indexBufferOffset)
-            self.indices = reader.read_uint16s(self.facecount)
+            self.index_buffer = reader.read_view(2 * self.facecount)  # Only decoded when indices are requested.
+            self.index_format = reader.endianness + str(self.facecount) + "H"
+            self._indices = None
 
 			
 			
@@ -463,6 +538,12 @@ class FshpSubsection:
             # Seek back as multiple LoD models are stored in an array.
             reader.seek(current_pos)
 
+        @property
+        def indices(self):
+            if self._indices is None:
+                self._indices = struct.unpack(self.index_format, self.index_buffer)
+            return self._indices
+
     class VisibilityGroupTreeNode:
         def __init__(self, reader):
             self.left_child_index = reader.read_uint16()  # The current node's index if no left child.
@@ -486,6 +567,9 @@ class FshpSubsection:
         self.lod_models = []
         for i in range(0, self.header.lod_count):
             self.lod_models.append(self.LodModel(reader))
+        # Load the indices of the bones the vertices of this polygon can be skinned to.
+        reader.seek(self.header.bone_index_group_array_offset)
+        self.skin_bone_indices = reader.read_uint16s(self.header.fskl_index_array_count)
         # Load the visibility group tree node array.
  #       reader.seek(self.header.visibility_group_tree_nodes_offset.to_file)
  #       self.visibility_group_tree_nodes = []
@@ -0,0 +1,105 @@
+import numpy
+from . import addon
+from .bfres_common import AnimCurve, BfresNameOffset
+
+'''
+An FSKA section animates the bones of a skeleton. Each bone animation stores the base (first frame) values of its scale,
+rotation and translation, and a curve for each of those components which changes over time. The curves reference the
+animated component by its byte offset in the base data, see BoneAnim.CURVE_COMPONENTS.
+'''
+
+
+class FskaSection:
+    class Header:
+        def __init__(self, reader):
+            if reader.read_raw_string(4) != "FSKA":
+                raise AssertionError("Invalid FSKA section header.")
+            self.headerLength1 = reader.read_uint32()
+            self.headerLength2 = reader.read_uint32()
+            self.padding = reader.read_uint32()
+            self.name_offset = BfresNameOffset(reader)
+            self.padding = reader.read_uint32()
+            self.path_offset = reader.read_uint64()
+            self.skeleton_offset = reader.read_uint64()
+            self.bind_index_array_offset = reader.read_uint64()
+            self.bone_anim_array_offset = reader.read_uint64()
+            self.user_data_offset = reader.read_uint64()
+            self.user_data_index_group_offset = reader.read_uint64()
+            self.flags = reader.read_uint32()
+            self.frame_count = reader.read_int32()
+            self.curve_count = reader.read_int32()
+            self.baked_size = reader.read_uint32()
+            self.bone_anim_count = reader.read_uint16()
+            self.user_data_count = reader.read_uint16()
+            self.padding = reader.read_uint32()
+
+    FLAGS_LOOPING = 0x4
+    ROTATION_MASK = 0x7000
+    ROTATION_EULER_XYZ = 0x1000
+
+    def __init__(self, reader):
+        self.header = self.Header(reader)
+        current_pos = reader.tell()
+        addon.log(1, "FSKA " + self.header.name_offset.name)
+        self.name = self.header.name_offset.name
+        self.frame_count = self.header.frame_count
+        self.looping = bool(self.header.flags & self.FLAGS_LOOPING)
+        self.euler = self.header.flags & self.ROTATION_MASK == self.ROTATION_EULER_XYZ
+        # Load the bone animations.
+        reader.seek(self.header.bone_anim_array_offset)
+        self.bone_anims = [BoneAnim(reader) for _ in range(self.header.bone_anim_count)]
+        reader.seek(current_pos)
+
+
+class BoneAnim:
+    FLAGS_BASE_SCALE = 0x08
+    FLAGS_BASE_ROTATE = 0x10
+    FLAGS_BASE_TRANSLATE = 0x20
+    # Byte offset of the animated component in the base data -> (component name, index).
+    CURVE_COMPONENTS = {
+        0x04: ("scale", 0), 0x08: ("scale", 1), 0x0C: ("scale", 2),
+        0x10: ("translation", 0), 0x14: ("translation", 1), 0x18: ("translation", 2),
+        0x20: ("rotation", 0), 0x24: ("rotation", 1), 0x28: ("rotation", 2), 0x2C: ("rotation", 3)}
+
+    def __init__(self, reader):
+        self.name_offset = BfresNameOffset(reader)
+        self.padding = reader.read_uint32()
+        self.curve_array_offset = reader.read_uint64()
+        self.base_data_offset = reader.read_uint64()
+        self.padding = reader.read_uint64()
+        self.padding = reader.read_uint64()
+        self.flags = reader.read_uint32()
+        self.begin_rotate = reader.read_byte()
+        self.begin_translate = reader.read_byte()
+        self.curve_count = reader.read_byte()
+        self.begin_base_translate = reader.read_byte()
+        self.begin_curve = reader.read_int32()
+        self.padding = reader.read_uint32()
+        current_pos = reader.tell()
+        self.name = self.name_offset.name
+        # Load the base values, defaulting to an identity transformation if not stored. The arrays are floats even for
+        # the defaults, so curve values are not truncated when evaluating them.
+        reader.seek(self.base_data_offset)
+        self.scale = numpy.array(reader.read_singles(3) if self.flags & self.FLAGS_BASE_SCALE else (1, 1, 1),
+                                 numpy.float32)
+        self.translation = numpy.array(reader.read_singles(3) if self.flags & self.FLAGS_BASE_TRANSLATE else (0, 0, 0),
+                                       numpy.float32)
+        self.rotation = numpy.array(reader.read_singles(4) if self.flags & self.FLAGS_BASE_ROTATE else (0, 0, 0, 1),
+                                    numpy.float32)
+        # Load the curves.
+        reader.seek(self.curve_array_offset)
+        self.curves = [AnimCurve(reader) for _ in range(self.curve_count)]
+        reader.seek(current_pos)
+
+    def evaluate(self, frames):
+        # Return the scale (n, 3), rotation (n, 4) and translation (n, 3) arrays at the given frames.
+        components = {
+            "scale": numpy.tile(self.scale, (len(frames), 1)),
+            "rotation": numpy.tile(self.rotation, (len(frames), 1)),
+            "translation": numpy.tile(self.translation, (len(frames), 1))}
+        for curve in self.curves:
+            component = self.CURVE_COMPONENTS.get(curve.anim_data_offset)
+            if component:
+                name, index = component
+                components[name][:, index] = curve.evaluate(frames)
+        return components["scale"], components["rotation"], components["translation"]
@@ -0,0 +1,60 @@
+import numpy
+from . import addon
+from .bfres_common import AnimCurve, BfresNameOffset, read_bits, read_name
+
+'''
+An FVIS section toggles the visibility of bones (or materials) over time. Each animated name has a base visibility,
+stored in a bit array, and optionally a boolean curve referencing it by its index in AnimCurve.anim_data_offset.
+'''
+
+
+class FvisSection:
+    class Header:
+        def __init__(self, reader):
+            if reader.read_raw_string(4) != "FVIS":
+                raise AssertionError("Invalid FVIS section header.")
+            self.headerLength1 = reader.read_uint32()
+            self.headerLength2 = reader.read_uint32()
+            self.padding = reader.read_uint32()
+            self.name_offset = BfresNameOffset(reader)
+            self.padding = reader.read_uint32()
+            self.path_offset = reader.read_uint64()
+            self.model_offset = reader.read_uint64()
+            self.bind_index_array_offset = reader.read_uint64()
+            self.name_array_offset = reader.read_uint64()
+            self.curve_array_offset = reader.read_uint64()
+            self.base_value_array_offset = reader.read_uint64()
+            self.user_data_offset = reader.read_uint64()
+            self.user_data_index_group_offset = reader.read_uint64()
+            self.flags = reader.read_uint16()
+            self.user_data_count = reader.read_uint16()
+            self.frame_count = reader.read_int32()
+            self.anim_count = reader.read_uint16()
+            self.curve_count = reader.read_uint16()
+            self.baked_size = reader.read_uint32()
+
+    FLAGS_MATERIAL = 0x100  # Material instead of bone visibility.
+
+    def __init__(self, reader):
+        self.header = self.Header(reader)
+        current_pos = reader.tell()
+        addon.log(1, "FVIS " + self.header.name_offset.name)
+        self.name = self.header.name_offset.name
+        self.frame_count = self.header.frame_count
+        self.is_bone_visibility = not self.header.flags & self.FLAGS_MATERIAL
+        # Load the animated names, their base visibility and the curves changing it.
+        reader.seek(self.header.name_array_offset)
+        self.names = [read_name(reader, offset) for offset in reader.read_uint64s(self.header.anim_count)]
+        reader.seek(self.header.base_value_array_offset)
+        self.base_values = read_bits(reader, self.header.anim_count)
+        reader.seek(self.header.curve_array_offset)
+        self.curves = [AnimCurve(reader) for _ in range(self.header.curve_count)]
+        reader.seek(current_pos)
+
+    def evaluate(self, frames):
+        # Return a bool array of the shape (name count, frame count) with the visibility of each name at each frame.
+        visible = numpy.repeat(self.base_values[:, None], len(frames), 1)
+        for curve in self.curves:
+            if curve.anim_data_offset < len(self.names):
+                visible[curve.anim_data_offset] = curve.evaluate(frames) > 0.5
+        return visible
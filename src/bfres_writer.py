@@ -0,0 +1,504 @@
+import numpy
+import types
+from . import addon
+from . import binary_io
+from . import profiling
+from . import vertex_cache
+from .bfres_common import build_index_group
+from .bfres_fmdl import FsklSubsection, FvtxSubsection
+
+'''
+Writes the FMDL models of a BFRES file back into the layout read by BfresFile, taking the same objects the parsers
+create (FmdlSection, FsklSubsection, FvtxSubsection, FshpSubsection, FmatSubsection) or any with the same attributes.
+
+The file is serialized into a single in-memory BufferWriter instead of a stream. Pointers are never satisfied by seeking
+back to them; each one is written as a fixup referencing a label (like ("fvtx", model index, index) or ("string",
+name)) which is placed when the referenced data is written, and all of them are resolved in one pass at the end. This
+allows to write the data in file order without knowing where anything will end up, in the following order:
+- BFRES Header
+- FMDL Headers[] and their Index Group
+- Per FMDL: FSKL, FVTX[], FSHP[] and FMAT[] headers, each followed by the arrays they reference
+- String Table (every name referenced by a pointer, sorted)
+- Memory Pool and Buffer Info
+- Buffer Data (vertex and index buffers, aligned to a memory page, written as whole NumPy arrays)
+- Relocation Table (the positions of all 64-bit pointers, so the runtime can make them absolute)
+
+FVTX vertex buffers can also be built from decoded attribute arrays with encode_fvtx(), which encodes each attribute
+column with FvtxSubsection.Attribute.encode_array() and interleaves all columns of a buffer through the fields of a NumPy
+structured array, so no vertex is ever handled on its own.
+
+With optimize_vertex_cache, the triangles of each LoD model are reordered for the vertex cache of the GPU (see
+vertex_cache). The vertices are not reordered, as FVTX buffers are shared by all LoD models and possibly several FSHPs.
+
+Only the data the add-on reads is written: render info, shader assigns, material parameters, sampler descriptors,
+bounding boxes and user data are left out. Index Group trees are rebuilt from the names with build_index_group().
+'''
+
+
+class BfresWriter:
+    VERSION = 0x00050003
+    BUFFER_ALIGNMENT = 0x1000  # Buffer data is aligned to a GPU memory page.
+    MEMORY_POOL_SIZE = 0x120  # Filled by the runtime.
+    INDEX_FORMAT_UINT16 = 1
+    PRIMITIVE_TRIANGLES = 3
+
+    def __init__(self, name, fmdl_array, optimize_vertex_cache=False):
+        self.name = name
+        self.fmdl_array = fmdl_array
+        self.optimize_vertex_cache = optimize_vertex_cache  # Reorder triangles for the vertex cache of the GPU.
+        self.writer = binary_io.BufferWriter()
+        self.strings = {""}
+        self.buffers = []  # (offset relative to the buffer data, NumPy array) tuples, written after the string table.
+        self.buffer_size = 0
+        self.string_table_size_position = None
+
+    def write(self):
+        # Serialize the file and return a view of its data.
+        w = self.writer
+        with profiling.span("bfres write"):
+            self._write_header()
+            w.align(8)
+            w.label("fmdl_array")
+            for i, fmdl in enumerate(self.fmdl_array):
+                self._write_fmdl(i, fmdl)
+            self._write_dict("fmdl_dict", [fmdl.header.file_name_offset.name for fmdl in self.fmdl_array])
+            for i, fmdl in enumerate(self.fmdl_array):
+                self._write_fskl(i, fmdl.fskl)
+                self._write_fvtx_array(i, fmdl.fvtx_array)
+                self._write_fshp_array(i, fmdl.header.fshp_array)
+                self._write_fmat_array(i, fmdl.fmat_array)
+            self._write_string_table()
+            self._write_memory_pool()
+            self._write_buffers()
+            self._write_relocation_table()
+            w.label("end")
+            w.resolve()
+        return w.getbuffer()
+
+    # ---- Helpers ----
+
+    def _write_name(self, name):
+        # Write a pointer to the string table entry of the name.
+        self.strings.add(name)
+        self.writer.write_pointer(("string", name))
+
+    def _write_block_header(self, magic, size):
+        self.writer.write_raw_string(magic)
+        self.writer.write_uint32(0)  # Offset to the next block, unused.
+        self.writer.write_uint32(size)
+        self.writer.write_uint32(0)
+
+    def _write_dict(self, key, names):
+        # Write an Index Group with a node naming each element, following the root node with the empty name.
+        if not names:
+            return
+        w = self.writer
+        w.align(8)
+        w.label(key)
+        w.write_raw_string("_DIC")
+        w.write_uint32(len(names))
+        for name, (search_value, left_index, right_index) in zip([""] + list(names), build_index_group(names)):
+            w.write_uint32(search_value)
+            w.write_uint16(left_index)
+            w.write_uint16(right_index)
+            self._write_name(name)
+
+    def _write_array(self, key, array, alignment=8):
+        # Write a NumPy array at once, labelled with the key.
+        self.writer.align(alignment)
+        self.writer.label(key)
+        self.writer.write_bytes(numpy.ascontiguousarray(array))
+
+    def _add_buffer(self, array):
+        # Queue an array for the buffer data and return its offset relative to the start of it, 8-byte aligned like
+        # expected by FvtxSubsection.
+        offset = -(-self.buffer_size // 8) * 8
+        self.buffers.append((offset, numpy.ascontiguousarray(array)))
+        self.buffer_size = offset + self.buffers[-1][1].nbytes
+        return offset
+
+    @staticmethod
+    def _optimize_indices(shape_name, lod_model_index, indices):
+        # Reorder the triangles of the index buffer for the vertex cache, reporting the ACMR before and after. Orders
+        # which are already better (e.g. optimized with a model of the real cache) are kept.
+        with profiling.span("vertex cache optimization"):
+            acmr_before = vertex_cache.acmr(indices)
+            optimized = vertex_cache.optimize_triangles(indices)
+            acmr_after = vertex_cache.acmr(optimized)
+            addon.log(2, "{} LoD {}: ACMR {:.3f} -> {:.3f}".format(
+                shape_name, lod_model_index, acmr_before, min(acmr_before, acmr_after)))
+        return optimized if acmr_after < acmr_before else indices
+
+    @staticmethod
+    def _key_if(key, count):
+        # Return the key to point to, or None to write a null pointer to an empty array.
+        return key if count else None
+
+    # ---- Sections ----
+
+    def _write_header(self):
+        w = self.writer
+        w.write_raw_string("FRES    ")
+        w.write_uint32(self.VERSION)
+        w.write_uint16(0xFEFF)  # Byte order mark
+        w.write_uint16(0x000C)  # Alignment as a power of 2
+        w.write_pointer("file_name", "I")  # Pointing directly to the characters.
+        w.write_uint32(0)
+        w.write_pointer("rlt", "I")
+        w.write_pointer("end", "I")  # File size
+        self._write_name(self.name)
+        w.write_pointer(self._key_if("fmdl_array", len(self.fmdl_array)))
+        w.write_pointer(self._key_if("fmdl_dict", len(self.fmdl_array)))
+        for i in range(10):
+            w.write_pointer(None)  # Animation arrays and their Index Groups
+        w.write_pointer("memory_pool")
+        w.write_pointer("buffer_info")
+        w.write_pointer(None)  # External files
+        w.write_pointer(None)  # External file Index Group
+        w.write_pointer(None)
+        w.write_pointer("string_table")
+        self.string_table_size_position = w.tell()
+        w.write_uint32(0)
+        w.write_uint16(len(self.fmdl_array))
+        w.write_bytes(bytes(6 * 2 + 12))  # Other section counts and padding
+
+    def _write_fmdl(self, model_index, fmdl):
+        w = self.writer
+        self._write_block_header("FMDL", 0x78)
+        self._write_name(fmdl.header.file_name_offset.name)
+        w.write_pointer(None)  # Path
+        w.write_pointer(("fskl", model_index))
+        w.write_pointer(self._key_if(("fvtx", model_index, 0), len(fmdl.fvtx_array)))
+        w.write_pointer(self._key_if(("fshp", model_index, 0), len(fmdl.header.fshp_array)))
+        w.write_pointer(self._key_if(("fshp_dict", model_index), len(fmdl.header.fshp_array)))
+        w.write_pointer(self._key_if(("fmat", model_index, 0), len(fmdl.fmat_array)))
+        w.write_pointer(self._key_if(("fmat_dict", model_index), len(fmdl.fmat_array)))
+        w.write_pointer(None)  # User data
+        w.write_pointer(None)  # User data Index Group
+        w.write_pointer(None)  # User pointer
+        w.write_uint16(len(fmdl.fvtx_array))
+        w.write_uint16(len(fmdl.header.fshp_array))
+        w.write_uint16(len(fmdl.fmat_array))
+        w.write_uint16(0)  # User data count
+        w.write_uint32(sum(fvtx.header.vertex_count for fvtx in fmdl.fvtx_array))
+        w.write_uint32(0)
+
+    def _write_fskl(self, model_index, fskl):
+        w = self.writer
+        bones = fskl.bones.astype([(name, "<" + format) for name, format in FsklSubsection.Bone.FIELDS])
+        bones["name_offset"] = 0
+        bones["padding"] = 0  # The high half of the name pointer and the user data pointers.
+        bones["user_data_count"] = 0
+        inv_count = len(fskl.inv_matrices)
+        # Write the header.
+        w.align(8)
+        w.label(("fskl", model_index))
+        self._write_block_header("FSKL", 0x50)
+        w.write_pointer(self._key_if(("bone_dict", model_index), len(bones)))
+        w.write_pointer(self._key_if(("bones", model_index), len(bones)))
+        w.write_pointer(self._key_if(("inv_indices", model_index), len(fskl.inv_indices)))
+        w.write_pointer(self._key_if(("inv_matrices", model_index), inv_count))
+        w.write_pointer(None)  # User pointer
+        w.write_uint32(int(fskl.header.flags))
+        w.write_uint16(len(bones))
+        w.write_uint16(inv_count)
+        w.write_uint16(len(fskl.inv_indices) - inv_count)
+        w.write_bytes(bytes(0xE))
+        # Write the bones at once, then point their names to the string table.
+        self._write_array(("bones", model_index), bones)
+        position = w.labels[("bones", model_index)]
+        for i, name in enumerate(fskl.bone_names):
+            self.strings.add(name)
+            w.add_fixup(position + i * bones.itemsize, ("string", name))
+        self._write_dict(("bone_dict", model_index), fskl.bone_names)
+        self._write_array(("inv_indices", model_index), numpy.asarray(fskl.inv_indices, "<u2"))
+        self._write_array(("inv_matrices", model_index), numpy.asarray(fskl.inv_matrices, "<f4"))
+
+    def _write_fvtx_array(self, model_index, fvtx_array):
+        w = self.writer
+        w.align(8)
+        for i, fvtx in enumerate(fvtx_array):
+            # Queue the buffers one after another, as FvtxSubsection expects them to follow each other.
+            buffer_offsets = [self._add_buffer(numpy.frombuffer(buffer.data, numpy.uint8)) for buffer in fvtx.buffers]
+            w.label(("fvtx", model_index, i))
+            self._write_block_header("FVTX", 0x60)
+            w.write_pointer(self._key_if(("attributes", model_index, i), len(fvtx.att_array)))
+            w.write_pointer(self._key_if(("attribute_dict", model_index, i), len(fvtx.att_array)))
+            w.write_pointer("memory_pool")
+            w.write_pointer(None)  # Runtime buffer array
+            w.write_pointer(None)  # User buffer array
+            w.write_pointer(self._key_if(("buffer_sizes", model_index, i), len(fvtx.buffers)))
+            w.write_pointer(self._key_if(("buffer_strides", model_index, i), len(fvtx.buffers)))
+            w.write_pointer(None)  # Runtime buffer info
+            w.write_uint32(buffer_offsets[0] if buffer_offsets else 0)
+            w.write_byte(len(fvtx.att_array))
+            w.write_byte(len(fvtx.buffers))
+            w.write_uint16(i)
+            w.write_uint32(fvtx.header.vertex_count)
+            w.write_uint32(fvtx.header.skinWeightInfluence)
+        for i, fvtx in enumerate(fvtx_array):
+            # Write the attributes.
+            w.label(("attributes", model_index, i))
+            for attribute in fvtx.att_array:
+                self._write_name(attribute.name_offset.name)
+                w.write_uint16BE(attribute.format)
+                w.write_uint16(0)
+                w.write_uint16(attribute.element_offset)
+                w.write_uint16(attribute.buffer_index)
+            self._write_dict(("attribute_dict", model_index, i), [a.name_offset.name for a in fvtx.att_array])
+            # Write the size and stride of each buffer.
+            w.label(("buffer_sizes", model_index, i))
+            for buffer in fvtx.buffers:
+                w.write_uint32(len(buffer.data))
+                w.write_bytes(bytes(12))
+            w.label(("buffer_strides", model_index, i))
+            for buffer in fvtx.buffers:
+                w.write_uint32(buffer.stride)
+                w.write_bytes(bytes(12))
+
+    def _write_fshp_array(self, model_index, fshp_array):
+        w = self.writer
+        w.align(8)
+        for i, fshp in enumerate(fshp_array):
+            w.label(("fshp", model_index, i))
+            self._write_block_header("FSHP", 0x70)
+            self._write_name(fshp.header.name_offset.name)
+            w.write_pointer(("fvtx", model_index, fshp.header.buffer_index))
+            w.write_pointer(self._key_if(("lod_models", model_index, i), len(fshp.lod_models)))
+            w.write_pointer(self._key_if(("skin_bone_indices", model_index, i), len(fshp.skin_bone_indices)))
+            for j in range(5):
+                w.write_pointer(None)  # Key shapes, their Index Group, bounding boxes, radii and user pointer
+            w.write_uint32(fshp.header.flag)
+            w.write_uint16(i)
+            w.write_uint16(fshp.header.material_index)
+            w.write_uint16(fshp.header.bone_index)
+            w.write_uint16(fshp.header.buffer_index)
+            w.write_uint16(len(fshp.skin_bone_indices))
+            w.write_byte(fshp.header.VertexSkinCount)
+            w.write_byte(len(fshp.lod_models))
+            w.write_uint32(0)  # Key shape and target attribute counts
+            w.write_uint32(0)
+        self._write_dict(("fshp_dict", model_index), [fshp.header.name_offset.name for fshp in fshp_array])
+        for i, fshp in enumerate(fshp_array):
+            # Write the LoD models, queueing their index buffers.
+            w.label(("lod_models", model_index, i))
+            for j, lod_model in enumerate(fshp.lod_models):
+                indices = numpy.frombuffer(lod_model.index_buffer, lod_model.index_format[0] + "u2").astype("<u2")
+                if self.optimize_vertex_cache and lod_model.PrimativeFormat == self.PRIMITIVE_TRIANGLES:
+                    indices = self._optimize_indices(fshp.header.name_offset.name, j, indices)
+                w.write_pointer(("submeshes", model_index, i, j))
+                w.write_pointer("memory_pool")
+                w.write_pointer(None)  # Runtime buffer
+                w.write_pointer(("index_buffer_size", model_index, i, j))
+                w.write_uint32(self._add_buffer(indices))
+                w.write_uint32(lod_model.PrimativeFormat)
+                w.write_uint32(self.INDEX_FORMAT_UINT16)
+                w.write_uint32(len(indices))
+                w.write_uint32(lod_model.skip_vertices)
+                w.write_uint16(1)  # Submesh count
+                w.write_uint16(0)
+            for j, lod_model in enumerate(fshp.lod_models):
+                # A single submesh drawing all indices.
+                w.label(("submeshes", model_index, i, j))
+                w.write_uint32(0)
+                w.write_uint32(lod_model.facecount)
+                w.label(("index_buffer_size", model_index, i, j))
+                w.write_uint32(2 * lod_model.facecount)
+                w.write_bytes(bytes(12))
+            if len(fshp.skin_bone_indices):
+                self._write_array(("skin_bone_indices", model_index, i), numpy.asarray(fshp.skin_bone_indices, "<u2"))
+            w.align(8)
+
+    def _write_fmat_array(self, model_index, fmat_array):
+        w = self.writer
+        w.align(8)
+        for i, fmat in enumerate(fmat_array):
+            textures = [texture.name_offset.name for texture in fmat.texture_selector_array]
+            w.label(("fmat", model_index, i))
+            self._write_block_header("FMAT", 0xB8)
+            self._write_name(fmat.header.name_offset.name)
+            for j in range(4):
+                w.write_pointer(None)  # Render info, its Index Group, shader assign and runtime textures
+            w.write_pointer(self._key_if(("textures", model_index, i), len(textures)))
+            w.write_pointer(None)  # Runtime samplers
+            w.write_pointer(None)  # Sampler descriptors
+            w.write_pointer(self._key_if(("sampler_dict", model_index, i), len(fmat.sampler_names)))
+            for j in range(9):
+                w.write_pointer(None)  # Parameters, user data, volatile flags and slots
+            w.write_uint32(fmat.header.flags)
+            w.write_uint16(i)
+            w.write_uint16(0)  # Render info count
+            w.write_byte(len(fmat.sampler_names))
+            w.write_byte(len(textures))
+            w.write_bytes(bytes(0xE))  # Parameter and user data counts and sizes
+        self._write_dict(("fmat_dict", model_index), [fmat.header.name_offset.name for fmat in fmat_array])
+        for i, fmat in enumerate(fmat_array):
+            w.label(("textures", model_index, i))
+            for texture in fmat.texture_selector_array:
+                self._write_name(texture.name_offset.name)
+            self._write_dict(("sampler_dict", model_index, i), [s.name_offset.name for s in fmat.sampler_names])
+
+    def _write_string_table(self):
+        # Write each string with its length, 0-terminated and aligned to 2 bytes, labelled for the pointers to it.
+        w = self.writer
+        w.align(8)
+        start = w.tell()
+        w.label("string_table")
+        w.write_raw_string("_STR")
+        w.write_uint32(0)
+        size_position = w.tell()
+        w.write_uint64(0)
+        w.write_uint32(len(self.strings) - 1)  # Excluding the empty string.
+        for string in sorted(self.strings, key=lambda s: s.encode("ascii")):
+            w.label(("string", string))
+            w.write_uint16(len(string))
+            w.write_0_string(string)
+            w.align(2)
+        w.label("file_name", w.labels[("string", self.name)] + 2)
+        # Store the size of the table.
+        end = w.tell()
+        w.seek(size_position)
+        w.write_uint64(end - start)
+        w.seek(self.string_table_size_position)
+        w.write_uint32(end - start)
+        w.seek(end)
+
+    def _write_memory_pool(self):
+        w = self.writer
+        w.align(8)
+        w.label("memory_pool")
+        w.write_bytes(bytes(self.MEMORY_POOL_SIZE))
+        w.label("buffer_info")
+        w.write_uint32(0)
+        w.write_uint32(self.buffer_size)
+        w.write_pointer("buffer_data")
+
+    def _write_buffers(self):
+        # Write the vertex and index buffers at their queued offsets, copying each array at once.
+        w = self.writer
+        w.align(self.BUFFER_ALIGNMENT)
+        w.label("buffer_data")
+        start = w.tell()
+        for offset, array in self.buffers:
+            w.seek(start + offset)
+            w.write_bytes(array)
+        w.seek(start + self.buffer_size)
+
+    def _write_relocation_table(self):
+        # The relocation table consists of 2 sections, the first covering the headers, the second the buffer data. Its
+        # entries describe the positions of 64-bit pointers as runs of consecutive pointers (up to 255), optionally
+        # repeated for structures following each other with the same stride (like all bones).
+        w = self.writer
+        w.align(8)
+        rlt = w.tell()
+        buffer_data = w.labels["buffer_data"]
+        entries = self._get_relocation_entries(sorted(p for p, key, format in w.fixups if format == "Q"))
+        w.label("rlt")
+        w.write_raw_string("_RLT")
+        w.write_uint32(rlt)
+        w.write_uint32(2)  # Section count
+        w.write_uint32(0)
+        for position, size, entry_index, entry_count in [
+                (0, buffer_data, 0, len(entries)),
+                (buffer_data, self.buffer_size, len(entries), 0)]:
+            w.write_uint64(0)  # Runtime pointer
+            w.write_uint32(position)
+            w.write_uint32(size)
+            w.write_uint32(entry_index)
+            w.write_uint32(entry_count)
+        for position, struct_count, offset_count, padding_count in entries:
+            w.write_uint32(position)
+            w.write_uint16(struct_count)
+            w.write_byte(offset_count)
+            w.write_byte(padding_count)
+
+    @staticmethod
+    def _get_relocation_entries(positions):
+        # Return (position, structure count, pointer count, padding count) entries covering the sorted positions.
+        runs = []
+        for position in positions:
+            if runs and position == runs[-1][0] + 8 * runs[-1][1] and runs[-1][1] < 0xFF:
+                runs[-1][1] += 1
+            else:
+                runs.append([position, 1])
+        entries = []
+        for position, count in runs:
+            if entries:
+                start, struct_count, offset_count, padding_count = entries[-1]
+                gap = position - start - 8 * (offset_count + padding_count) * struct_count
+                if count == offset_count and struct_count < 0xFFFF:
+                    if struct_count == 1 and gap >= 0 and gap % 8 == 0 and gap // 8 <= 0xFF:
+                        entries[-1] = (start, 2, offset_count, gap // 8)
+                        continue
+                    if struct_count > 1 and gap == 0:
+                        entries[-1] = (start, struct_count + 1, offset_count, padding_count)
+                        continue
+            entries.append((position, 1, count, 0))
+        return entries
+
+
+class EncodedFvtx:
+    # An FVTX built from attribute arrays by encode_fvtx(), providing the members BfresWriter reads from an
+    # FvtxSubsection.
+    class Header:
+        def __init__(self, vertex_count, skin_weight_influence):
+            self.vertex_count = vertex_count
+            self.skinWeightInfluence = skin_weight_influence
+
+    class Attribute:
+        def __init__(self, name, format, element_offset, buffer_index):
+            self.name_offset = types.SimpleNamespace(name=name)
+            self.format = format
+            self.element_offset = element_offset
+            self.buffer_index = buffer_index
+
+    def __init__(self, header, att_array, buffers):
+        self.header = header
+        self.att_array = att_array
+        self.buffers = buffers
+
+
+def encode_fvtx(arrays, formats, buffer_layout=None, skin_weight_influence=0):
+    # Encode attribute arrays (mapping vertex member names like "p0" to arrays, as returned by
+    # FvtxSubsection.get_attribute_arrays()) into the formats mapped to the same names. The attributes of each buffer in
+    # the layout (a list of member name lists, by default one buffer with all attributes) are interleaved, each aligned
+    # to the size of its components. Returns the EncodedFvtx and the largest quantization error of each attribute.
+    buffer_layout = buffer_layout or [list(formats)]
+    vertex_counts = {len(arrays[name]) for name in formats}
+    if len(vertex_counts) > 1:
+        raise AssertionError("Attribute arrays have different vertex counts.")
+    vertex_count = vertex_counts.pop() if vertex_counts else 0
+    att_array = []
+    buffers = []
+    errors = {}
+    for buffer_index, names in enumerate(buffer_layout):
+        columns = []
+        fields = {"names": [], "formats": [], "offsets": []}
+        offset = 0
+        for name in names:
+            values = numpy.asarray(arrays[name]).reshape(vertex_count, -1)
+            encoded, decoded = FvtxSubsection.Attribute.encode_array(formats[name], values, name)
+            errors[name] = float(numpy.abs(decoded[:, :values.shape[1]] - values).max()) if vertex_count else 0.0
+            addon.log(3, "Attribute {}: quantization error {:.3g}".format(name, errors[name]))
+            offset = -(-offset // encoded.itemsize) * encoded.itemsize
+            att_array.append(EncodedFvtx.Attribute("_" + name, formats[name], offset, buffer_index))
+            fields["names"].append(name)
+            fields["formats"].append((encoded.dtype, encoded.shape[1:]))
+            fields["offsets"].append(offset)
+            offset += encoded.itemsize * encoded.shape[1]
+            columns.append(encoded)
+        fields["itemsize"] = -(-offset // 4) * 4
+        # Assign each encoded column to its field of all elements at once.
+        elements = numpy.zeros(vertex_count, numpy.dtype(fields))
+        for name, encoded in zip(names, columns):
+            elements[name] = encoded
+        data = elements.view(numpy.uint8)
+        buffers.append(FvtxSubsection.buffData(len(data), fields["itemsize"], 0, data))
+    return EncodedFvtx(EncodedFvtx.Header(vertex_count, skin_weight_influence), att_array, buffers), errors
+
+
+def write_file(filepath, name, fmdl_array, optimize_vertex_cache=False):
+    # Write a BFRES file with the given name and FMDL models.
+    data = BfresWriter(name, fmdl_array, optimize_vertex_cache).write()
+    with open(filepath, "wb") as raw:
+        raw.write(data)
@@ -1,9 +1,17 @@
 import io
+import mmap
 import struct
 
 
 class BinaryReader:
     def __init__(self, raw):
+        # Buffers like memory-mapped files are read through a stream over them, but can also return views of their
+        # data without copying it.
+        if isinstance(raw, (bytes, bytearray, memoryview, mmap.mmap)):
+            self.buffer = memoryview(raw)
+            raw = BufferStream(self.buffer)
+        else:
+            self.buffer = None
         self.raw = raw
         self.endianness = "<"  # Little-endian
 
@@ -37,6 +45,17 @@ class BinaryReader:
     def read_bytes(self, count):
         return self.reader.read(count)
 
+    def read_view(self, count):
+        # Return a memoryview of the next bytes, only copying them if the reader was not opened on a buffer.
+        if self.buffer is None:
+            return memoryview(self.reader.read(count))
+        position = self.reader.tell()
+        self.reader.seek(count, io.SEEK_CUR)
+        return self.buffer[position:position + count]
+
+    def read_int16(self):
+        return struct.unpack(self.endianness + "h", self.reader.read(2))[0]
+
     def read_int32(self):
         return struct.unpack(self.endianness + "i", self.reader.read(4))[0]
 
@@ -73,10 +92,43 @@ class BinaryReader:
     def read_uint32s(self, count):
         return struct.unpack(self.endianness + str(int(count)) + "I", self.reader.read(4 * count))
 
+    def read_uint64s(self, count):
+        return struct.unpack(self.endianness + str(int(count)) + "Q", self.reader.read(8 * count))
+
     def read_raw_string(self, length, encoding="ascii"):
         return self.reader.read(length).decode(encoding)
 
 
+class BufferStream(io.RawIOBase):
+    # Read-only raw stream over a memoryview, allowing to wrap it in a BufferedReader without copying the whole buffer.
+    def __init__(self, buffer):
+        self.buffer = buffer
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        count = max(0, min(len(b), len(self.buffer) - self.position))
+        b[:count] = self.buffer[self.position:self.position + count]
+        self.position += count
+        return count
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += len(self.buffer)
+        self.position = offset
+        return self.position
+
+    def tell(self):
+        return self.position
+
+
 class BinaryWriter:
     def __init__(self, raw):
         self.raw = raw
@@ -163,3 +215,106 @@ class Offset:
         writer.seek(self.position)
         writer.write_uint32(self.value)
         writer.seek(current_position)
+
+
+class BufferWriter:
+    # Writes into a single preallocated bytearray, which doubles its size when running out of space. Instead of seeking
+    # back to satisfy each offset, pointers are recorded as fixups referencing a label (any hashable key marking a
+    # position), and all of them are resolved in one final pass with resolve(), once every label is known.
+    def __init__(self, capacity=0x10000):
+        self.buffer = bytearray(capacity)
+        self.position = 0
+        self.size = 0  # The end of the written data.
+        self.endianness = "<"  # Little-endian
+        self.labels = {}
+        self.fixups = []  # (position, label, struct format) tuples.
+
+    def _reserve(self, count):
+        # Return the position to write count bytes at and advance behind them, growing the buffer if required.
+        position = self.position
+        self.position += count
+        if self.position > len(self.buffer):
+            self.buffer.extend(bytes(max(self.position, 2 * len(self.buffer)) - len(self.buffer)))
+        self.size = max(self.size, self.position)
+        return position
+
+    def _pack(self, format, *values):
+        format = self.endianness + format
+        struct.pack_into(format, self.buffer, self._reserve(struct.calcsize(format)), *values)
+
+    def align(self, alignment):
+        self.write_bytes(bytes(-self.position % alignment))
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        self.position = offset
+
+    def tell(self):
+        return self.position
+
+    def label(self, key, position=None):
+        # Mark the current (or given) position as the target of pointers referencing the key.
+        self.labels[key] = self.position if position is None else position
+
+    def add_fixup(self, position, key, format="Q"):
+        # Record a pointer at the given position, e.g. inside an array written at once, to be resolved later.
+        self.fixups.append((position, key, format))
+
+    def write_pointer(self, key, format="Q"):
+        # Write a pointer to the position labelled with the key, resolved later. A key of None writes a null pointer.
+        if key is not None:
+            self.add_fixup(self.position, key, format)
+        self._pack(format, 0)
+
+    def resolve(self):
+        # Satisfy all pointers with the positions of their labels.
+        for position, key, format in self.fixups:
+            struct.pack_into(self.endianness + format, self.buffer, position, self.labels[key])
+
+    def getbuffer(self):
+        # Return a view of the written data, without copying it.
+        return memoryview(self.buffer)[:self.size]
+
+    def write_0_string(self, value, encoding="ascii"):
+        self.write_raw_string(value, encoding)
+        self.write_byte(0)
+
+    def write_byte(self, value):
+        self._pack("B", value)
+
+    def write_bytes(self, value):
+        # Accepts anything supporting the buffer protocol, like C-contiguous NumPy arrays, copying it in one step.
+        view = memoryview(value)
+        view = view.cast("B") if view.nbytes else b""
+        position = self._reserve(len(view))
+        self.buffer[position:position + len(view)] = view
+
+    def write_int32(self, value):
+        self._pack("i", value)
+
+    def write_single(self, value):
+        self._pack("f", value)
+
+    def write_singles(self, value):
+        self._pack(str(len(value)) + "f", *value)
+
+    def write_uint16(self, value):
+        self._pack("H", value)
+
+    def write_uint16BE(self, value):
+        struct.pack_into(">H", self.buffer, self._reserve(2), value)
+
+    def write_uint16s(self, value):
+        self._pack(str(len(value)) + "H", *value)
+
+    def write_uint32(self, value):
+        self._pack("I", value)
+
+    def write_uint64(self, value):
+        self._pack("Q", value)
+
+    def write_raw_string(self, value, encoding="ascii"):
+        self.write_bytes(value.encode(encoding))
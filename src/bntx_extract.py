@@ -22,9 +22,15 @@
 
 """bntx_extract.py: Decode BNTX images."""
 
-import struct, sys, os, bpy
+import collections, struct, sys, os
 
+from . import addon
+from . import astc
+from . import bcn
+from . import bptc
 from . import dds
+from . import profiling
+from . import rgba
 from . import swizzle
 
 DIV_ROUND_UP = swizzle.DIV_ROUND_UP
@@ -113,7 +119,40 @@ bpps = {  # format -> bytes_per_pixel
 }
 
 
+decoders = {  # format -> function(data, width, height) returning an RGBA uint8 or float16 array
+    0x0b01: rgba.decode_r8_g8_b8_a8,
+    0x0b06: rgba.decode_r8_g8_b8_a8,
+    0x0701: rgba.decode_r5_g6_b5,
+    0x0201: rgba.decode_r8,
+    0x0901: rgba.decode_r8_g8,
+    0x1a01: bcn.decode_bc1,
+    0x1a06: bcn.decode_bc1,
+    0x1b01: bcn.decode_bc2,
+    0x1b06: bcn.decode_bc2,
+    0x1c01: bcn.decode_bc3,
+    0x1c06: bcn.decode_bc3,
+    0x1d01: bcn.decode_bc4,
+    0x1d02: lambda data, width, height: bcn.decode_bc4(data, width, height, True),
+    0x1e01: bcn.decode_bc5,
+    0x1e02: lambda data, width, height: bcn.decode_bc5(data, width, height, True),
+    0x1f01: bptc.decode_bc6h,
+    0x1f02: lambda data, width, height: bptc.decode_bc6h(data, width, height, True),
+    0x2001: bptc.decode_bc7,
+    0x2006: bptc.decode_bc7,
+}
+
+
+def _astcDecoder(format_):
+    blkWidth, blkHeight = blk_dims[format_ >> 8]
+    srgb = (format_ & 0xff) == 0x06
+    return lambda data, width, height: astc.decode_astc(data, width, height, blkWidth, blkHeight, srgb)
+
+
+decoders.update({format_: _astcDecoder(format_) for format_ in formats if (format_ >> 8) in ASTC_formats})
+
+
 def bytes_to_string(data, end=0):
+    data = bytes(data)  # Allow memoryviews of the file.
     if not end:
         end = data.find(b'\0')
         if end == -1:
@@ -123,71 +162,111 @@ def bytes_to_string(data, end=0):
 
 
 class BNTXHeader(struct.Struct):
+    Fields = collections.namedtuple('BNTXHeader', 'magic version bom revision fileNameAddr strAddr relocAddr fileSize')
+
     def __init__(self, bom):
         super().__init__(bom + '8si2Hi2xh2i')
 
     def data(self, data, pos):
-        (self.magic,
-         self.version,
-         self.bom,
-         self.revision,
-         self.fileNameAddr,
-         self.strAddr,
-         self.relocAddr,
-         self.fileSize) = self.unpack_from(data, pos)
+        return self.Fields._make(self.unpack_from(data, pos))
 
 
 class NXHeader(struct.Struct):
+    Fields = collections.namedtuple('NXHeader', 'magic count infoPtrAddr dataBlkAddr dictAddr strDictSize')
+
     def __init__(self, bom):
         super().__init__(bom + '4sI3qI')
 
     def data(self, data, pos):
-        (self.magic,
-         self.count,
-         self.infoPtrAddr,
-         self.dataBlkAddr,
-         self.dictAddr,
-         self.strDictSize) = self.unpack_from(data, pos)
+        return self.Fields._make(self.unpack_from(data, pos))
 
 
 class BRTIInfo(struct.Struct):
+    Fields = collections.namedtuple('BRTIInfo', 'magic size_ size_2 tileMode dim flags swizzle numMips unk18 format_ '
+                                                'unk20 width height unk2C numFaces sizeRange unk38 unk3C unk40 unk44 '
+                                                'unk48 unk4C imageSize alignment compSel type_ nameAddr parentAddr '
+                                                'ptrsAddr')
+
     def __init__(self, bom):
         super().__init__(bom + '4siq2b3H3I5i6I4i3q')
 
     def data(self, data, pos):
-        (self.magic,
-         self.size_,
-         self.size_2,
-         self.tileMode,
-         self.dim,
-         self.flags,
-         self.swizzle,
-         self.numMips,
-         self.unk18,
-         self.format_,
-         self.unk20,
-         self.width,
-         self.height,
-         self.unk2C,
-         self.numFaces,
-         self.sizeRange,
-         self.unk38,
-         self.unk3C,
-         self.unk40,
-         self.unk44,
-         self.unk48,
-         self.unk4C,
-         self.imageSize,
-         self.alignment,
-         self.compSel,
-         self.type_,
-         self.nameAddr,
-         self.parentAddr,
-         self.ptrsAddr) = self.unpack_from(data, pos)
+        return self.Fields._make(self.unpack_from(data, pos))
+
+
+class DICHeader(struct.Struct):
+    Fields = collections.namedtuple('DICHeader', 'magic count')
+
+    def __init__(self, bom):
+        super().__init__(bom + '4si')
+
+    def data(self, data, pos):
+        return self.Fields._make(self.unpack_from(data, pos))
+
+
+class DICEntry(struct.Struct):
+    Fields = collections.namedtuple('DICEntry', 'reference leftIndex rightIndex nameAddr')
+
+    def __init__(self, bom):
+        super().__init__(bom + 'i2Hq')
+
+    def data(self, data, pos):
+        return self.Fields._make(self.unpack_from(data, pos))
+
+
+class BNTXStructs:
+    # The structures of one byte order, compiled once and reused for every file and texture. As they are shared by all
+    # threads, data() returns the unpacked fields instead of storing them in the structure.
+    def __init__(self, bom):
+        self.header = BNTXHeader(bom)
+        self.nx = NXHeader(bom)
+        self.dic = DICHeader(bom)
+        self.dicEntry = DICEntry(bom)
+        self.info = BRTIInfo(bom)
+        self.nameLen = struct.Struct(bom + 'H')
+        self.addr = struct.Struct(bom + 'q')
+
+
+_structs = {'<': BNTXStructs('<'), '>': BNTXStructs('>')}
 
 
 class TexInfo:
-    pass
+    # The image data is only sliced out of the BNTX file when it is accessed.
+    @property
+    def data(self):
+        return self.file[self.dataAddr:self.dataAddr + self.imageSize]
+
+
+class BNTXIndex:
+    # Maps the texture names of the BNTX dictionary to their info addresses. The info of a texture is only parsed
+    # when it is requested with get().
+    def __init__(self, f, structs, infoAddrs):
+        self.file = f
+        self.structs = structs
+        self.infoAddrs = infoAddrs
+        self.textures = {}
+
+    def __contains__(self, name):
+        return name in self.infoAddrs
+
+    def __iter__(self):
+        return iter(self.infoAddrs)
+
+    def __len__(self):
+        return len(self.infoAddrs)
+
+    def get(self, name):
+        tex = self.textures.get(name)
+        if tex is None and name in self.infoAddrs:
+            tex = readTexInfo(self.file, self.structs, self.infoAddrs[name])
+            self.textures[name] = tex
+
+        return tex
+
+
+def readName(f, structs, addr):
+    nameLen = structs.nameLen.unpack_from(f, addr)[0]
+    return bytes_to_string(f[addr + 2:addr + 2 + nameLen], nameLen)
 
 
 def readBNTX(f):
@@ -202,104 +281,97 @@ def readBNTX(f):
     else:
         raise ValueError("Invalid BOM!")
 
-    header = BNTXHeader(bom)
-    header.data(f, pos)
-    pos += header.size
+    structs = _structs[bom]
+
+    header = structs.header.data(f, pos)
+    pos += structs.header.size
 
     if bytes_to_string(header.magic, 4) != "BNTX":
         raise ValueError("Invalid file header!")
 
-    print("")
-    print("File name: " + bytes_to_string(f[header.fileNameAddr:header.fileNameAddr+12]))
-
-    nx = NXHeader(bom)
-    nx.data(f, pos)
-    pos += nx.size
+    nx = structs.nx.data(f, pos)
+    pos += structs.nx.size
 
-    print("")
-    print("Textures count: " + str(nx.count))
+    addon.log(1, "BNTX {} ({} textures)".format(bytes_to_string(f[header.fileNameAddr:header.fileNameAddr+12]),
+                                                nx.count))
 
-    textures = []
+    # The dictionary starts with a root entry, followed by one entry per texture in the order of the info pointers.
+    entrySize = structs.dicEntry.size
+    infoAddrs = {}
 
     for i in range(nx.count):
-        pos = nx.infoPtrAddr + i * 8
+        entry = structs.dicEntry.data(f, nx.dictAddr + structs.dic.size + (i + 1) * entrySize)
+        name = readName(f, structs, entry.nameAddr)
+        infoAddrs[name] = structs.addr.unpack_from(f, nx.infoPtrAddr + i * 8)[0]
 
-        pos = struct.unpack(bom + 'q', f[pos:pos+8])[0]
+    return BNTXIndex(f, structs, infoAddrs)
 
-        info = BRTIInfo(bom)
-        info.data(f, pos)
 
-        nameLen = struct.unpack(bom + 'H', f[info.nameAddr:info.nameAddr + 2])[0]
-        name = bytes_to_string(f[info.nameAddr + 2:info.nameAddr + 2 + nameLen], nameLen)
+def readTexInfo(f, structs, pos):
+    info = structs.info.data(f, pos)
 
-        print("")
-        print("Image " + str(i + 1) + " name: " + name)
+    compSel = []
+    for i in range(4):
+        value = (info.compSel >> (8 * (3 - i))) & 0xff
+        if value == 0:
+            value = len(compSel) + 2
 
-        compSel = []
-        compSels = {0: "0", 1: "1", 2: "Red", 3: "Green", 4: "Blue", 5: "Alpha"}
-        for i in range(4):
-            value = (info.compSel >> (8 * (3 - i))) & 0xff
-            if value == 0:
-                value = len(compSel) + 2
+        compSel.append(value)
 
-            compSel.append(value)
+    dataAddr = structs.addr.unpack_from(f, info.ptrsAddr)[0]
+    mipOffsets = {0: 0}
 
-        types = {0: "1D", 1: "2D", 2: "3D", 3: "Cubemap", 8: "CubemapFar"}
-        if info.type_ not in types:
-            types[info.type_] = "Unknown"
+    for i in range(1, info.numMips):
+        mipOffset = structs.addr.unpack_from(f, info.ptrsAddr + i * 8)[0]
+        mipOffsets[i] = mipOffset - dataAddr
 
-        tileModes = {0: "TILING_MODE_PITCH", 1: "TILING_MODE_TILED"}
+    tex = TexInfo()
+    tex.name = readName(f, structs, info.nameAddr)
+    tex.tileMode = info.tileMode
+    tex.numMips = info.numMips
+    tex.mipOffsets = mipOffsets
+    tex.width = info.width
+    tex.height = info.height
+    tex.format = info.format_
+    tex.numFaces = info.numFaces
+    tex.sizeRange = info.sizeRange
+    tex.compSel = compSel
+    tex.channelSels = [(info.compSel >> (8 * i)) & 0xff for i in range(4)]  # Raw selectors for R, G, B, A
+    tex.alignment = info.alignment
+    tex.type = info.type_
+    tex.file = f
+    tex.dataAddr = dataAddr
+    tex.imageSize = info.imageSize
 
-        print("TileMode: " + tileModes[info.tileMode])
-        print("Dimensions: " + str(info.dim))
-        print("Flags: " + str(info.flags))
-        print("Swizzle: " + str(info.swizzle))
-        print("Number of Mipmaps: " + str(info.numMips - 1))
+    return tex
 
-        if info.format_ in formats:
-            print("Format: " + formats[info.format_])
 
-        else:
-            print("Format: " + str(info.format_))
-
-        print("Width: " + str(info.width))
-        print("Height: " + str(info.height))
-        print("Number of faces: " + str(info.numFaces))
-        print("Size Range: " + str(info.sizeRange))
-        print("Block Height: " + str(1 << info.sizeRange))
-        print("Image Size: " + str(info.imageSize))
-        print("Alignment: " + str(info.alignment))
-        print("Channel 1: " + compSels[compSel[3]])
-        print("Channel 2: " + compSels[compSel[2]])
-        print("Channel 3: " + compSels[compSel[1]])
-        print("Channel 4: " + compSels[compSel[0]])
-        print("Image type: " + types[info.type_])
-
-        dataAddr = struct.unpack(bom + 'q', f[info.ptrsAddr:info.ptrsAddr + 8])[0]
-        mipOffsets = {0: 0}
-
-        for i in range(1, info.numMips):
-            mipOffset = struct.unpack(bom + 'q', f[info.ptrsAddr + (i * 8):info.ptrsAddr + (i * 8) + 8])[0]
-            mipOffsets[i] = mipOffset - dataAddr
-
-        tex = TexInfo()
-        tex.name = name
-        tex.tileMode = info.tileMode
-        tex.numMips = info.numMips
-        tex.mipOffsets = mipOffsets
-        tex.width = info.width
-        tex.height = info.height
-        tex.format = info.format_
-        tex.numFaces = info.numFaces
-        tex.sizeRange = info.sizeRange
-        tex.compSel = compSel
-        tex.alignment = info.alignment
-        tex.type = info.type_
-        tex.data = f[dataAddr:dataAddr+info.imageSize]
-
-        textures.append(tex)
-
-    return textures
+def deswizzleTexture(tex):
+    if (tex.format >> 8) in blk_dims:
+        blkWidth, blkHeight = blk_dims[tex.format >> 8]
+
+    else:
+        blkWidth, blkHeight = 1, 1
+
+    bpp = bpps[tex.format >> 8]
+
+    size = DIV_ROUND_UP(tex.width, blkWidth) * DIV_ROUND_UP(tex.height, blkHeight) * bpp
+
+    result = swizzle.deswizzle(tex.width, tex.height, blkWidth, blkHeight, bpp, tex.tileMode, tex.alignment, tex.sizeRange, tex.data)
+    return result[:size]
+
+
+def decodeTexture(tex):
+    # Decode the first mipmap into an RGBA array of the shape (height, width, 4), or return None if the format
+    # can only be converted with texconv. The component selectors of the texture are applied to the result.
+    if tex.format not in decoders or tex.numFaces >= 2:
+        return None
+
+    with profiling.span("deswizzle"):
+        data = deswizzleTexture(tex)
+    with profiling.span("texture decode"):
+        pixels = decoders[tex.format](data, tex.width, tex.height)
+        return rgba.remap_channels(pixels, tex.channelSels)
 
 
 def saveTextures(textures, filepath):
@@ -353,12 +425,9 @@ def saveTextures(textures, filepath):
             else:
                 blkWidth, blkHeight = 1, 1
 
-            bpp = bpps[tex.format >> 8]
-
-            size = DIV_ROUND_UP(tex.width, blkWidth) * DIV_ROUND_UP(tex.height, blkHeight) * bpp
+            size = DIV_ROUND_UP(tex.width, blkWidth) * DIV_ROUND_UP(tex.height, blkHeight) * bpps[tex.format >> 8]
 
-            result = swizzle.deswizzle(tex.width, tex.height, blkWidth, blkHeight, bpp, tex.tileMode, tex.alignment, tex.sizeRange, tex.data)
-            result = result[:size]
+            result = deswizzleTexture(tex)
             directory = os.path.dirname(filepath)
             ddsPath = os.path.join(directory, tex.name+".dds")
             astcPath = os.path.join(directory, tex.name+".astc")
@@ -0,0 +1,420 @@
+import numpy
+import time
+
+'''
+BC6H (HDR RGB) and BC7 (LDR RGBA) compressed textures, together known as BPTC, store 4x4 texel blocks of 16 bytes.
+Each block selects one of several modes in its first bits, which determine how the remaining bits are laid out:
+- The number of subsets (1 to 3) and which partition shape assigns the texels to the subsets.
+- The precision of the endpoints of each subset, and whether they are stored as deltas to the first endpoint (BC6H).
+- The precision of the per-texel indices interpolating between the endpoints of the texel's subset.
+To avoid a per-block Python loop, the blocks are unpacked into an array of their 128 bits and grouped by mode. Each
+mode group then reads its fields for all of its blocks at once. Partition-dependent data (the subset of each texel and
+the anchor texels which store one index bit less) is looked up from the partition tables for all blocks of the group,
+so every partition of a mode is decoded in the same array operations.
+BC7 decodes to an RGBA uint8 array and BC6H to an RGBA float16 array, both of the shape (height, width, 4) with the
+first row being the top of the image.
+'''
+
+# Subset index of each texel for the 2 subset partitions (2 bits per texel, texel 0 in the lowest bits).
+_PARTITIONS_2 = [
+    0x50505050, 0x40404040, 0x54545454, 0x54505040, 0x50404000, 0x55545450, 0x55545040, 0x54504000,
+    0x50400000, 0x55555450, 0x55544000, 0x54400000, 0x55555440, 0x55550000, 0x55555500, 0x55000000,
+    0x55150100, 0x00004054, 0x15010000, 0x00405054, 0x00004050, 0x15050100, 0x05010000, 0x40505054,
+    0x00404050, 0x05010100, 0x14141414, 0x05141450, 0x01155440, 0x00555500, 0x15014054, 0x05414150,
+    0x44444444, 0x55005500, 0x11441144, 0x05055050, 0x05500550, 0x11114444, 0x41144114, 0x44111144,
+    0x15055054, 0x01055040, 0x05041050, 0x05455150, 0x14414114, 0x50050550, 0x41411414, 0x00141400,
+    0x00041504, 0x00105410, 0x10541000, 0x04150400, 0x50410514, 0x41051450, 0x05415014, 0x14054150,
+    0x41050514, 0x41505014, 0x40011554, 0x54150140, 0x50505500, 0x00555050, 0x15151010, 0x54540404,
+]
+
+# Subset index of each texel for the 3 subset partitions (2 bits per texel, texel 0 in the lowest bits).
+_PARTITIONS_3 = [
+    0xAA685050, 0x6A5A5040, 0x5A5A4200, 0x5450A0A8, 0xA5A50000, 0xA0A05050, 0x5555A0A0, 0x5A5A5050,
+    0xAA550000, 0xAA555500, 0xAAAA5500, 0x90909090, 0x94949494, 0xA4A4A4A4, 0xA9A59450, 0x2A0A4250,
+    0xA5945040, 0x0A425054, 0xA5A5A500, 0x55A0A0A0, 0xA8A85454, 0x6A6A4040, 0xA4A45000, 0x1A1A0500,
+    0x0050A4A4, 0xAAA59090, 0x14696914, 0x69691400, 0xA08585A0, 0xAA821414, 0x50A4A450, 0x6A5A0200,
+    0xA9A58000, 0x5090A0A8, 0xA8A09050, 0x24242424, 0x00AA5500, 0x24924924, 0x24499224, 0x50A50A50,
+    0x500AA550, 0xAAAA4444, 0x66660000, 0xA5A0A5A0, 0x50A050A0, 0x69286928, 0x44AAAA44, 0x66666600,
+    0xAA444444, 0x54A854A8, 0x95809580, 0x96969600, 0xA85454A8, 0x80959580, 0xAA141414, 0x96960000,
+    0xAAAA1414, 0xA05050A0, 0xA0A5A5A0, 0x96000000, 0x40804080, 0xA9A8A9A8, 0xAAAAAA44, 0x2A4A5254,
+]
+
+# Anchor texel of the second subset of the 2 subset partitions.
+_ANCHORS_2 = [
+    15, 15, 15, 15, 15, 15, 15, 15, 15, 15, 15, 15, 15, 15, 15, 15,
+    15, 2, 8, 2, 2, 8, 8, 15, 2, 8, 2, 2, 8, 8, 2, 2,
+    15, 15, 6, 8, 2, 8, 15, 15, 2, 8, 2, 2, 2, 15, 15, 6,
+    6, 2, 6, 8, 15, 15, 2, 2, 15, 15, 15, 15, 15, 2, 2, 15,
+]
+
+# Anchor texels of the second and third subset of the 3 subset partitions.
+_ANCHORS_3 = [
+    (3, 15), (3, 8), (15, 8), (15, 3), (8, 15), (3, 15), (15, 3), (15, 8),
+    (8, 15), (8, 15), (6, 15), (6, 15), (6, 15), (5, 15), (3, 15), (3, 8),
+    (3, 15), (3, 8), (8, 15), (15, 3), (3, 15), (3, 8), (6, 15), (10, 8),
+    (5, 3), (8, 15), (8, 6), (6, 10), (8, 15), (5, 15), (15, 10), (15, 8),
+    (8, 15), (15, 3), (3, 15), (5, 10), (6, 10), (10, 8), (8, 9), (15, 10),
+    (15, 6), (3, 15), (15, 8), (5, 15), (15, 3), (15, 6), (15, 6), (15, 8),
+    (3, 15), (15, 3), (5, 15), (5, 15), (5, 15), (8, 15), (5, 15), (10, 15),
+    (5, 15), (10, 15), (8, 15), (13, 15), (15, 3), (12, 15), (3, 15), (3, 8),
+]
+
+# Interpolation weights for the index precisions.
+_WEIGHTS = {
+    2: numpy.array([0, 21, 43, 64]),
+    3: numpy.array([0, 9, 18, 27, 37, 46, 55, 64]),
+    4: numpy.array([0, 4, 9, 13, 17, 21, 26, 30, 34, 38, 43, 47, 51, 55, 60, 64]),
+}
+
+# Number of blocks decoded at once, limiting the memory needed for the unpacked bits.
+_CHUNK_SIZE = 0x10000
+
+
+def _build_partition_tables():
+    texels = numpy.arange(16, dtype=numpy.uint32) * 2
+    subsets = numpy.zeros((4, 64, 16), numpy.intp)  # subset count -> partition -> subset of each texel
+    subsets[2] = (numpy.array(_PARTITIONS_2, numpy.uint32)[:, None] >> texels) & 3
+    subsets[3] = (numpy.array(_PARTITIONS_3, numpy.uint32)[:, None] >> texels) & 3
+    anchors = numpy.zeros((4, 64, 16), bool)  # subset count -> partition -> texels storing one index bit less
+    anchors[:, :, 0] = True
+    anchors[2, numpy.arange(64), _ANCHORS_2] = True
+    anchors[3, numpy.arange(64), [a for a, b in _ANCHORS_3]] = True
+    anchors[3, numpy.arange(64), [b for a, b in _ANCHORS_3]] = True
+    return subsets, anchors
+
+
+_SUBSETS, _ANCHORS = _build_partition_tables()
+
+
+# ---- BC7 ----
+
+class _Bc7Mode:
+    def __init__(self, subsets, partition_bits, rotation_bits, index_selection_bits, color_bits, alpha_bits,
+                 endpoint_pbits, shared_pbits, index_bits, index_bits2):
+        self.subsets = subsets
+        self.partition_bits = partition_bits
+        self.rotation_bits = rotation_bits
+        self.index_selection_bits = index_selection_bits
+        self.color_bits = color_bits
+        self.alpha_bits = alpha_bits
+        self.endpoint_pbits = endpoint_pbits
+        self.shared_pbits = shared_pbits
+        self.index_bits = index_bits
+        self.index_bits2 = index_bits2
+
+
+_BC7_MODES = [
+    _Bc7Mode(3, 4, 0, 0, 4, 0, 1, 0, 3, 0),
+    _Bc7Mode(2, 6, 0, 0, 6, 0, 0, 1, 3, 0),
+    _Bc7Mode(3, 6, 0, 0, 5, 0, 0, 0, 2, 0),
+    _Bc7Mode(2, 6, 0, 0, 7, 0, 1, 0, 2, 0),
+    _Bc7Mode(1, 0, 2, 1, 5, 6, 0, 0, 2, 3),
+    _Bc7Mode(1, 0, 2, 0, 7, 8, 0, 0, 2, 2),
+    _Bc7Mode(1, 0, 0, 0, 7, 7, 1, 0, 4, 0),
+    _Bc7Mode(2, 6, 0, 0, 5, 5, 1, 0, 2, 0),
+]
+
+
+def decode_bc7(data, width, height):
+    blocks = _read_blocks(data, width, height)
+    texels = numpy.zeros((len(blocks), 16, 4), numpy.uint8)
+    for start in range(0, len(blocks), _CHUNK_SIZE):
+        chunk = blocks[start:start + _CHUNK_SIZE]
+        bits = _unpack_bits(chunk)
+        # The mode is the index of the lowest set bit of the first byte. Blocks without any set bit are invalid and
+        # decode to transparent black.
+        modes = numpy.argmax(bits[:, :8], axis=1)
+        modes[chunk[:, 0] == 0] = 8
+        for mode_index, mode in enumerate(_BC7_MODES):
+            group = numpy.flatnonzero(modes == mode_index)
+            if len(group):
+                texels[start + group] = _decode_bc7_mode(bits[group], mode_index, mode)
+    return _blocks_to_image(texels, width, height)
+
+
+def _decode_bc7_mode(bits, mode_index, mode):
+    count = len(bits)
+    pos = mode_index + 1
+    partitions = _read_field(bits, pos, mode.partition_bits)
+    pos += mode.partition_bits
+    rotations = _read_field(bits, pos, mode.rotation_bits)
+    pos += mode.rotation_bits
+    index_selections = _read_field(bits, pos, mode.index_selection_bits)
+    pos += mode.index_selection_bits
+    # Read the endpoints, stored channel by channel for all endpoints of all subsets.
+    endpoint_count = mode.subsets * 2
+    endpoints = numpy.zeros((count, endpoint_count, 4), numpy.int32)
+    for channel in range(3):
+        for endpoint in range(endpoint_count):
+            endpoints[:, endpoint, channel] = _read_field(bits, pos, mode.color_bits)
+            pos += mode.color_bits
+    if mode.alpha_bits:
+        for endpoint in range(endpoint_count):
+            endpoints[:, endpoint, 3] = _read_field(bits, pos, mode.alpha_bits)
+            pos += mode.alpha_bits
+    # Append P-bits as the least significant bit, either unique per endpoint or shared per subset.
+    color_bits = mode.color_bits
+    alpha_bits = mode.alpha_bits
+    if mode.endpoint_pbits or mode.shared_pbits:
+        for endpoint in range(endpoint_count):
+            if mode.endpoint_pbits:
+                pbit = bits[:, pos + endpoint]
+            else:
+                pbit = bits[:, pos + endpoint // 2]
+            endpoints[:, endpoint] = (endpoints[:, endpoint] << 1) | pbit[:, None]
+        pos += endpoint_count if mode.endpoint_pbits else mode.subsets
+        color_bits += 1
+        alpha_bits += 1 if alpha_bits else 0
+    # Expand the endpoints to 8 bits by replicating their highest bits.
+    endpoints[:, :, :3] = _expand_bits(endpoints[:, :, :3], color_bits)
+    if mode.alpha_bits:
+        endpoints[:, :, 3] = _expand_bits(endpoints[:, :, 3], alpha_bits)
+    else:
+        endpoints[:, :, 3] = 0xFF
+    # Read the indices of all texels. Anchor texels are stored with one bit less, which depends on the partition.
+    subsets = _SUBSETS[mode.subsets][partitions]
+    anchors = _ANCHORS[mode.subsets][partitions]
+    indices = _read_indices(bits, pos, mode.index_bits, anchors)
+    pos += 16 * mode.index_bits - mode.subsets
+    # Interpolate the endpoints of each texel's subset.
+    rows = numpy.arange(count)[:, None]
+    endpoint0 = endpoints[rows, subsets * 2]
+    endpoint1 = endpoints[rows, subsets * 2 + 1]
+    weights = _WEIGHTS[mode.index_bits][indices]
+    if mode.index_bits2:
+        # Modes 4 and 5 use separate indices for the color and alpha channels, which mode 4 can swap.
+        indices2 = _read_indices(bits, pos, mode.index_bits2, _ANCHORS[1][numpy.zeros(count, numpy.intp)])
+        weights2 = _WEIGHTS[mode.index_bits2][indices2]
+        swap = index_selections.astype(bool)[:, None]
+        weights, weights2 = numpy.where(swap, weights2, weights), numpy.where(swap, weights, weights2)
+        weights = numpy.concatenate((numpy.repeat(weights[:, :, None], 3, 2), weights2[:, :, None]), 2)
+    else:
+        weights = weights[:, :, None]
+    texels = ((64 - weights) * endpoint0 + weights * endpoint1 + 32) >> 6
+    # Undo the rotation which swapped the alpha channel with one of the color channels.
+    if mode.rotation_bits:
+        for rotation in range(1, 4):
+            rotated = rotations == rotation
+            channels = [0, 1, 2, 3]
+            channels[rotation - 1], channels[3] = 3, rotation - 1
+            texels[rotated] = texels[rotated][:, :, channels]
+    return texels
+
+
+def _expand_bits(values, bits):
+    return (values << (8 - bits)) | (values >> (2 * bits - 8))
+
+
+# ---- BC6H ----
+
+class _Bc6hMode:
+    def __init__(self, transformed, endpoint_bits, delta_bits, layout):
+        self.transformed = transformed
+        self.endpoint_bits = endpoint_bits
+        self.delta_bits = delta_bits  # Per channel.
+        # Parse the layout into (endpoint, channel, bit) tuples in stream order, e.g. "r0[9:0]" stores bits 0 to 9 of
+        # the red channel of endpoint 0, "r0[10:15]" the bits 15 down to 10.
+        self.layout = []
+        for field in layout:
+            endpoint = int(field[1])
+            channel = "rgb".index(field[0])
+            first, last = (int(x) for x in field[3:-1].split(":"))
+            if first >= last:
+                bit_range = range(last, first + 1)
+            else:
+                bit_range = range(last, first - 1, -1)
+            self.layout.extend((endpoint, channel, bit) for bit in bit_range)
+        self.subsets = 2 if max(endpoint for endpoint, channel, bit in self.layout) > 1 else 1
+
+
+_BC6H_MODES = {  # mode bits -> mode (2-bit mode values are stored as 5-bit values with upper bits 0)
+    0x00: _Bc6hMode(True, 10, (5, 5, 5), [
+        "g2[4:4]", "b2[4:4]", "b3[4:4]", "r0[9:0]", "g0[9:0]", "b0[9:0]", "r1[4:0]", "g3[4:4]", "g2[3:0]", "g1[4:0]",
+        "b3[0:0]", "g3[3:0]", "b1[4:0]", "b3[1:1]", "b2[3:0]", "r2[4:0]", "b3[2:2]", "r3[4:0]", "b3[3:3]"]),
+    0x01: _Bc6hMode(True, 7, (6, 6, 6), [
+        "g2[5:5]", "g3[4:4]", "g3[5:5]", "r0[6:0]", "b3[0:0]", "b3[1:1]", "b2[4:4]", "g0[6:0]", "b2[5:5]", "b3[2:2]",
+        "g2[4:4]", "b0[6:0]", "b3[3:3]", "b3[5:5]", "b3[4:4]", "r1[5:0]", "g2[3:0]", "g1[5:0]", "g3[3:0]", "b1[5:0]",
+        "b2[3:0]", "r2[5:0]", "r3[5:0]"]),
+    0x02: _Bc6hMode(True, 11, (5, 4, 4), [
+        "r0[9:0]", "g0[9:0]", "b0[9:0]", "r1[4:0]", "r0[10:10]", "g2[3:0]", "g1[3:0]", "g0[10:10]", "b3[0:0]",
+        "g3[3:0]", "b1[3:0]", "b0[10:10]", "b3[1:1]", "b2[3:0]", "r2[4:0]", "b3[2:2]", "r3[4:0]", "b3[3:3]"]),
+    0x06: _Bc6hMode(True, 11, (4, 5, 4), [
+        "r0[9:0]", "g0[9:0]", "b0[9:0]", "r1[3:0]", "r0[10:10]", "g3[4:4]", "g2[3:0]", "g1[4:0]", "g0[10:10]",
+        "g3[3:0]", "b1[3:0]", "b0[10:10]", "b3[1:1]", "b2[3:0]", "r2[3:0]", "b3[0:0]", "b3[2:2]", "r3[3:0]",
+        "g2[4:4]", "b3[3:3]"]),
+    0x0A: _Bc6hMode(True, 11, (4, 4, 5), [
+        "r0[9:0]", "g0[9:0]", "b0[9:0]", "r1[3:0]", "r0[10:10]", "b2[4:4]", "g2[3:0]", "g1[3:0]", "g0[10:10]",
+        "b3[0:0]", "g3[3:0]", "b1[4:0]", "b0[10:10]", "b2[3:0]", "r2[3:0]", "b3[1:1]", "b3[2:2]", "r3[3:0]",
+        "b3[4:4]", "b3[3:3]"]),
+    0x0E: _Bc6hMode(True, 9, (5, 5, 5), [
+        "r0[8:0]", "b2[4:4]", "g0[8:0]", "g2[4:4]", "b0[8:0]", "b3[4:4]", "r1[4:0]", "g3[4:4]", "g2[3:0]", "g1[4:0]",
+        "b3[0:0]", "g3[3:0]", "b1[4:0]", "b3[1:1]", "b2[3:0]", "r2[4:0]", "b3[2:2]", "r3[4:0]", "b3[3:3]"]),
+    0x12: _Bc6hMode(True, 8, (6, 5, 5), [
+        "r0[7:0]", "g3[4:4]", "b2[4:4]", "g0[7:0]", "b3[2:2]", "g2[4:4]", "b0[7:0]", "b3[3:3]", "b3[4:4]", "r1[5:0]",
+        "g2[3:0]", "g1[4:0]", "b3[0:0]", "g3[3:0]", "b1[4:0]", "b3[1:1]", "b2[3:0]", "r2[5:0]", "r3[5:0]"]),
+    0x16: _Bc6hMode(True, 8, (5, 6, 5), [
+        "r0[7:0]", "b3[0:0]", "b2[4:4]", "g0[7:0]", "g2[5:5]", "g2[4:4]", "b0[7:0]", "g3[5:5]", "b3[4:4]", "r1[4:0]",
+        "g3[4:4]", "g2[3:0]", "g1[5:0]", "g3[3:0]", "b1[4:0]", "b3[1:1]", "b2[3:0]", "r2[4:0]", "b3[2:2]", "r3[4:0]",
+        "b3[3:3]"]),
+    0x1A: _Bc6hMode(True, 8, (5, 5, 6), [
+        "r0[7:0]", "b3[1:1]", "b2[4:4]", "g0[7:0]", "b2[5:5]", "g2[4:4]", "b0[7:0]", "b3[5:5]", "b3[4:4]", "r1[4:0]",
+        "g3[4:4]", "g2[3:0]", "g1[4:0]", "b3[0:0]", "g3[3:0]", "b1[5:0]", "b2[3:0]", "r2[4:0]", "b3[2:2]", "r3[4:0]",
+        "b3[3:3]"]),
+    0x1E: _Bc6hMode(False, 6, (6, 6, 6), [
+        "r0[5:0]", "g3[4:4]", "b3[0:0]", "b3[1:1]", "b2[4:4]", "g0[5:0]", "g2[5:5]", "b2[5:5]", "b3[2:2]", "g2[4:4]",
+        "b0[5:0]", "g3[5:5]", "b3[3:3]", "b3[5:5]", "b3[4:4]", "r1[5:0]", "g2[3:0]", "g1[5:0]", "g3[3:0]", "b1[5:0]",
+        "b2[3:0]", "r2[5:0]", "r3[5:0]"]),
+    0x03: _Bc6hMode(False, 10, (10, 10, 10), [
+        "r0[9:0]", "g0[9:0]", "b0[9:0]", "r1[9:0]", "g1[9:0]", "b1[9:0]"]),
+    0x07: _Bc6hMode(True, 11, (9, 9, 9), [
+        "r0[9:0]", "g0[9:0]", "b0[9:0]", "r1[8:0]", "r0[10:10]", "g1[8:0]", "g0[10:10]", "b1[8:0]", "b0[10:10]"]),
+    0x0B: _Bc6hMode(True, 12, (8, 8, 8), [
+        "r0[9:0]", "g0[9:0]", "b0[9:0]", "r1[7:0]", "r0[10:11]", "g1[7:0]", "g0[10:11]", "b1[7:0]", "b0[10:11]"]),
+    0x0F: _Bc6hMode(True, 16, (4, 4, 4), [
+        "r0[9:0]", "g0[9:0]", "b0[9:0]", "r1[3:0]", "r0[10:15]", "g1[3:0]", "g0[10:15]", "b1[3:0]", "b0[10:15]"]),
+}
+
+
+def decode_bc6h(data, width, height, signed=False):
+    blocks = _read_blocks(data, width, height)
+    texels = numpy.zeros((len(blocks), 16, 4), numpy.uint16)
+    for start in range(0, len(blocks), _CHUNK_SIZE):
+        chunk = blocks[start:start + _CHUNK_SIZE]
+        bits = _unpack_bits(chunk)
+        # Modes are identified by 2 bits if their value is smaller than 2, otherwise by 5 bits. Reserved modes decode
+        # to black.
+        modes = _read_field(bits, 0, 5)
+        modes = numpy.where((modes & 3) < 2, modes & 3, modes)
+        for mode_bits, mode in _BC6H_MODES.items():
+            group = numpy.flatnonzero(modes == mode_bits)
+            if len(group):
+                texels[start + group] = _decode_bc6h_mode(bits[group], mode_bits, mode, signed)
+    # Set the alpha channel to 1.0.
+    texels[:, :, 3] = 0x3C00
+    return _blocks_to_image(texels, width, height).view(numpy.float16)
+
+
+def _decode_bc6h_mode(bits, mode_bits, mode, signed):
+    count = len(bits)
+    # Gather the scattered endpoint bits as given by the mode layout.
+    pos = 2 if mode_bits < 2 else 5
+    endpoint_count = mode.subsets * 2
+    endpoints = numpy.zeros((count, endpoint_count, 3), numpy.int32)
+    for endpoint, channel, bit in mode.layout:
+        endpoints[:, endpoint, channel] |= bits[:, pos].astype(numpy.int32) << bit
+        pos += 1
+    if mode.subsets == 2:
+        partitions = _read_field(bits, pos, 5)
+        pos += 5
+    else:
+        partitions = numpy.zeros(count, numpy.intp)
+    # Sign extend the endpoints where required and undo the delta transform.
+    endpoint_bits = mode.endpoint_bits
+    delta_bits = numpy.array(mode.delta_bits)
+    if signed:
+        endpoints[:, 0] = _sign_extend(endpoints[:, 0], endpoint_bits)
+    if signed or mode.transformed:
+        endpoints[:, 1:] = _sign_extend(endpoints[:, 1:], delta_bits)
+    if mode.transformed:
+        endpoints[:, 1:] = (endpoints[:, :1] + endpoints[:, 1:]) & ((1 << endpoint_bits) - 1)
+        if signed:
+            endpoints[:, 1:] = _sign_extend(endpoints[:, 1:], endpoint_bits)
+    endpoints = _unquantize_bc6h(endpoints, endpoint_bits, signed)
+    # Read the indices and interpolate the endpoints of each texel's subset.
+    index_bits = 3 if mode.subsets == 2 else 4
+    subsets = _SUBSETS[mode.subsets][partitions]
+    anchors = _ANCHORS[mode.subsets][partitions]
+    weights = _WEIGHTS[index_bits][_read_indices(bits, pos, index_bits, anchors)][:, :, None]
+    rows = numpy.arange(count)[:, None]
+    texels = ((64 - weights) * endpoints[rows, subsets * 2] + weights * endpoints[rows, subsets * 2 + 1] + 32) >> 6
+    # Scale the interpolated values to the final half float bit patterns.
+    result = numpy.zeros((count, 16, 4), numpy.uint16)
+    if signed:
+        magnitude = (numpy.abs(texels) * 31) >> 5
+        result[:, :, :3] = numpy.where((texels < 0) & (magnitude != 0), magnitude | 0x8000, magnitude)
+    else:
+        result[:, :, :3] = (texels * 31) >> 6
+    return result
+
+
+def _sign_extend(values, bits):
+    sign = 1 << (numpy.asarray(bits) - 1)
+    return (values & (sign - 1)) - (values & sign)
+
+
+def _unquantize_bc6h(values, bits, signed):
+    if signed:
+        if bits >= 16:
+            return values
+        magnitude = numpy.abs(values)
+        result = ((magnitude << 15) + 0x4000) >> (bits - 1)
+        result = numpy.where(magnitude == 0, 0, result)
+        result = numpy.where(magnitude >= (1 << (bits - 1)) - 1, 0x7FFF, result)
+        return numpy.where(values < 0, -result, result)
+    else:
+        if bits >= 15:
+            return values
+        result = ((values << 16) + 0x8000) >> bits
+        result = numpy.where(values == 0, 0, result)
+        return numpy.where(values == (1 << bits) - 1, 0xFFFF, result)
+
+
+# ---- Common ----
+
+def _read_blocks(data, width, height):
+    count = ((width + 3) // 4) * ((height + 3) // 4)
+    return numpy.frombuffer(data, numpy.uint8, count * 16).reshape(count, 16)
+
+
+def _unpack_bits(blocks):
+    # Unpack the 128 bits of each block in stream order, padded by one byte so anchor index reads cannot overflow.
+    bits = numpy.zeros((len(blocks), 136), numpy.uint8)
+    bits[:, :128] = ((blocks[:, :, None] >> numpy.arange(8, dtype=numpy.uint8)) & 1).reshape(len(blocks), 128)
+    return bits
+
+
+def _read_field(bits, pos, count):
+    # Read a field of the given bit count at the same position of all blocks.
+    if not count:
+        return numpy.zeros(len(bits), numpy.intp)
+    return bits[:, pos:pos + count].astype(numpy.intp) @ (1 << numpy.arange(count))
+
+
+def _read_indices(bits, pos, index_bits, anchors):
+    # Compute the bit position of each texel index, as anchor texels store their index with one bit less.
+    anchors = anchors.astype(numpy.intp)
+    positions = pos + numpy.arange(16) * index_bits - (numpy.cumsum(anchors, axis=1) - anchors)
+    index_bits_range = numpy.arange(index_bits)
+    values = bits[numpy.arange(len(bits))[:, None, None], positions[:, :, None] + index_bits_range]
+    values = values.astype(numpy.intp) @ (1 << index_bits_range)
+    # Remove the bit belonging to the next texel from anchor indices.
+    return values & ((1 << (index_bits - anchors)) - 1)
+
+
+def _blocks_to_image(texels, width, height):
+    blocks_x = (width + 3) // 4
+    blocks_y = (height + 3) // 4
+    image = texels.reshape(blocks_y, blocks_x, 4, 4, 4).swapaxes(1, 2).reshape(blocks_y * 4, blocks_x * 4, 4)
+    return numpy.ascontiguousarray(image[:height, :width])
+
+
+def benchmark(width=2048, height=2048, repeat=3):
+    # Decode random surfaces and return the throughput of each format in megapixels per second.
+    data = numpy.random.RandomState(0).randint(0, 0x100, (width // 4) * (height // 4) * 16).astype(numpy.uint8)
+    data = data.tobytes()
+    results = {}
+    for name, decoder in (("BC6H_UF16", decode_bc6h), ("BC6H_SF16", lambda d, w, h: decode_bc6h(d, w, h, True)),
+                          ("BC7", decode_bc7)):
+        best = None
+        for i in range(repeat):
+            start = time.perf_counter()
+            decoder(data, width, height)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results[name] = width * height / best / 1000000
+    return results
+
+
+if __name__ == "__main__":
+    for name, megapixels in benchmark().items():
+        print("{}: {:.1f} MP/s".format(name, megapixels))
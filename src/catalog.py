@@ -0,0 +1,207 @@
+import argparse
+import concurrent.futures
+import contextlib
+import os
+import sqlite3
+import sys
+import time
+from . import batch_parse
+from . import bfres_file
+from . import bntx_extract
+
+'''
+Catalogs the models, shapes, materials and textures of all BFRES and SZS files in a directory tree in an SQLite
+database, to quickly find the files using a given material or texture:
+    python -m io_scene_bfres.catalog <database> scan <directory>
+    python -m io_scene_bfres.catalog <database> query (--model | --material | --texture) <name pattern>
+Scanning only reads headers and names, skipping skeletons and animations. Vertex, index and texture data are referenced
+in the memory-mapped file but never read. Rescans only parse files which were added or changed (by modification time
+and size) since the last scan.
+Patterns use SQL LIKE syntax, e.g. "%_Alb%".
+'''
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS models (
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    vertex_count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS shapes (
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    model TEXT NOT NULL,
+    name TEXT NOT NULL,
+    material TEXT,
+    vertex_count INTEGER NOT NULL,
+    face_count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS materials (
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    model TEXT NOT NULL,
+    name TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS material_textures (
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    material TEXT NOT NULL,
+    texture TEXT NOT NULL,
+    sampler TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS textures (
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    format INTEGER NOT NULL,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS models_name ON models(name);
+CREATE INDEX IF NOT EXISTS models_file ON models(file_id);
+CREATE INDEX IF NOT EXISTS shapes_name ON shapes(name);
+CREATE INDEX IF NOT EXISTS shapes_file ON shapes(file_id);
+CREATE INDEX IF NOT EXISTS materials_name ON materials(name);
+CREATE INDEX IF NOT EXISTS materials_file ON materials(file_id);
+CREATE INDEX IF NOT EXISTS material_textures_texture ON material_textures(texture);
+CREATE INDEX IF NOT EXISTS material_textures_file ON material_textures(file_id);
+CREATE INDEX IF NOT EXISTS textures_name ON textures(name);
+CREATE INDEX IF NOT EXISTS textures_file ON textures(file_id);
+"""
+
+_QUERIES = {
+    "model": "SELECT files.path, models.name FROM models JOIN files ON files.id = models.file_id "
+             "WHERE models.name LIKE ? ORDER BY files.path",
+    "material": "SELECT files.path, materials.model || '/' || materials.name FROM materials "
+                "JOIN files ON files.id = materials.file_id WHERE materials.name LIKE ? ORDER BY files.path",
+    "texture": "SELECT files.path, textures.name FROM textures JOIN files ON files.id = textures.file_id "
+               "WHERE textures.name LIKE ? "
+               "UNION SELECT files.path, material_textures.material || ' -> ' || material_textures.texture "
+               "FROM material_textures JOIN files ON files.id = material_textures.file_id "
+               "WHERE material_textures.texture LIKE ? ORDER BY 1",
+}
+
+
+def scan_file(path):
+    # Return a dictionary with the names and counts of the file contents, or the error which occurred when parsing it.
+    result = {"models": [], "shapes": [], "materials": [], "material_textures": [], "textures": [], "error": None}
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            bfres = bfres_file.BfresFile(bfres_file.read_file_data(path), metadata_only=True)
+            for fmdl in bfres.header.fmdl_array:
+                model = fmdl.header.file_name_offset.name
+                result["models"].append((model, fmdl.header.toal_vert_count))
+                for fshp in fmdl.header.fshp_array:
+                    material = fmdl.fmat_array[fshp.header.material_index].header.name_offset.name \
+                        if fshp.header.material_index < len(fmdl.fmat_array) else None
+                    vertex_count = fmdl.fvtx_array[fshp.header.buffer_index].header.vertex_count
+                    face_count = fshp.lod_models[0].facecount // 3 if fshp.lod_models else 0
+                    result["shapes"].append((model, fshp.header.name_offset.name, material, vertex_count, face_count))
+                for fmat in fmdl.fmat_array:
+                    material = fmat.header.name_offset.name
+                    result["materials"].append((model, material))
+                    for texture, sampler in zip(fmat.texture_selector_array, fmat.sampler_names):
+                        result["material_textures"].append((material, texture.name_offset.name,
+                                                            sampler.name_offset.name))
+            for bntx in bfres.bntx_files:
+                index = bntx_extract.readBNTX(bntx)
+                for name in index:
+                    tex = index.get(name)
+                    result["textures"].append((name, tex.format, tex.width, tex.height))
+    except Exception as e:
+        result["error"] = "{}: {}".format(type(e).__name__, e)
+    return result
+
+
+class Catalog:
+    def __init__(self, filepath):
+        self.connection = sqlite3.connect(filepath)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.connection.close()
+
+    def scan(self, directory, processes=None):
+        # Parse the files in the directory tree which are new or changed since the last scan, and remove the files
+        # which no longer exist. Returns the number of scanned files and the number of removed files.
+        directory = os.path.abspath(directory)
+        # Compare the path prefix exactly, as LIKE treats _ and % in directory names as wildcards and ignores case.
+        prefix = os.path.join(directory, "")
+        known = {path: (mtime, size) for path, mtime, size in self.connection.execute(
+            "SELECT path, mtime, size FROM files WHERE substr(path, 1, ?) = ?", (len(prefix), prefix))}
+        changed = []
+        for size, path in batch_parse.find_files(directory):
+            mtime = os.path.getmtime(path)
+            if known.pop(path, None) != (mtime, size):
+                changed.append((path, mtime, size))
+        with self.connection:
+            self.connection.executemany("DELETE FROM files WHERE path = ?", ((path,) for path in known))
+        # Parse the files in a process pool, the largest first, and store the results as they come in.
+        with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as executor:
+            futures = {executor.submit(scan_file, path): (path, mtime, size) for path, mtime, size in changed}
+            for future in concurrent.futures.as_completed(futures):
+                self._store(*futures[future], result=future.result())
+        return len(changed), len(known)
+
+    def query(self, kind, pattern):
+        # Return (file path, description) tuples of the models, materials or textures matching the LIKE pattern.
+        parameters = (pattern, pattern) if kind == "texture" else (pattern,)
+        return self.connection.execute(_QUERIES[kind], parameters).fetchall()
+
+    def _store(self, path, mtime, size, result):
+        with self.connection:
+            self.connection.execute("DELETE FROM files WHERE path = ?", (path,))
+            file_id = self.connection.execute("INSERT INTO files (path, mtime, size, error) VALUES (?, ?, ?, ?)",
+                                              (path, mtime, size, result["error"])).lastrowid
+            for table, columns in (("models", "name, vertex_count"),
+                                   ("shapes", "model, name, material, vertex_count, face_count"),
+                                   ("materials", "model, name"),
+                                   ("material_textures", "material, texture, sampler"),
+                                   ("textures", "name, format, width, height")):
+                rows = result[table]
+                if rows:
+                    placeholders = ", ".join("?" * (len(rows[0]) + 1))
+                    self.connection.executemany(
+                        "INSERT INTO {} (file_id, {}) VALUES ({})".format(table, columns, placeholders),
+                        ((file_id,) + row for row in rows))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Catalog the contents of BFRES and SZS files in an SQLite database.")
+    parser.add_argument("database", help="path of the SQLite database file")
+    commands = parser.add_subparsers(dest="command")
+    scan = commands.add_parser("scan", help="add new and changed files of a directory tree to the catalog")
+    scan.add_argument("directory")
+    scan.add_argument("--processes", type=int, help="number of worker processes (default: CPU count)")
+    query = commands.add_parser("query", help="list the files containing matching names")
+    kind = query.add_mutually_exclusive_group(required=True)
+    for name in _QUERIES:
+        kind.add_argument("--" + name, dest="kind", action="store_const", const=name)
+    query.add_argument("pattern", help="SQL LIKE pattern of the name")
+    args = parser.parse_args(argv)
+
+    with Catalog(args.database) as catalog:
+        if args.command == "scan":
+            start_time = time.perf_counter()
+            scanned, removed = catalog.scan(args.directory, args.processes)
+            print("Scanned {} new or changed files and removed {} files in {:.2f} s.".format(
+                scanned, removed, time.perf_counter() - start_time))
+        elif args.command == "query":
+            start_time = time.perf_counter()
+            rows = catalog.query(args.kind, args.pattern)
+            for path, description in rows:
+                print("{}: {}".format(path, description))
+            print("{} results in {:.1f} ms.".format(len(rows), (time.perf_counter() - start_time) * 1000))
+        else:
+            parser.print_help()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
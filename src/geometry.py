@@ -0,0 +1,178 @@
+import hashlib
+import json
+import numpy
+import os
+import tempfile
+from . import profiling
+
+'''
+The geometry of each FSHP is decoded into NumPy arrays, which the importer builds meshes from without iterating over
+single vertices. The arrays only contain the vertices used by the imported LoD model:
+- The vertex attributes, mapped by their member name without underscore, like "p0" (position), "n0" (normal) or "u0"
+  (first UV layer), as decoded by FvtxSubsection.get_attribute_arrays().
+- "indices": the triangle list indices into those vertices.
+- "bone_indices" and "bone_weights": the FSKL bones influencing each vertex and how much, if the model has bones. They
+  have as many columns as the FSHP has influences per vertex, at least one. Rigidly skinned vertices (with 0 or 1
+  influence) are stored relative to their bone, so their positions and normals are transformed into model space.
+The arrays of a file are cached as NPY files in its work directory, together with a manifest describing the shapes.
+Later imports of the same (unchanged) file memory-map the arrays instead of decoding the vertex and index buffers again.
+'''
+
+VERSION = 3  # Increase when the decoded arrays change, invalidating existing caches.
+_MANIFEST = "geometry.json"
+
+
+class ShapeGeometry:
+    def __init__(self, model_index, name, material_index, arrays):
+        self.model_index = model_index  # The index of the FMDL this FSHP belongs to.
+        self.name = name
+        self.material_index = material_index  # The index of the FMAT in the FMDL.
+        self.arrays = arrays
+
+
+def cache_key(data, lod_model_index):
+    # Identify the decoded geometry by the hash of the file data, the LoD model imported and the geometry version.
+    digest = hashlib.sha1(data)
+    digest.update("{} {}".format(VERSION, lod_model_index).encode())
+    return digest.hexdigest()
+
+
+def fvtx_key(fvtx):
+    # Identify vertex buffers with the same data and attributes, which decode to the same arrays.
+    digest = hashlib.sha1()
+    for attribute in fvtx.att_array:
+        digest.update("{} {} {} {};".format(attribute.name_offset.name, attribute.format, attribute.element_offset,
+                                            attribute.buffer_index).encode())
+    for buffer in fvtx.buffers:
+        digest.update("{} {};".format(buffer.stride, buffer.VertexBufferSize).encode())
+        digest.update(buffer.data)
+    digest.update(str(fvtx.header.vertex_count).encode())
+    return digest.hexdigest()
+
+
+def decode_shape(model_index, fmdl, fshp, lod_model_index, fvtx_arrays, world_matrices=None):
+    # Decode the vertices used by the closest LoD model of the FSHP. fvtx_arrays caches the attribute arrays of whole
+    # vertex buffers by fvtx_key(), as several FSHPs can share them. The skinning data is only decoded if the world
+    # matrices of the FSKL bones are given.
+    fvtx = fmdl.fvtx_array[fshp.header.buffer_index]
+    key = fvtx_key(fvtx)
+    attributes = fvtx_arrays.get(key)
+    if attributes is None:
+        with profiling.span("fvtx decode"):
+            attributes = fvtx.get_attribute_arrays()
+        fvtx_arrays[key] = attributes
+    lod_model = fshp.lod_models[min(lod_model_index, len(fshp.lod_models) - 1)]
+    with profiling.span("index decode"):
+        indices = numpy.frombuffer(lod_model.index_buffer, lod_model.index_format[0] + "u2").astype(numpy.uint32)
+    # The vertex buffer also contains the vertices of other LoD models. As there is no direct way to get the number of
+    # vertices required for the current LoD model (the game does not need that), get the last indexed one with max.
+    start = lod_model.skip_vertices
+    end = start + (int(indices.max()) + 1 if len(indices) else 0)
+    arrays = {name: array[start:end] for name, array in attributes.items()}
+    arrays["indices"] = indices[:len(indices) - len(indices) % 3]
+    if world_matrices is not None and len(world_matrices):
+        with profiling.span("skin decode"):
+            _decode_skinning(fmdl.fskl, fshp, arrays, world_matrices)
+    return ShapeGeometry(model_index, fshp.header.name_offset.name, fshp.header.material_index, arrays)
+
+
+def vertex_colors(colors):
+    # Return the RGB channels of decoded color attributes as float32 values in the range 0..1 of Blender vertex colors.
+    # Unsigned integers are normalized by their maximum. Signed integers (snorm) map -127..127 to -1..1, with -128 also
+    # being -1, and negative values are clipped to 0 like those of float colors.
+    colors = numpy.asarray(colors)[:, :3]
+    if colors.dtype.kind == "f":
+        colors = colors.astype(numpy.float32)
+    elif colors.dtype.kind == "i":
+        colors = numpy.maximum(numpy.multiply(colors, 1 / numpy.iinfo(colors.dtype).max, dtype=numpy.float32), -1)
+    else:
+        colors = numpy.multiply(colors, 1 / numpy.iinfo(colors.dtype).max, dtype=numpy.float32)
+    return colors.clip(0, 1)
+
+
+def _decode_skinning(fskl, fshp, arrays, world_matrices):
+    # Map the blend indices of the vertices through the FSKL matrix to bone list to bone indices. Shapes without
+    # influences are bound to the bone of the FSHP.
+    skin_count = fshp.header.VertexSkinCount
+    vertex_count = len(arrays["p0"])
+    if skin_count == 0 or "i0" not in arrays:
+        bone_indices = numpy.full((vertex_count, 1), fshp.header.bone_index, numpy.int32)
+        bone_weights = numpy.ones((vertex_count, 1), numpy.float32)
+    else:
+        blend_indices = numpy.asarray(arrays.pop("i0"))[:, :skin_count].astype(numpy.int64)
+        valid = (blend_indices >= 0) & (blend_indices < len(fskl.inv_indices))
+        bone_indices = numpy.where(valid, fskl.inv_indices[numpy.where(valid, blend_indices, 0)], 0).astype(numpy.int32)
+        if skin_count == 1 or "w0" not in arrays:
+            bone_weights = numpy.zeros(bone_indices.shape, numpy.float32)
+            bone_weights[:, 0] = 1
+        else:
+            bone_weights = numpy.asarray(arrays.pop("w0"))[:, :skin_count]
+            if bone_weights.dtype.kind != "f":
+                bone_weights = bone_weights / numpy.iinfo(bone_weights.dtype).max  # Normalized integers
+            bone_weights = bone_weights.astype(numpy.float32)
+        bone_weights[~valid] = 0
+    bone_indices[bone_indices >= len(world_matrices)] = 0
+    arrays["bone_indices"] = bone_indices
+    arrays["bone_weights"] = bone_weights
+    # Transform rigidly skinned vertices from the space of their bone into model space.
+    if skin_count <= 1:
+        matrices = world_matrices[bone_indices[:, 0]]
+        arrays["p0"] = (numpy.einsum("nij,nj->ni", matrices[:, :3, :3], arrays["p0"][:, :3])
+                        + matrices[:, :3, 3]).astype(numpy.float32)
+        if "n0" in arrays:
+            normals = numpy.einsum("nij,nj->ni", matrices[:, :3, :3], arrays["n0"][:, :3])
+            arrays["n0"] = (normals / numpy.linalg.norm(normals, axis=1, keepdims=True).clip(1e-12)).astype(numpy.float32)
+
+
+def load_cache(directory, key):
+    # Return the shapes cached in the directory with memory-mapped arrays, or None if they were cached for another key.
+    try:
+        with open(os.path.join(directory, _MANIFEST)) as manifest_file:
+            manifest = json.load(manifest_file)
+        if manifest["key"] != key:
+            return None
+        shapes = []
+        for shape in manifest["shapes"]:
+            arrays = {name: numpy.load(os.path.join(directory, filename), mmap_mode="r")
+                      for name, filename in shape["arrays"].items()}
+            shapes.append(ShapeGeometry(shape["model_index"], shape["name"], shape["material_index"], arrays))
+        return shapes
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+class CacheWriter:
+    # Writes the arrays of shapes one after another, so that each shape can be freed after it was added, and finally the
+    # manifest. Until then, the cache of the previous key stays usable.
+    def __init__(self, directory, key):
+        self.directory = directory
+        self.key = key
+        self.prefix = "geometry_{}_".format(key[:16])
+        self.manifest = {"key": key, "shapes": []}
+
+    def add(self, shape):
+        filenames = {}
+        for name, array in shape.arrays.items():
+            filenames[name] = "{}{}_{}.npy".format(self.prefix, len(self.manifest["shapes"]), name)
+            numpy.save(os.path.join(self.directory, filenames[name]), array)
+        self.manifest["shapes"].append({"model_index": shape.model_index, "name": shape.name,
+                                        "material_index": shape.material_index, "arrays": filenames})
+
+    def close(self):
+        # The manifest is written atomically, so an interrupted write leaves no manifest referencing missing arrays.
+        # Then the arrays of previous keys are removed.
+        handle, temp_path = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        with os.fdopen(handle, "w") as temp_file:
+            json.dump(self.manifest, temp_file)
+        os.replace(temp_path, os.path.join(self.directory, _MANIFEST))
+        for filename in os.listdir(self.directory):
+            if filename.startswith("geometry_") and filename.endswith(".npy") and not filename.startswith(self.prefix):
+                os.remove(os.path.join(self.directory, filename))
+
+
+def save_cache(directory, key, shapes):
+    # Write the arrays of the shapes into files named after the key and remove those of previous keys.
+    writer = CacheWriter(directory, key)
+    for shape in shapes:
+        writer.add(shape)
+    writer.close()
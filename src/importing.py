@@ -1,29 +1,41 @@
 import bmesh
 import bpy
 import bpy_extras
-import io
+import concurrent.futures
+import itertools
+import mathutils
+import numpy
 import os
 import subprocess
+import threading
+import time
 from . import addon
 from . import binary_io
-from . import yaz0
 from . import bfres_file
 from . import bntx_extract
 from . import dds
+from . import geometry
+from . import profiling
+from . import skeleton
 from . import swizzle
+from . import texture_cache
 
 class ImportOperator(bpy.types.Operator, bpy_extras.io_utils.ImportHelper):
     """Load a BFRES model file"""
     bl_idname = "import_scene.nxbfres"
     bl_label = "Import NX BFRES"
     bl_options = {'UNDO'}
+    TIME_SLICE = 0.05  # Seconds spent creating Blender data per timer event when importing in the background.
 
     filename_ext = ".bfres"
     filter_glob = bpy.props.StringProperty(default="*.bfres;*.szs", options={'HIDDEN'})
     filepath = bpy.props.StringProperty(name="File Path", description="Filepath used for importing the BFRES or compressed SZS file", maxlen=1024)
+    files = bpy.props.CollectionProperty(type=bpy.types.OperatorFileListElement, options={'HIDDEN', 'SKIP_SAVE'})
+    directory = bpy.props.StringProperty(subtype='DIR_PATH', options={'HIDDEN', 'SKIP_SAVE'})
     # Mesh Options
     lod_model_index = bpy.props.IntProperty(name="LoD Model Index", description="The index of the LoD model to import if it exists. Lower means more detail.", min=0)
     merge_seams = bpy.props.BoolProperty(name="Merge Seam Vertices", description="Merge vertices again which were split to create UV seams.", default=True)
+    import_armature = bpy.props.BoolProperty(name="Import Armature", description="Creates an armature with the bones of each model.", default=True)
     # Texture Options
     extract_textures = bpy.props.BoolProperty(name="Extract Textures", description="Extracts embedded textures into a work folder.", default=True)
     force_extract = bpy.props.BoolProperty(name="Force", description="Extracts textures even when they were already found in an existing work folder.")
@@ -33,16 +45,26 @@ class ImportOperator(bpy.types.Operator, bpy_extras.io_utils.ImportHelper):
     tex_import_emissive = bpy.props.BoolProperty(name="Import Emissive", description="Imports textures mapped to the 'e' attribute.", default=True)
     tex_import_bake = bpy.props.BoolProperty(name="Import Bake", description="Imports textures mapped to the 'b' attribute.", default=False)
     tex_import_other = bpy.props.BoolProperty(name="Import Other", description="Imports textures mapped to unknown attributes.")
+    # Animation Options
+    import_skeletal_anims = bpy.props.BoolProperty(name="Import Skeletal Animations", description="Creates an action for each skeletal animation, animating the imported armature or the active one.", default=True)
+    import_material_anims = bpy.props.BoolProperty(name="Import Texture Pattern Animations", description="Creates actions toggling the texture slots of materials to swap their textures.", default=True)
+    import_visibility_anims = bpy.props.BoolProperty(name="Import Bone Visibility Animations", description="Creates actions hiding and showing the bones of the armature.", default=True)
+    # Import Options
+    background = bpy.props.BoolProperty(name="Import in Background", description="Keeps the interface responsive while importing from the menu. Press Esc to cancel.", default=True)
+    streaming = bpy.props.BoolProperty(name="Stream Models", description="Decodes, builds and frees one model and shape at a time to keep memory usage low for large files, and reports the peak increase of the resident memory of Blender while importing, including the memory-mapped file and the created meshes.")
     # MK8Muunt
     parent_ob_name = bpy.props.StringProperty(name="Name of a parent object to which FSHP mesh objects will be added.")
     mat_name_prefix = bpy.props.StringProperty(name="Text prepended to material names to keep them unique.")
 
     def draw(self, context):
+        self.layout.prop(self, "background")
+        self.layout.prop(self, "streaming")
         # Mesh Options
         box = self.layout.box()
         box.label("Mesh Options:", icon='OUTLINER_OB_MESH')
         box.prop(self, "lod_model_index")
         box.prop(self, "merge_seams")
+        box.prop(self, "import_armature")
         # Texture Options
         tex_conv_path = context.user_preferences.addons[__package__].preferences.tex_conv_path
         box = self.layout.box()
@@ -57,19 +79,188 @@ class ImportOperator(bpy.types.Operator, bpy_extras.io_utils.ImportHelper):
             box.prop(self, "tex_import_emissive")
             box.prop(self, "tex_import_bake")
             box.prop(self, "tex_import_other")
+        # Animation Options
+        box = self.layout.box()
+        box.label("Animation Options:", icon='ANIM_DATA')
+        box.prop(self, "import_skeletal_anims")
+        box.prop(self, "import_material_anims")
+        box.prop(self, "import_visibility_anims")
 
+    def invoke(self, context, event):
+        # Only imports started from the file browser can run in the background, scripts calling execute() still block.
+        self._invoked = True
+        return super().invoke(context, event)
 
     def execute(self, context):
-        importer = Importer(self, context, self.properties.filepath)
-        return importer.run()
+        # Import all files selected in the file browser, or the single given file path.
+        filepaths = [os.path.join(self.directory, file.name) for file in self.files if file.name]
+        if not filepaths:
+            filepaths = [self.properties.filepath]
+        if self.background and getattr(self, "_invoked", False):
+            return self._start_modal(context, filepaths)
+        batch = import_files(context, filepaths, self)
+        self.report({'INFO'}, batch.summary())
+        return {'FINISHED'} if batch.imported else {'CANCELLED'}
+
+    def modal(self, context, event):
+        if event.type == 'ESC':
+            self._importer.cancel()
+            self._finish_modal(context)
+            self.report({'WARNING'}, "BFRES import cancelled. {}".format(self._batch.summary()))
+            return {'CANCELLED'}
+        if event.type != 'TIMER':
+            return {'PASS_THROUGH'}
+        # Wait for the worker thread to load the file.
+        if self._loader.is_alive():
+            self._update_progress(context)
+            return {'PASS_THROUGH'}
+        if self._importer.error:
+            self._importer.cancel()
+            self._batch.add_result(self._importer, self._importer.error)
+            return self._continue_modal(context)
+        # Create the Blender data in small batches, giving control back to the interface after each time slice.
+        if self._steps is None:
+            self._steps = self._importer.convert()
+        end_time = time.perf_counter() + self.TIME_SLICE
+        try:
+            while time.perf_counter() < end_time:
+                next(self._steps)
+        except StopIteration:
+            self._batch.add_result(self._importer)
+            return self._continue_modal(context)
+        except Exception as e:
+            self._batch.add_result(self._importer, e)
+            return self._continue_modal(context)
+        self._update_progress(context)
+        return {'PASS_THROUGH'}
+
+    def _start_modal(self, context, filepaths):
+        # Load each file in a worker thread and poll it with a timer.
+        self._batch = ImportBatch(context)
+        self._filepaths = filepaths
+        self._file_index = -1
+        context.window_manager.progress_begin(0, 100)
+        self._timer = context.window_manager.event_timer_add(self.TIME_SLICE, context.window)
+        context.window_manager.modal_handler_add(self)
+        self._start_next_file(context)
+        return {'RUNNING_MODAL'}
+
+    def _start_next_file(self, context):
+        self._file_index += 1
+        self._steps = None
+        self._importer = self._batch.create_importer(self, self._filepaths[self._file_index])
+        self._loader = threading.Thread(target=self._importer.load, daemon=True)
+        self._loader.start()
+
+    def _continue_modal(self, context):
+        # Start the next file, or finish and report the results of all files.
+        if self._file_index + 1 < len(self._filepaths):
+            self._start_next_file(context)
+            return {'PASS_THROUGH'}
+        self._finish_modal(context)
+        self.report({'INFO'} if self._batch.imported else {'ERROR'}, self._batch.summary())
+        return {'FINISHED'} if self._batch.imported else {'CANCELLED'}
+
+    def _update_progress(self, context):
+        progress = (self._file_index + self._importer.progress) / len(self._filepaths)
+        context.window_manager.progress_update(progress * 100)
+
+    def _finish_modal(self, context):
+        context.window_manager.event_timer_remove(self._timer)
+        context.window_manager.progress_end()
+        self._batch.finish()
 
     @staticmethod
     def menu_func_import(self, context):
         self.layout.operator(ImportOperator.bl_idname, text="Nintendo Switch BFRES (.bfres/.szs)")
 
 
+def import_files(context, filepaths, options):
+    # Import the given files one after another, sharing caches between them. The options are read from the import
+    # operator or any object with the same attributes. Returns the ImportBatch with the results of each file.
+    batch = ImportBatch(context)
+    for filepath in filepaths:
+        importer = batch.create_importer(options, filepath)
+        try:
+            importer.run()
+        except Exception as e:
+            batch.add_result(importer, e)
+        else:
+            batch.add_result(importer)
+    batch.finish()
+    addon.log(0, batch.summary())
+    return batch
+
+
+class ImportCaches:
+    # Caches shared by all files imported in one batch.
+    def __init__(self, addon_prefs):
+        # Decoded textures, shared with all other imports on disk.
+        if addon_prefs.tex_cache_size:
+            self.texture_cache = texture_cache.TextureCache(addon_prefs.get_tex_cache_path(),
+                                                            addon_prefs.tex_cache_size * 1024 * 1024)
+        else:
+            self.texture_cache = None
+        self.texture_names = set()  # Names of the textures already created in Blender.
+        self.materials = {}  # Material name -> Blender material
+
+
+class ImportBatch:
+    # Imports several files with shared caches and collects the time taken for each of them.
+    def __init__(self, context):
+        self.context = context
+        self.addon_prefs = context.user_preferences.addons[__package__].preferences
+        self.caches = ImportCaches(self.addon_prefs)
+        # Record the time spent in each stage of the imports if requested.
+        self.profiler = profiling.start() if getattr(self.addon_prefs, "profile_imports", False) else None
+        self.results = []  # (file path, seconds, error or None)
+        self.imported = 0
+        self.peak_memory = None  # Highest memory usage of a file imported in streaming mode, in bytes.
+
+    def create_importer(self, options, filepath):
+        importer = Importer(options, self.context, filepath, self.caches)
+        importer.start_time = time.perf_counter()
+        return importer
+
+    def add_result(self, importer, error=None):
+        seconds = time.perf_counter() - importer.start_time
+        self.results.append((importer.filepath, seconds, error))
+        if importer.peak_memory is not None:
+            addon.log(1, "Peak memory usage: {:.1f} MB".format(importer.peak_memory / 1024 / 1024))
+            self.peak_memory = max(self.peak_memory or 0, importer.peak_memory)
+        if error:
+            addon.log(0, "Failed to import {} after {:.2f} s: {}".format(importer.filename, seconds, error))
+        else:
+            self.imported += 1
+            addon.log(0, "Imported {} in {:.2f} s".format(importer.filename, seconds))
+
+    def finish(self):
+        # Stop profiling, logging the time spent in each stage and saving the trace if requested.
+        if not self.profiler:
+            return
+        profiling.stop()
+        for name, seconds, count in self.profiler.totals():
+            addon.log(1, "{}: {:.3f} s in {} spans".format(name, seconds, count))
+        if self.addon_prefs.profile_trace_path:
+            trace_path = bpy.path.abspath(self.addon_prefs.profile_trace_path)
+            self.profiler.save_trace(trace_path)
+            addon.log(1, "Saved trace to {}".format(trace_path))
+
+    def summary(self):
+        total = sum(seconds for _, seconds, _ in self.results)
+        text = "Imported {} of {} files in {:.2f} s.".format(self.imported, len(self.results), total)
+        failed = [os.path.basename(filepath) for filepath, _, error in self.results if error]
+        if self.profiler:
+            text += " Stages: {}.".format(self.profiler.summary())
+        if self.peak_memory is not None:
+            text += " Peak memory: {:.1f} MB.".format(self.peak_memory / 1024 / 1024)
+        if failed:
+            text += " Failed: {}".format(", ".join(failed))
+        return text
+
+
 class Importer:
-    def __init__(self, operator, context, filepath):
+    def __init__(self, operator, context, filepath, caches=None):
         self.operator = operator
         self.context = context
         # Keep a link to the add-on preferences.
@@ -83,49 +274,257 @@ class Importer:
         self.work_directory = os.path.join(self.directory, "{}.work".format(self.filename))
         self.texture_directory = os.path.join(self.work_directory, "gtx")
         os.makedirs(self.work_directory, exist_ok=True)
- 
+        # Use the caches of the batch this file is imported in.
+        self.caches = caches or ImportCaches(self.addon_prefs)
+        self.texture_cache = self.caches.texture_cache
+        # Copy the texture options, as they are also checked in a worker thread.
+        self.tex_import_attributes = {attribute for attribute, enabled in (
+            ("a", operator.tex_import_diffuse),
+            ("n", operator.tex_import_normal),
+            ("s", operator.tex_import_specular),
+            ("e", operator.tex_import_emissive),
+            ("b", operator.tex_import_bake)) if enabled}
+        self.tex_import_other = operator.tex_import_other
+        # In streaming mode, only the data of the currently built model and shape is decoded and kept in memory.
+        self.streaming = getattr(operator, "streaming", False)
+        # Track the state of the import, which can be loaded in a worker thread.
+        self.progress = 0
+        self.cancelled = False
+        self.error = None
+        self.executor = None
+        self._executor_lock = threading.Lock()  # Held by cancel(), so no executor is created after cancelling.
+        self.ftex_futures = {}
+        self.world_matrices = {}  # FMDL index -> world matrices of the FSKL bones
+        self.armature_obs = []
+        self.peak_memory = None  # Peak increase of the resident memory in bytes, only tracked in streaming mode.
+        self._base_memory = None
 
     def run(self):
-        # Ensure to have a stream with decompressed data.
-        if self.fileext == ".SZS":
-            raw = io.BytesIO(yaz0.decompress(open(self.filepath, "rb")))
-        else:
-            raw = open(self.filepath, "rb")
-        bfres = bfres_file.BfresFile(raw)
-        raw.close()
+        self.load()
+        if self.error:
+            self.cancel()
+            raise self.error
         # Import the data into Blender objects.
-        self._convert(bfres)
+        for _ in self.convert():
+            pass
         return {'FINISHED'}
 
-    def _convert(self, bfres):
-        # Go through the FTEX sections and export them to GTX, then convert to DDS.
-        self._extract_ftex(bfres.bntx_file)
-        # Go through the FMDL sections which map to a Blender object.
-        for fmdl_node in bfres.header.fmdl_array:
-            self._convert_fmdl(fmdl_node)
-
-    def _extract_ftex(self, bntx):
-        # Export the FTEX section referenced by the texture selector as a GTX file.
-        t = bntx_extract
-        t.main()
-        textures = t.readBNTX(bntx)
-        t.saveTextures(textures, self.texture_directory)
-        for file in os.listdir(self.work_directory):
-            if file.endswith("dds"):
-                ddsfile = (os.path.join(self.work_directory, file))
-                subprocess.call([self.addon_prefs.tex_conv_path,ddsfile, '-ft', 'png', '-f', 'R10G10B10A2_UNORM', '-y'])
-		
-    def _convert_fmdl(self, fmdl):
-        # If no parent is given, create an empty object holding the FSHP child mesh objects of this FMDL.
+    def load(self):
+        # Decompress and parse the file, then decode the vertex data. This does not access Blender data, so it can run
+        # in a worker thread. Errors are stored to be reported by the thread creating the Blender data.
+        if self.streaming:
+            self._base_memory = profiling.resident_memory()
+        try:
+            self._load()
+        except Exception as e:
+            self.error = e
+        self._sample_memory()
+
+    def _load(self):
+        # Ensure to have a buffer with decompressed data.
+        data = bfres_file.read_file_data(self.filepath)
+        if self.cancelled:
+            return
+        with profiling.span("header parse"):
+            self.bfres = bfres_file.BfresFile(data)
+        self.progress = 0.2
+        if self.cancelled:
+            return
+        # Index the textures and decode the ones required by the materials in worker threads in the background.
+        self._extract_ftex(self.bfres.bntx_files)
+        with self._executor_lock:
+            if self.cancelled:
+                return
+            self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=os.cpu_count() or 1)
+            if not self.streaming:
+                self._queue_ftex(self.executor, self.bfres.header.fmdl_array)
+        # Load the geometry cached in the work directory by a previous import of the unchanged file. The arrays are
+        # memory-mapped, so they are only paged in while building the meshes.
+        key = geometry.cache_key(data, self.operator.lod_model_index)
+        self.shapes = geometry.load_cache(self.work_directory, key)
+        if self.shapes is None and self.streaming:
+            # Decode each FSHP right before building it, writing it to the cache one by one.
+            self.cache_writer = geometry.CacheWriter(self.work_directory, key)
+        elif self.shapes is None:
+            # Otherwise decode the vertex and index buffers of all FSHPs and cache them. The decoded FVTX arrays are only
+            # kept for this file, as the geometry of other files is cached on disk.
+            self.shapes = []
+            fvtx_arrays = {}
+            fshps = [(i, fmdl, fshp) for i, fmdl in enumerate(self.bfres.header.fmdl_array)
+                     for fshp in fmdl.header.fshp_array]
+            for i, (model_index, fmdl, fshp) in enumerate(fshps):
+                if self.cancelled:
+                    return
+                self.shapes.append(geometry.decode_shape(model_index, fmdl, fshp, self.operator.lod_model_index,
+                                                         fvtx_arrays,
+                                                         self._get_world_matrices(model_index, fmdl)))
+                self.progress = 0.2 + 0.3 * (i + 1) / len(fshps)
+            geometry.save_cache(self.work_directory, key, self.shapes)
+        self.progress = 0.5
+
+    def convert(self):
+        # Create the Blender data of the loaded file step by step, yielding after each mesh or material. This has to
+        # run on the main thread.
+        try:
+            fmdls = self.bfres.header.fmdl_array
+            fskas = self.bfres.fska_array if getattr(self.operator, "import_skeletal_anims", True) else []
+            fmaas = self.bfres.fmaa_array if getattr(self.operator, "import_material_anims", True) else []
+            fviss = [fvis for fvis in self.bfres.fvis_array if fvis.is_bone_visibility] \
+                if getattr(self.operator, "import_visibility_anims", True) else []
+            step_count = max(1, 2 * sum(len(fmdl.header.fshp_array) for fmdl in fmdls)
+                             + len(fskas) + len(fmaas) + len(fviss))
+            steps = 0
+            # Go through the FMDL sections which map to a Blender object, building the meshes while textures decode.
+            self.fshp_materials = []
+            for model_index, fmdl_node in enumerate(fmdls):
+                if self.streaming:
+                    # Only decode the textures of this model.
+                    self._queue_ftex(self.executor, [fmdl_node])
+                for _ in self._convert_fmdl(fmdl_node, self._get_fmdl_shapes(model_index, fmdl_node)):
+                    steps += 1
+                    self.progress = 0.5 + 0.5 * steps / step_count
+                    self._sample_memory()
+                    yield
+                if self.streaming:
+                    # Create the materials of this model right away to release its textures.
+                    for _ in self._apply_fmat_materials():
+                        steps += 1
+                        self.progress = 0.5 + 0.5 * steps / step_count
+                        self._sample_memory()
+                        yield
+            # Otherwise only create the materials now, waiting for the textures they need.
+            for _ in self._apply_fmat_materials():
+                steps += 1
+                self.progress = 0.5 + 0.5 * steps / step_count
+                self._sample_memory()
+                yield
+            if self.streaming and self.shapes is None:
+                self.cache_writer.close()
+            # Create the actions of the animations.
+            for _ in itertools.chain(self._convert_fska_array(fskas), self._convert_fmaa_array(fmaas),
+                                     self._convert_fvis_array(fviss)):
+                steps += 1
+                self.progress = 0.5 + 0.5 * steps / step_count
+                self._sample_memory()
+                yield
+        finally:
+            self._shutdown()
+
+    def cancel(self):
+        # Stop loading and decoding textures, leaving a worker thread parsing the file to finish on its own.
+        with self._executor_lock:
+            self.cancelled = True
+            self._shutdown()
+
+    def _shutdown(self):
+        if self.executor:
+            for future in self.ftex_futures.values():
+                future.cancel()
+            self.executor.shutdown(wait=False)
+            self.executor = None
+        self._sample_memory()
+
+    def _sample_memory(self):
+        # Update the peak memory usage with the current resident memory. Sampled after each step of building the Blender
+        # data, this includes the memory held by Blender, unlike tracing Python allocations.
+        if self._base_memory is not None:
+            memory = profiling.resident_memory()
+            if memory is not None:
+                self.peak_memory = max(self.peak_memory or 0, memory - self._base_memory)
+
+    def _extract_ftex(self, bntx_files):
+        # Only index the textures of all BNTX files by name. They are decoded once a material references them.
+        self.ftex_indices = [bntx_extract.readBNTX(bntx) for bntx in bntx_files]
+
+    def _queue_ftex(self, executor, fmdls):
+        # Submit the textures referenced by the material attributes which are imported to the worker threads.
+        for fmdl in fmdls:
+            for fmat in fmdl.fmat_array:
+                if not fmat.texture_selector_array:
+                    continue
+                for texture, attrib in zip(fmat.texture_selector_array, fmat.sampler_names):
+                    texture_name = texture.name_offset.name
+                    if texture_name in self.ftex_futures or texture_name in self.caches.texture_names \
+                            or not self._check_attribute_import(Importer._get_attribute_type(texture_name, attrib.name_offset.name)):
+                        continue
+                    tex = self._find_ftex(texture_name)
+                    if tex:
+                        self.ftex_futures[texture_name] = executor.submit(self._process_ftex, tex)
+
+    def _find_ftex(self, texture_name):
+        return next((index.get(texture_name) for index in self.ftex_indices if texture_name in index), None)
+
+    def _process_ftex(self, tex):
+        # Return the decoded pixels of the texture, or the path to the DDS file converted by TexConv. This does not
+        # access Blender data, so it can run in a worker thread.
+        pixels = self._decode_ftex(tex)
+        if pixels is not None:
+            return pixels
+        return self._convert_ftex_texconv(tex)
+
+    def _convert_ftex_texconv(self, tex):
+        # Export the texture as a DDS file and convert it with TexConv, returning the path to the DDS file.
+        with profiling.span("texconv"):
+            bntx_extract.saveTextures([tex], self.texture_directory)
+            ddsfile = "{}.dds".format(os.path.join(self.work_directory, tex.name))
+            if os.path.isfile(ddsfile):
+                subprocess.call([self.addon_prefs.tex_conv_path, ddsfile, '-ft', 'png', '-f', 'R10G10B10A2_UNORM', '-y'])
+        return ddsfile
+
+    def _get_fmdl_shapes(self, model_index, fmdl):
+        # Return the loaded shapes of the FMDL, or in streaming mode decode and cache them one at a time.
+        if self.shapes is not None:
+            return [shape for shape in self.shapes if shape.model_index == model_index]
+        return self._decode_fmdl_shapes(model_index, fmdl)
+
+    def _decode_fmdl_shapes(self, model_index, fmdl):
+        # Vertex buffers are only shared between the FSHPs of the same FMDL, so their arrays can be dropped afterwards.
+        fvtx_arrays = {}
+        for fshp in fmdl.header.fshp_array:
+            shape = geometry.decode_shape(model_index, fmdl, fshp, self.operator.lod_model_index, fvtx_arrays,
+                                          self._get_world_matrices(model_index, fmdl))
+            self.cache_writer.add(shape)
+            yield shape
+
+    def _get_world_matrices(self, model_index, fmdl):
+        # Compute the world matrices of the FSKL bones once per FMDL, to transform rigidly skinned vertices.
+        matrices = self.world_matrices.get(model_index)
+        if matrices is None:
+            bones = fmdl.fskl.bones
+            matrices = skeleton.world_matrices(skeleton.local_matrices(bones), skeleton.parent_indices(bones))
+            self.world_matrices[model_index] = matrices
+        return matrices
+
+    def _apply_fmat_materials(self):
+        # Add the materials to the meshes built so far, yielding after each one.
+        while self.fshp_materials:
+            fshp_mesh, fmat = self.fshp_materials.pop(0)
+            with profiling.span("material setup"):
+                fshp_mesh.materials.append(self._get_fmat_material(fmat))
+            yield
+
+    def _convert_fmdl(self, fmdl, shapes):
+        # Create an armature for the bones of the FMDL, which also holds the FSHP child mesh objects if no parent is
+        # given. Without bones, an empty object holds them.
+        armature_ob = None
+        if getattr(self.operator, "import_armature", True) and len(fmdl.fskl.bones):
+            with profiling.span("armature build"):
+                armature_ob = self._convert_fskl(fmdl)
+                self.armature_obs.append(armature_ob)
         if self.operator.parent_ob_name:
             fmdl_ob = None
+            if armature_ob:
+                armature_ob.parent = bpy.data.objects[self.operator.parent_ob_name]
+        elif armature_ob:
+            fmdl_ob = armature_ob
         else:
             fmdl_ob = bpy.data.objects.new(fmdl.header.file_name_offset.name, None)
             Importer._add_object_to_group(fmdl_ob, "BFRES")
             bpy.context.scene.objects.link(fmdl_ob)
-        # Go through the polygons in this model and create mesh objects representing them.
-        for fshp_node in fmdl.header.fshp_array:
-            fshp_ob = self._convert_fshp(fmdl, fshp_node)
+        # Go through the polygons in this model and create mesh objects representing them, one per step.
+        for shape in shapes:
+            with profiling.span("mesh build"):
+                fshp_ob = self._convert_fshp(fmdl, shape, armature_ob)
             if self.operator.parent_ob_name:
                 # Just parent the mesh object to the given object.
                 fshp_ob.parent = bpy.data.objects[self.operator.parent_ob_name]
@@ -134,71 +533,230 @@ class Importer:
                 fshp_ob.parent = fmdl_ob
                 Importer._add_object_to_group(fshp_ob, "BFRES")
                 bpy.context.scene.objects.link(fshp_ob)
+            yield
+
+    def _convert_fskl(self, fmdl):
+        # Create an armature object with all bones of the FSKL. Their matrices are computed at once, so that only the
+        # edit bones have to be created one by one.
+        fskl = fmdl.fskl
+        parents = skeleton.parent_indices(fskl.bones)
+        world = skeleton.world_matrices(skeleton.local_matrices(fskl.bones), parents)
+        matrices = skeleton.armature_matrices(world).tolist()
+        lengths = skeleton.bone_lengths(world, parents).tolist()
+        armature = bpy.data.armatures.new(fmdl.header.file_name_offset.name)
+        armature_ob = bpy.data.objects.new(armature.name, armature)
+        Importer._add_object_to_group(armature_ob, "BFRES")
+        bpy.context.scene.objects.link(armature_ob)
+        # Edit bones can only be created in edit mode of the armature object.
+        bpy.context.scene.objects.active = armature_ob
+        bpy.ops.object.mode_set(mode='EDIT')
+        edit_bones = [armature.edit_bones.new(name) for name in fskl.bone_names]
+        for edit_bone, matrix, length, parent in zip(edit_bones, matrices, lengths, parents.tolist()):
+            edit_bone.tail = (0, length, 0)  # The matrix only sets the position and orientation, keeping the length.
+            edit_bone.matrix = mathutils.Matrix(matrix)
+            if parent >= 0:
+                edit_bone.parent = edit_bones[parent]
+        bpy.ops.object.mode_set(mode='OBJECT')
+        return armature_ob
+
+    def _convert_fska_array(self, fskas):
+        # Create an action for each FSKA, yielding after each one. They animate the armatures imported from this file,
+        # or the active armature if the file only contains animations.
+        armature_obs = self._get_target_armatures("skeletal") if fskas else []
+        if not armature_obs:
+            return
+        rest_matrices = Importer._get_rest_matrices(armature_obs[0])
+        actions = []
+        for fska in fskas:
+            with profiling.span("animation build"):
+                actions.append(self._convert_fska(fska, rest_matrices))
+            yield
+        # Make the first animation the active one.
+        for armature_ob in armature_obs:
+            if not armature_ob.animation_data:
+                armature_ob.animation_data_create()
+            armature_ob.animation_data.action = actions[0]
+
+    def _get_target_armatures(self, animation_type):
+        # Return the armatures imported from this file, or the active armature if the file only contains animations.
+        if self.armature_obs:
+            return self.armature_obs
+        active_ob = bpy.context.scene.objects.active
+        if active_ob and active_ob.type == 'ARMATURE':
+            return [active_ob]
+        addon.log(1, "Warning: No armature to apply the {} animations to".format(animation_type))
+        return []
+
+    def _convert_fmaa_array(self, fmaas):
+        # Create an action per FMAA and material, toggling the texture slots of the textures it swaps between. Only one
+        # of them is used on each frame. The actions of the first FMAA are made active.
+        for fmaa_index, fmaa in enumerate(fmaas):
+            with profiling.span("animation build"):
+                frames = numpy.arange(fmaa.frame_count + 1, dtype=numpy.float32)
+                for material_anim in fmaa.material_anims:
+                    material_name = material_anim.name
+                    if self.operator.mat_name_prefix:
+                        material_name = "{}.{}".format(self.operator.mat_name_prefix, material_name)
+                    material = self.caches.materials.get(material_name) or bpy.data.materials.get(material_name)
+                    if not material or not material_anim.texture_pattern_anims:
+                        continue
+                    action = bpy.data.actions.new("{}.{}".format(fmaa.name, material_anim.name))
+                    action.use_fake_user = True
+                    for anim in material_anim.texture_pattern_anims:
+                        self._convert_texture_pattern_anim(action, material, fmaa, material_anim, anim, frames)
+                    if fmaa_index == 0:
+                        if not material.animation_data:
+                            material.animation_data_create()
+                        material.animation_data.action = action
+            yield
+
+    def _convert_texture_pattern_anim(self, action, material, fmaa, material_anim, anim, frames):
+        # Compare the texture index of all frames with each texture at once to key the use of its slot.
+        texture_indices = material_anim.evaluate_texture_pattern(anim, frames)
+        slot_textures = [slot.texture.name if slot and slot.texture else None for slot in material.texture_slots]
+        for texture_index in numpy.unique(texture_indices).tolist():
+            if not 0 <= texture_index < len(fmaa.texture_names):
+                continue
+            texture_name = fmaa.texture_names[texture_index]
+            if texture_name in slot_textures:
+                slot_index = slot_textures.index(texture_name)
+            else:
+                attribute_name = Importer._get_attribute_type(texture_name, anim.name)
+                self._add_texture_slot(material, texture_name, attribute_name)
+                slot_textures = [slot.texture.name if slot and slot.texture else None for slot in material.texture_slots]
+                slot_index = slot_textures.index(texture_name)
+            Importer._add_fcurve(action, anim.name, "texture_slots[{}].use".format(slot_index), 0, frames,
+                                 texture_indices == texture_index)
+
+    def _convert_fvis_array(self, fviss):
+        # Create an action per FVIS hiding the bones of the armature data, making the first one active.
+        armature_obs = self._get_target_armatures("visibility") if fviss else []
+        if not armature_obs:
+            return
+        bone_names = set(armature_obs[0].data.bones.keys())
+        actions = []
+        for fvis in fviss:
+            with profiling.span("animation build"):
+                action = bpy.data.actions.new(fvis.name)
+                action.use_fake_user = True
+                frames = numpy.arange(fvis.frame_count + 1, dtype=numpy.float32)
+                for name, visible in zip(fvis.names, fvis.evaluate(frames)):
+                    if name in bone_names:
+                        Importer._add_fcurve(action, name, 'bones["{}"].hide'.format(name), 0, frames, ~visible)
+                actions.append(action)
+            yield
+        for armature_ob in armature_obs:
+            if not armature_ob.data.animation_data:
+                armature_ob.data.animation_data_create()
+            armature_ob.data.animation_data.action = actions[0]
+
+    def _convert_fska(self, fska, rest_matrices):
+        # Evaluate the curves of each bone at every frame and convert the resulting transformations relative to the
+        # parent bone into ones relative to the rest pose of the bone, as animated in Blender.
+        action = bpy.data.actions.new(fska.name)
+        action.use_fake_user = True
+        frames = numpy.arange(fska.frame_count + 1, dtype=numpy.float32)
+        for bone_anim in fska.bone_anims:
+            rest_matrix = rest_matrices.get(bone_anim.name)
+            if rest_matrix is None:
+                continue
+            inverse_rest_matrix, is_root = rest_matrix
+            bone_frames = frames if bone_anim.curves else frames[:1]
+            scale, rotation, translation = bone_anim.evaluate(bone_frames)
+            matrices = skeleton.transform_matrices(scale, rotation, translation, fska.euler)
+            if is_root:
+                matrices = skeleton.Y_UP_TO_Z_UP @ matrices
+            locations, quaternions, scales = skeleton.decompose_matrices(inverse_rest_matrix @ matrices)
+            for data_path, values in (("location", locations), ("rotation_quaternion", quaternions), ("scale", scales)):
+                for index in range(values.shape[1]):
+                    Importer._add_fcurve(action, bone_anim.name, 'pose.bones["{}"].{}'.format(bone_anim.name, data_path),
+                                         index, bone_frames, values[:, index])
+        return action
 
-    def _convert_fshp(self, fmdl, fshp):
-        # Get the vertices and indices of the closest LoD model.
-        vertices = fmdl.fvtx_array[fshp.header.buffer_index].get_vertices()
-        lod_model = fshp.lod_models[min(self.operator.lod_model_index, len(fshp.lod_models) - 1)]
-        indices = lod_model.indices
-        # Create a bmesh to represent the FSHP polygon.
-        bm = bmesh.new()
-        # Go through the vertices (starting at the given offset) and add them to the bmesh.
-        # This would also add the vertices of all other LoD models. As there is no direct way to get the number of
-        # vertices required for the current LoD model (the game does not need that), get the last indexed one with max.
-        last_vertex = max(indices) + 1
-        for vertex in vertices[lod_model.skip_vertices:lod_model.skip_vertices + last_vertex]:
-            bm.verts.new((vertex.p0[0], -vertex.p0[2], vertex.p0[1]))  # Exchange Y with Z, mirror new Y
-        bm.verts.ensure_lookup_table()
-        bm.verts.index_update()
+    def _convert_fshp(self, fmdl, shape, armature_ob):
+        # Create a mesh from the decoded arrays, setting all vertices, faces and UV layers at once.
+        positions = shape.arrays["p0"]
+        faces = shape.arrays["indices"].reshape(-1, 3).astype(numpy.int32)
+        fshp_mesh = bpy.data.meshes.new(shape.name)
+        fshp_mesh.vertices.add(len(positions))
+        fshp_mesh.vertices.foreach_set("co", numpy.column_stack(
+            (positions[:, 0], -positions[:, 2], positions[:, 1])).ravel())  # Exchange Y with Z, mirror new Y
         # Connect the faces (they are organized as a triangle list) and smooth shade them.
-        for i in range(0, len(indices), 3):
-            try:
-                face = bm.faces.new(bm.verts[j] for j in indices[i:i + 3])
-                face.smooth = True
-            except ValueError:
-                pass  # TODO: Handle multiple same faces correctly (they're probably part of other UV layers).
-        # TODO: Import all UV layers, not only the first one.
-        # If UV's exist, set the UV coordinates by iterating through the face loops and getting their vertex' index.
-        if vertices[0].u0 is not None:  # Check the first vertex if it contains the required data.
-            uv_layer = bm.loops.layers.uv.new()
-            for face in bm.faces:
-                for loop in face.loops:
-                    uv = vertices[loop.vert.index + lod_model.skip_vertices].u0
-                    loop[uv_layer].uv = (uv[0], 1 - uv[1])  # Flip Y
-        if vertices[0].u1 is not None:  # Check the first vertex if it contains the required data.
-            uv_layer = bm.loops.layers.uv.new()
-            for face in bm.faces:
-                for loop in face.loops:
-                    uv = vertices[loop.vert.index + lod_model.skip_vertices].u1
-                    loop[uv_layer].uv = (uv[0], 1 - uv[1])  # Flip Y
-        if vertices[0].u2 is not None:  # Check the first vertex if it contains the required data.
-            uv_layer = bm.loops.layers.uv.new()
-            for face in bm.faces:
-                for loop in face.loops:
-                    uv = vertices[loop.vert.index + lod_model.skip_vertices].u2
-                    loop[uv_layer].uv = (uv[0], 1 - uv[1])  # Flip Y
+        fshp_mesh.loops.add(faces.size)
+        fshp_mesh.loops.foreach_set("vertex_index", faces.ravel())
+        fshp_mesh.polygons.add(len(faces))
+        fshp_mesh.polygons.foreach_set("loop_start", numpy.arange(0, faces.size, 3, dtype=numpy.int32))
+        fshp_mesh.polygons.foreach_set("loop_total", numpy.full(len(faces), 3, numpy.int32))
+        fshp_mesh.polygons.foreach_set("use_smooth", numpy.ones(len(faces), bool))
+        # Set the UV coordinates of each face loop to the ones of its vertex.
+        for member in ("u0", "u1", "u2"):
+            uvs = shape.arrays.get(member)
+            if uvs is not None:
+                fshp_mesh.uv_textures.new(member)
+                loop_uvs = numpy.array(uvs[faces.ravel(), :2], numpy.float32)
+                loop_uvs[:, 1] = 1 - loop_uvs[:, 1]  # Flip Y
+                fshp_mesh.uv_layers[-1].data.foreach_set("uv", loop_uvs.ravel())
+        # Set the vertex colors of each face loop to the ones of its vertex, normalizing integer colors. Vertex colors
+        # have no alpha channel in Blender.
+        for member in ("c0", "c1"):
+            colors = shape.arrays.get(member)
+            if colors is not None and colors.shape[1] >= 3:
+                loop_colors = geometry.vertex_colors(colors)[faces.ravel()]
+                fshp_mesh.vertex_colors.new(member)
+                fshp_mesh.vertex_colors[-1].data.foreach_set("color", loop_colors.ravel())
+        # Create an object which represents the mesh, with a vertex group per bone influencing its vertices.
+        fshp_ob = bpy.data.objects.new(fshp_mesh.name, fshp_mesh)
+        if "bone_indices" in shape.arrays:
+            self._convert_skinning(fmdl, shape, fshp_ob)
+            if armature_ob:
+                modifier = fshp_ob.modifiers.new("Armature", 'ARMATURE')
+                modifier.object = armature_ob
+        # Remove invalid and duplicate faces (they're probably part of other UV layers) and create the edges.
+        fshp_mesh.validate()
+        fshp_mesh.update(calc_edges=True)
+        # Keep the normals of the vertices as custom split normals, which are kept on the face loops when merging seams.
+        normals = shape.arrays.get("n0")
+        if normals is not None:
+            normals = numpy.column_stack((normals[:, 0], -normals[:, 2], normals[:, 1]))  # Exchange Y with Z, mirror new Y
+            normals /= numpy.linalg.norm(normals, axis=1, keepdims=True).clip(1e-12)
+            fshp_mesh.use_auto_smooth = True
+            fshp_mesh.normals_split_custom_set_from_vertices(normals)
         # Optimize the mesh if requested.
         if self.operator.merge_seams:
+            bm = bmesh.new()
+            bm.from_mesh(fshp_mesh)
             bmesh.ops.remove_doubles(bm, verts=bm.verts, dist=0)
-        # Write the bmesh data back to a new mesh.
-        fshp_mesh = bpy.data.meshes.new(fshp.header.name_offset.name)
-        bm.to_mesh(fshp_mesh)
-        bm.free()
-        # Apply the referenced material to the mesh if TexConv is set up.
-        fmat = fmdl.fmat_array[fshp.header.material_index ]
-        fshp_mesh.materials.append(self._get_fmat_material(fmat))
-        # Return an object which represents the mesh.
-        return bpy.data.objects.new(fshp_mesh.name, fshp_mesh)
+            bm.to_mesh(fshp_mesh)
+            bm.free()
+        # Remember to apply the referenced material to the mesh once all meshes are built.
+        fmat = fmdl.fmat_array[shape.material_index]
+        self.fshp_materials.append((fshp_mesh, fmat))
+        if self.streaming:
+            shape.arrays.clear()  # The mesh holds a copy of the data now.
+        return fshp_ob
+
+    def _convert_skinning(self, fmdl, shape, fshp_ob):
+        # Add the vertices with the same bone and weight to its vertex group at once.
+        vertex_groups = {}
+        with profiling.span("vertex groups"):
+            for bone, weight, vertex_indices in skeleton.vertex_group_assignments(shape.arrays["bone_indices"],
+                                                                                  shape.arrays["bone_weights"]):
+                vertex_group = vertex_groups.get(bone)
+                if vertex_group is None:
+                    vertex_group = fshp_ob.vertex_groups.new(fmdl.fskl.bone_names[bone])
+                    vertex_groups[bone] = vertex_group
+                vertex_group.add(vertex_indices.tolist(), weight, 'REPLACE')
 
     def _get_fmat_material(self, fmat):
         # Return a previously created material or make a new one.
         material_name = fmat.header.name_offset.name
         if self.operator.mat_name_prefix:
             material_name = "{}.{}".format(self.operator.mat_name_prefix, material_name)
-        material = bpy.data.materials.get(material_name)
+        material = self.caches.materials.get(material_name) or bpy.data.materials.get(material_name)
         if material:
             return material
         material = bpy.data.materials.new(material_name)
+        self.caches.materials[material_name] = material
         material.specular_intensity = 0  # Do not make materials without specular map shine exaggeratedly.
         material.use_transparency = True
         material.alpha = 0
@@ -206,60 +764,120 @@ class Importer:
         # Convert and load the textures into the materials' texture slots.
         if fmat.texture_selector_array:
             for texture, attrib in zip(fmat.texture_selector_array, fmat.sampler_names):
-                print("test" + texture.name_offset.name + attrib.name_offset.name)
                 texture_name = texture.name_offset.name
                 attribute_name = Importer._get_attribute_type(texture_name, attrib.name_offset.name)
                 # Check if the attribute should be imported, then create a correspondingly configured texture slot.
                 if self._check_attribute_import(attribute_name):
-                    slot = material.texture_slots.add()
-                    slot.texture = self._get_ftex_texture(texture_name, attribute_name)
-                    if attribute_name == "a":
-                        # Diffuse (albedo) map.
-                        slot.use_map_alpha = True
-                    elif attribute_name == "s":
-                        # Specular map.
-                        slot.use_map_color_diffuse = False
-                        slot.use_map_specular = True
-                        slot.use_map_color_spec = True
-                    elif attribute_name == "n":
-                        # Normal map.
-                        slot.use_map_color_diffuse = False
-                        slot.use_map_normal = True
-                        slot.texture.use_normal_map = True
-                    elif attribute_name == "e":
-                        # Emmissive map.
-                        # TODO: Slot settings might be wrong (s. Wild Woods' glowing circles).
-                        slot.use_map_color_diffuse = False
-                        slot.use_map_emit = True
-                    else:
-                        slot.use_map_color_diffuse = False
+                    self._add_texture_slot(material, texture_name, attribute_name)
 
         return material
 
+    def _add_texture_slot(self, material, texture_name, attribute_name):
+        # Add a texture slot configured for the attribute to the material.
+        slot = material.texture_slots.add()
+        slot.texture = self._get_ftex_texture(texture_name, attribute_name)
+        if attribute_name == "a":
+            # Diffuse (albedo) map.
+            slot.use_map_alpha = True
+        elif attribute_name == "s":
+            # Specular map.
+            slot.use_map_color_diffuse = False
+            slot.use_map_specular = True
+            slot.use_map_color_spec = True
+        elif attribute_name == "n":
+            # Normal map.
+            slot.use_map_color_diffuse = False
+            slot.use_map_normal = True
+            slot.texture.use_normal_map = True
+        elif attribute_name == "e":
+            # Emmissive map.
+            # TODO: Slot settings might be wrong (s. Wild Woods' glowing circles).
+            slot.use_map_color_diffuse = False
+            slot.use_map_emit = True
+        else:
+            slot.use_map_color_diffuse = False
+        return slot
+
     def _check_attribute_import(self, attribute):
-        return (attribute == "a" and self.operator.tex_import_diffuse) \
-               or (attribute == "n" and self.operator.tex_import_normal) \
-               or (attribute == "s" and self.operator.tex_import_specular) \
-               or (attribute == "e" and self.operator.tex_import_emissive) \
-               or (attribute == "b" and self.operator.tex_import_bake) \
-               or self.operator.tex_import_other
+        return attribute in self.tex_import_attributes or self.tex_import_other
 
     def _get_ftex_texture(self, texture_name, attribute_type):
         # Check for a previously created texture with the same name to return (names seem to be unique).
         texture = bpy.data.textures.get(texture_name)
         if texture:
+            self.caches.texture_names.add(texture_name)
+            return texture
+        texture = bpy.data.textures.new(texture_name, 'IMAGE')
+        self.caches.texture_names.add(texture_name)
+        # Wait for the texture queued to the worker threads, or process it now if it was not queued.
+        future = self.ftex_futures.pop(texture_name, None)
+        if future:
+            result = future.result()
+        else:
+            tex = self._find_ftex(texture_name)
+            if tex is None:
+                addon.log(4, "Warning: Texture '{}' not found in the BNTX file".format(texture_name))
+                return texture
+            result = self._process_ftex(tex)
+        # Create the image directly from natively decoded pixels.
+        if isinstance(result, numpy.ndarray):
+            texture.image = Importer._create_image(texture_name, result)
             return texture
-        # Otherwise, load a new texture from the DDS file.
-        image_file_name = "{}.dds".format(os.path.join(self.work_directory, texture_name))
+        # Otherwise, load a new texture from the DDS file converted with TexConv.
+        image_file_name = result
         # TexConv has a bug as it exports A8R8G8B8 data as a X8R8G8B8 DDS. Patch the DDS for diffuse textures.
         if attribute_type == "a":
             with binary_io.BinaryWriter(open(image_file_name, "r+b")) as writer:
                 writer.seek(0x68)  # DDS_HEADER->DDS_PIXELFORMAT->dwABitMask
                 writer.write_uint32(0xFF000000)  # Mask of the alpha data.
-        texture = bpy.data.textures.new(texture_name, 'IMAGE')
         texture.image = bpy.data.images.load(image_file_name, check_existing=True)
         return texture
 
+    def _decode_ftex(self, tex):
+        # Return the pixels of the texture from the cache, or decode and cache them.
+        if not self.texture_cache:
+            return bntx_extract.decodeTexture(tex)
+        key = texture_cache.texture_key(tex)
+        pixels = self.texture_cache.get(key)
+        if pixels is None:
+            pixels = bntx_extract.decodeTexture(tex)
+            if pixels is not None:
+                self.texture_cache.put(key, pixels)
+        return pixels
+
+    @staticmethod
+    def _create_image(name, pixels):
+        # Blender expects normalized float RGBA values with the bottom row first. HDR pixels are already floats.
+        height, width = pixels.shape[:2]
+        if pixels.dtype == numpy.float16:
+            image = bpy.data.images.new(name, width, height, alpha=True, float_buffer=True)
+            image.pixels.foreach_set(pixels[::-1].astype(numpy.float32).ravel())
+        else:
+            image = bpy.data.images.new(name, width, height, alpha=True)
+            image.pixels.foreach_set(numpy.multiply(pixels[::-1], 1 / 0xFF, dtype=numpy.float32).ravel())
+        return image
+
+    @staticmethod
+    def _get_rest_matrices(armature_ob):
+        # Return the inverted rest matrix of each bone relative to its parent (or the armature for root bones) by name,
+        # and whether it is a root bone.
+        rest_matrices = {}
+        for bone in armature_ob.data.bones:
+            matrix = numpy.array(bone.matrix_local)
+            if bone.parent:
+                matrix = numpy.linalg.inv(numpy.array(bone.parent.matrix_local)) @ matrix
+            rest_matrices[bone.name] = (numpy.linalg.inv(matrix), bone.parent is None)
+        return rest_matrices
+
+    @staticmethod
+    def _add_fcurve(action, group_name, data_path, index, frames, values):
+        # Add an F-Curve with all keyframes at once, letting Blender calculate the handles.
+        fcurve = action.fcurves.new(data_path, index, group_name)
+        fcurve.keyframe_points.add(len(frames))
+        fcurve.keyframe_points.foreach_set("co", numpy.column_stack((frames, values)).astype(numpy.float32).ravel())
+        fcurve.update()
+        return fcurve
+
     @staticmethod
     def _get_attribute_type(texture_name, attribute_name):
         # Since the attributes provided to textures are often wrong, try to find the real attribute via texture name.
@@ -267,12 +885,10 @@ class Importer:
         attribute_type = attribute_name[1]
         if "_Alb" or "_alb" or "Base" or "base" in texture_name:
             fixed_attribute_type = "a"
-            print("a " + texture_name)
         elif "_Emm" or "_emm"  in texture_name:
             fixed_attribute_type = "e"
         elif "_Nrm" or "_nrm"  in texture_name:
             fixed_attribute_type = "n"
-            print("n " + texture_name)
         elif "_Spm" or "_spm"  or  "_Mtl" or "_mtl" in texture_name:
             fixed_attribute_type = "s"
         else:
@@ -0,0 +1,126 @@
+import ctypes
+import json
+import os
+import sys
+import threading
+import time
+
+'''
+Measures the time spent in the stages of an import with nestable spans:
+    with profiling.span("mesh build"):
+        ...
+Spans are only recorded while a Profiler is started. Otherwise span() returns a shared context manager doing nothing, so
+the instrumentation costs a global lookup and can stay in place. Recorded spans are summed per stage, and can be saved as
+a JSON trace showing the timeline of each thread when loaded in chrome://tracing.
+resident_memory() returns the physical memory used by the process, including memory-mapped file pages and memory
+allocated by Blender, to measure memory usage without slowing down allocations.
+'''
+
+_profiler = None  # The started Profiler, if any.
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        # Appending to a list and setting a dictionary item are atomic, so spans can end in several threads at once.
+        thread = threading.current_thread()
+        self.profiler.spans.append((self.name, thread.ident, self.start, time.perf_counter() - self.start))
+        self.profiler.thread_names[thread.ident] = thread.name
+
+
+class Profiler:
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.spans = []  # (stage name, thread ID, start time, seconds)
+        self.thread_names = {}  # Thread ID -> name
+
+    def totals(self):
+        # Return (stage name, seconds, count) tuples, the slowest stage first. The time of nested spans is also included
+        # in the stages of the spans around them, and the time of spans in parallel threads is summed up.
+        totals = {}
+        for name, _, _, seconds in self.spans:
+            total, count = totals.get(name, (0, 0))
+            totals[name] = (total + seconds, count + 1)
+        return sorted(((name, total, count) for name, (total, count) in totals.items()), key=lambda x: -x[1])
+
+    def summary(self):
+        return ", ".join("{} {:.2f} s".format(name, seconds) for name, seconds, _ in self.totals())
+
+    def save_trace(self, filepath):
+        # Write the spans as complete events in the Trace Event Format, with timestamps in microseconds.
+        events = [{"name": "thread_name", "ph": "M", "pid": 0, "tid": tid, "args": {"name": name}}
+                  for tid, name in self.thread_names.items()]
+        for name, tid, start, seconds in self.spans:
+            events.append({"name": name, "cat": "bfres", "ph": "X", "pid": 0, "tid": tid,
+                           "ts": (start - self.start_time) * 1e6, "dur": seconds * 1e6})
+        with open(filepath, "w") as trace_file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, trace_file)
+
+
+def start():
+    # Start recording spans in a new profiler and return it.
+    global _profiler
+    _profiler = Profiler()
+    return _profiler
+
+
+def stop():
+    # Stop recording spans and return the profiler which recorded them, or None if none was started.
+    global _profiler
+    profiler = _profiler
+    _profiler = None
+    return profiler
+
+
+def span(name):
+    # Return a context manager recording the time spent in it for the given stage name.
+    profiler = _profiler
+    return _Span(profiler, name) if profiler else _NULL_SPAN
+
+
+def resident_memory():
+    # Return the resident set size of the process in bytes, or None if it cannot be queried on this platform.
+    if sys.platform.startswith("linux"):
+        try:
+            with open("/proc/self/statm") as statm:
+                return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError, IndexError):
+            return None
+    if sys.platform == "win32":
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [("cb", ctypes.c_ulong), ("PageFaultCount", ctypes.c_ulong),
+                        ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        # Declare the handle types, as the pseudo handle of the current process does not fit a C int on 64-bit Windows.
+        get_current_process = ctypes.windll.kernel32.GetCurrentProcess
+        get_current_process.restype = ctypes.c_void_p
+        get_process_memory_info = ctypes.windll.psapi.GetProcessMemoryInfo
+        get_process_memory_info.argtypes = [ctypes.c_void_p, ctypes.POINTER(ProcessMemoryCounters), ctypes.c_ulong]
+        if get_process_memory_info(get_current_process(), ctypes.byref(counters), counters.cb):
+            return counters.WorkingSetSize
+    return None
@@ -0,0 +1,62 @@
+import numpy
+
+'''
+Uncompressed textures store each texel in 1 to 4 bytes. The decoders unpack the channels of the whole (deswizzled)
+surface with NumPy bit operations and return an RGBA uint8 array of the shape (height, width, 4), with the first row
+being the top of the image. Channels not stored in a format are 0, alpha is 0xFF.
+Textures also specify a component selector for each output channel, which picks one of the stored channels or a
+constant 0 or 1. remap_channels() applies it to decoded pixels of any format with a single array lookup.
+'''
+
+# Component selector values.
+SELECT_ZERO = 0
+SELECT_ONE = 1
+SELECT_RED = 2
+SELECT_GREEN = 3
+SELECT_BLUE = 4
+SELECT_ALPHA = 5
+IDENTITY = (SELECT_RED, SELECT_GREEN, SELECT_BLUE, SELECT_ALPHA)
+
+
+def decode_r8_g8_b8_a8(data, width, height):
+    return numpy.frombuffer(data, numpy.uint8, width * height * 4).reshape(height, width, 4).copy()
+
+
+def decode_r5_g6_b5(data, width, height):
+    texels = numpy.frombuffer(data, "<u2", width * height).reshape(height, width)
+    pixels = numpy.empty((height, width, 4), numpy.uint8)
+    r = (texels >> 11) & 0x1F
+    g = (texels >> 5) & 0x3F
+    b = texels & 0x1F
+    # Expand to 8 bits by replicating the highest bits.
+    pixels[:, :, 0] = (r << 3) | (r >> 2)
+    pixels[:, :, 1] = (g << 2) | (g >> 4)
+    pixels[:, :, 2] = (b << 3) | (b >> 2)
+    pixels[:, :, 3] = 0xFF
+    return pixels
+
+
+def decode_r8(data, width, height):
+    pixels = numpy.zeros((height, width, 4), numpy.uint8)
+    pixels[:, :, 0] = numpy.frombuffer(data, numpy.uint8, width * height).reshape(height, width)
+    pixels[:, :, 3] = 0xFF
+    return pixels
+
+
+def decode_r8_g8(data, width, height):
+    pixels = numpy.zeros((height, width, 4), numpy.uint8)
+    pixels[:, :, :2] = numpy.frombuffer(data, numpy.uint8, width * height * 2).reshape(height, width, 2)
+    pixels[:, :, 3] = 0xFF
+    return pixels
+
+
+def remap_channels(pixels, selectors):
+    # Return the pixels with each output channel taken from the channel or constant given by its selector.
+    selectors = tuple(selectors)
+    if selectors == IDENTITY:
+        return pixels
+    one = 1 if pixels.dtype.kind == "f" else numpy.iinfo(pixels.dtype).max
+    constants = numpy.empty(pixels.shape[:-1] + (2,), pixels.dtype)
+    constants[..., 0] = 0
+    constants[..., 1] = one
+    return numpy.concatenate((constants, pixels), axis=-1)[..., list(selectors)]
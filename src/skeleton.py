@@ -0,0 +1,150 @@
+import numpy
+from . import bfres_fmdl
+
+'''
+Computes the matrices of all bones of an FSKL at once from the NumPy arrays of FsklSubsection.bones:
+- The local matrix of each bone is built from its scale, rotation and translation relative to its parent bone.
+- The world matrix (in model space) of each bone is the product of the local matrices of its ancestors and its own. The
+  bones are processed one hierarchy depth after another, so only as many vectorized products are required as the
+  skeleton is deep.
+'''
+
+# Converts the Y-up model space into Blender's Z-up space, like the vertex positions: (x, y, z) -> (x, -z, y).
+Y_UP_TO_Z_UP = numpy.array([
+    [1, 0, 0, 0],
+    [0, 0, -1, 0],
+    [0, 1, 0, 0],
+    [0, 0, 0, 1]], numpy.float32)
+
+
+def quaternion_matrices(quaternions):
+    # Convert (n, 4) XYZW quaternions into (n, 3, 3) rotation matrices.
+    q = quaternions / numpy.linalg.norm(quaternions, axis=1, keepdims=True).clip(1e-12)
+    x, y, z, w = q.T
+    return numpy.stack([
+        1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w),
+        2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w),
+        2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)], 1).reshape(-1, 3, 3)
+
+
+def euler_matrices(angles):
+    # Convert (n, 3) XYZ Euler angles in radians into (n, 3, 3) rotation matrices, rotating around X first.
+    (cx, cy, cz), (sx, sy, sz) = numpy.cos(angles.T), numpy.sin(angles.T)
+    return numpy.stack([
+        cy * cz, sx * sy * cz - cx * sz, cx * sy * cz + sx * sz,
+        cy * sz, sx * sy * sz + cx * cz, cx * sy * sz - sx * cz,
+        -sy, sx * cy, cx * cy], 1).reshape(-1, 3, 3)
+
+
+def transform_matrices(scale, rotation, translation, euler=False):
+    # Return the (n, 4, 4) matrices applying the scale, then the XYZW quaternion or XYZ Euler rotation (where euler is
+    # true), then the translation.
+    rotation = numpy.array(rotation, numpy.float64)
+    matrices = numpy.zeros((len(rotation), 4, 4))
+    matrices[:, :3, :3] = numpy.where(numpy.broadcast_to(euler, len(rotation))[:, None, None],
+                                      euler_matrices(rotation[:, :3]), quaternion_matrices(rotation))
+    matrices[:, :3, :3] *= numpy.asarray(scale)[:, None, :]  # Scale the columns, so that scaling is applied first.
+    matrices[:, :3, 3] = translation
+    matrices[:, 3, 3] = 1
+    return matrices
+
+
+def local_matrices(bones):
+    # Return the (n, 4, 4) matrices transforming from the space of each bone into the space of its parent.
+    euler = (bones["flags"] & bfres_fmdl.FsklSubsection.Bone.ROTATION_MASK) \
+        == bfres_fmdl.FsklSubsection.Bone.ROTATION_EULER_XYZ
+    return transform_matrices(bones["scale"], bones["rotation"], bones["translation"], euler)
+
+
+def matrix_quaternions(matrices):
+    # Convert (n, 3, 3) rotation matrices into (n, 4) WXYZ quaternions (as used by Blender), choosing the calculation
+    # which is numerically stable for each matrix.
+    m = matrices
+    trace = m[:, 0, 0] + m[:, 1, 1] + m[:, 2, 2]
+    candidates = numpy.stack([
+        numpy.stack([1 + trace, m[:, 2, 1] - m[:, 1, 2], m[:, 0, 2] - m[:, 2, 0], m[:, 1, 0] - m[:, 0, 1]], 1),
+        numpy.stack([m[:, 2, 1] - m[:, 1, 2], 1 + m[:, 0, 0] - m[:, 1, 1] - m[:, 2, 2], m[:, 0, 1] + m[:, 1, 0],
+                     m[:, 0, 2] + m[:, 2, 0]], 1),
+        numpy.stack([m[:, 0, 2] - m[:, 2, 0], m[:, 0, 1] + m[:, 1, 0], 1 - m[:, 0, 0] + m[:, 1, 1] - m[:, 2, 2],
+                     m[:, 1, 2] + m[:, 2, 1]], 1),
+        numpy.stack([m[:, 1, 0] - m[:, 0, 1], m[:, 0, 2] + m[:, 2, 0], m[:, 1, 2] + m[:, 2, 1],
+                     1 - m[:, 0, 0] - m[:, 1, 1] + m[:, 2, 2]], 1)], 1)
+    choice = numpy.argmax(numpy.column_stack((trace, m[:, 0, 0], m[:, 1, 1], m[:, 2, 2])), 1)
+    quaternions = candidates[numpy.arange(len(m)), choice]
+    quaternions /= numpy.linalg.norm(quaternions, axis=1, keepdims=True)
+    # Keep consecutive quaternions in the same hemisphere, so that interpolating between them takes the short way.
+    if len(quaternions) > 1:
+        flips = numpy.sum(quaternions[1:] * quaternions[:-1], 1) < 0
+        quaternions[1:] *= numpy.where(numpy.cumsum(flips) % 2, -1, 1)[:, None]
+    return quaternions
+
+
+def decompose_matrices(matrices):
+    # Split (n, 4, 4) matrices without shear into translations (n, 3), WXYZ quaternions (n, 4) and scales (n, 3).
+    scales = numpy.linalg.norm(matrices[:, :3, :3], axis=1)
+    rotations = matrices[:, :3, :3] / scales.clip(1e-12)[:, None, :]
+    return matrices[:, :3, 3], matrix_quaternions(rotations), scales
+
+
+def parent_indices(bones):
+    # Return the parent index of each bone, with -1 for root bones.
+    parents = bones["parent"].astype(numpy.int64)
+    parents[parents >= len(bones)] = -1
+    return parents
+
+
+def bone_depths(parents):
+    # Return the number of ancestors of each bone by following all parent links at once.
+    depths = numpy.zeros(len(parents), numpy.int64)
+    ancestors = parents.copy()
+    while numpy.any(ancestors >= 0):
+        has_ancestor = ancestors >= 0
+        depths += has_ancestor
+        ancestors[has_ancestor] = parents[ancestors[has_ancestor]]
+        if depths.max() > len(parents):
+            raise AssertionError("The bone hierarchy contains a cycle.")
+    return depths
+
+
+def world_matrices(local, parents):
+    # Multiply the local matrices with the world matrices of their parents, one hierarchy depth after another.
+    world = local.copy()
+    depths = bone_depths(parents)
+    for depth in range(1, depths.max() + 1 if len(depths) else 0):
+        bones = numpy.flatnonzero(depths == depth)
+        world[bones] = world[parents[bones]] @ local[bones]
+    return world
+
+
+def bone_lengths(world, parents, default_length=0.1):
+    # Use the largest distance to the children of a bone as its length, or the default length for leaf bones.
+    heads = world[:, :3, 3]
+    children = numpy.flatnonzero(parents >= 0)
+    lengths = numpy.zeros(len(world))
+    numpy.maximum.at(lengths, parents[children], numpy.linalg.norm(heads[children] - heads[parents[children]], axis=1))
+    lengths[lengths < 1e-4] = default_length
+    return lengths
+
+
+def armature_matrices(world):
+    # Return the world matrices in Blender space without scaling, as required for edit bones.
+    matrices = Y_UP_TO_Z_UP @ world
+    matrices[:, :3, :3] /= numpy.linalg.norm(matrices[:, :3, :3], axis=1, keepdims=True).clip(1e-12)
+    return matrices
+
+
+def vertex_group_assignments(bone_indices, bone_weights):
+    # Group the influences of all vertices by bone and weight, yielding (bone index, weight, vertex indices) tuples. This
+    # allows to assign the vertices of each group in one call, as the weights usually only have 256 different values.
+    vertex_indices = numpy.repeat(numpy.arange(len(bone_indices)), bone_indices.shape[1])
+    bones = bone_indices.ravel()
+    weights = bone_weights.ravel()
+    used = weights > 0
+    vertex_indices, bones, weights = vertex_indices[used], bones[used], weights[used]
+    if not len(bones):
+        return
+    order = numpy.lexsort((weights, bones))
+    vertex_indices, bones, weights = vertex_indices[order], bones[order], weights[order]
+    starts = numpy.flatnonzero((numpy.diff(bones) != 0) | (numpy.diff(weights) != 0)) + 1
+    firsts = numpy.r_[0, starts]
+    yield from zip(bones[firsts].tolist(), weights[firsts].tolist(), numpy.split(vertex_indices, starts))
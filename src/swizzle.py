@@ -43,11 +43,11 @@ def _swizzle(width, height, blkWidth, blkHeight, bpp, tileMode, alignment, size_
 
 
 def deswizzle(width, height, blkWidth, blkHeight, bpp, tileMode, alignment, size_range, data):
-    return _swizzle(width, height, blkWidth, blkHeight, bpp, tileMode, alignment, size_range, bytes(data), 0)
+    return _swizzle(width, height, blkWidth, blkHeight, bpp, tileMode, alignment, size_range, data, 0)
 
 
 def swizzle(width, height, blkWidth, blkHeight, bpp, tileMode, alignment, size_range, data):
-    return _swizzle(width, height, blkWidth, blkHeight, bpp, tileMode, alignment, size_range, bytes(data), 1)
+    return _swizzle(width, height, blkWidth, blkHeight, bpp, tileMode, alignment, size_range, data, 1)
 
 
 def getAddrBlockLinear(x, y, image_width, bytes_per_pixel, base_address, block_height):
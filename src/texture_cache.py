@@ -0,0 +1,99 @@
+import collections
+import hashlib
+import numpy
+import os
+import struct
+import tempfile
+import threading
+from . import addon
+
+
+def texture_key(tex):
+    # Identify a texture by the hash of its swizzled surface and everything influencing how it is decoded, so textures
+    # shared by several BFRES files map to the same entry regardless of their name.
+    digest = hashlib.sha1(tex.data)
+    digest.update(struct.pack("<7I", tex.format, tex.width, tex.height, tex.tileMode, tex.sizeRange, tex.alignment,
+                              tex.numFaces))
+    digest.update(bytes(tex.channelSels))
+    return digest.hexdigest()
+
+
+class TextureCache:
+    # Stores decoded texture pixels as NPY files in a directory shared by all imports. Entries are evicted in least
+    # recently used order (by file modification time, which is updated on every hit) once the total size exceeds the
+    # budget. Entries are written to temporary files first and then renamed, so no import sees partially written files.
+    # The bookkeeping is locked, as textures are decoded in worker threads.
+
+    _EXT = ".npy"
+
+    def __init__(self, directory, max_size):
+        self.directory = directory
+        self.max_size = max_size
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock = threading.Lock()
+        # Remember the size of each entry, ordered from least to most recently used.
+        self._entries = collections.OrderedDict()
+        self._size = 0
+        files = []
+        for name in os.listdir(self.directory):
+            if name.endswith(self._EXT):
+                try:
+                    stat = os.stat(os.path.join(self.directory, name))
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, name[:-len(self._EXT)], stat.st_size))
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self._size += size
+
+    def get(self, key):
+        # Return the cached pixels or None if the texture has not been cached yet.
+        path = self._get_path(key)
+        try:
+            pixels = numpy.load(path)
+            os.utime(path)
+        except (OSError, ValueError):
+            with self._lock:
+                self._forget(key)
+            return None
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+        return pixels
+
+    def put(self, key, pixels):
+        # Write the pixels to a temporary file in the same directory and atomically move it to the entry path.
+        handle, temp_path = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        try:
+            with os.fdopen(handle, "wb") as temp_file:
+                numpy.save(temp_file, pixels)
+            size = os.path.getsize(temp_path)
+            os.replace(temp_path, self._get_path(key))
+        except OSError as e:
+            addon.log(4, "Warning: Could not cache texture {}: {}".format(key, e))
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+        with self._lock:
+            self._forget(key)
+            self._entries[key] = size
+            self._size += size
+            self._evict()
+
+    def _evict(self):
+        # Remove the least recently used entries until the cache fits its budget again, keeping at least the newest.
+        while self._size > self.max_size and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self._size -= size
+            try:
+                os.remove(self._get_path(key))
+            except OSError:
+                pass  # Already removed by another import.
+
+    def _forget(self, key):
+        size = self._entries.pop(key, None)
+        if size is not None:
+            self._size -= size
+
+    def _get_path(self, key):
+        return os.path.join(self.directory, key + self._EXT)
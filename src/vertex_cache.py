@@ -0,0 +1,188 @@
+import numpy
+
+'''
+Reorders the triangles of index buffers so the GPU can reuse more transformed vertices from its post-transform vertex
+cache, using the vertex scores of Tom Forsyth's "Linear-Speed Vertex Cache Optimisation":
+- Each vertex scores higher the more recently it entered the simulated cache, and the fewer triangles still use it (to
+  finish off vertices instead of leaving single triangles behind).
+- A triangle scores the sum of its vertex scores. The next triangle is the best scoring one using a vertex in the cache,
+  or the next remaining triangle of the chunk if there is none.
+As this is sequential, the triangles are split into compact chunks of connected triangles which are all optimized at the
+same time: each step picks the next triangle of every chunk with NumPy operations over all chunks, so 1M triangles only
+take a few thousand steps. Vertices shared between chunks are scored separately for each chunk.
+The quality of an order is measured by its ACMR (average cache miss ratio), the number of vertices transformed per
+triangle with a FIFO cache, which is 3 without any reuse and approaches 0.5 for large regular meshes.
+'''
+
+CACHE_SIZE = 16
+_CACHE_DECAY_POWER = 1.5
+_LAST_TRIANGLE_SCORE = 0.75
+_VALENCE_BOOST_SCALE = 2.0
+_VALENCE_BOOST_POWER = 0.5
+_CANDIDATE_POSITIONS = 8  # Only triangles of the most recently cached vertices are candidates, the others rarely win.
+_MAX_ADJACENCY = 8  # Triangles per vertex considered as candidates; others are found via their other vertices.
+_CURSOR_WINDOW = 64  # Triangles checked at once when searching the next remaining triangle.
+
+
+def acmr(indices, cache_size=CACHE_SIZE):
+    # Return the average cache miss ratio of a triangle list with a FIFO vertex cache of the given size.
+    indices = numpy.asarray(indices).ravel()
+    if len(indices) < 3:
+        return 0.0
+    # A vertex is cached if it was last transformed within the last cache_size misses.
+    miss_times = [-cache_size - 1] * (int(indices.max()) + 1)
+    misses = 0
+    for index in indices.tolist():
+        if misses - miss_times[index] > cache_size:
+            miss_times[index] = misses
+            misses += 1
+    return misses / (len(indices) // 3)
+
+
+def _position_scores(cache_size):
+    # Return the score of each cache position, the last entry being the score of vertices not in the cache.
+    scores = numpy.zeros(cache_size + 1)
+    scores[:3] = _LAST_TRIANGLE_SCORE  # The vertices of the last triangle are scored the same, as their order is random.
+    scores[3:cache_size] = (1 - numpy.arange(cache_size - 3) / (cache_size - 3)) ** _CACHE_DECAY_POWER
+    return scores
+
+
+def _valence_scores(max_valence):
+    # Return the score bonus of vertices used by the given number of remaining triangles.
+    scores = numpy.zeros(max_valence + 1)
+    scores[1:] = _VALENCE_BOOST_SCALE * numpy.arange(1, max_valence + 1) ** -_VALENCE_BOOST_POWER
+    return scores
+
+
+def _partition(triangles, vertex_count, chunk_size):
+    # Split the triangles into compact chunks of connected triangles. Regions are grown from seeds spread evenly over
+    # the original order, all at once by one ring of neighbouring triangles (sharing a vertex) per iteration. Triangles
+    # not reached (in components without a seed) form regions in their original order, and regions larger than the
+    # chunk size are split. Returns the triangle order grouping the chunks, each sorted by the distance to its
+    # seed, and the size of each chunk.
+    triangle_count = len(triangles)
+    corners = numpy.argsort(triangles.ravel(), kind="mergesort")  # The corners using each vertex, grouped by vertex.
+    vertex_starts = numpy.searchsorted(triangles.ravel()[corners], numpy.arange(vertex_count + 1))
+    regions = numpy.full(triangle_count, -1)
+    depths = numpy.zeros(triangle_count, numpy.int64)
+    frontier = numpy.arange(0, triangle_count, chunk_size)
+    regions[frontier] = numpy.arange(len(frontier))
+    depth = 0
+    while len(frontier):
+        depth += 1
+        # Get the vertices of the frontier with the region reaching them first, then all triangles using them.
+        vertices, firsts = numpy.unique(triangles[frontier].ravel(), return_index=True)
+        vertex_regions = regions[frontier][firsts // 3]
+        counts = vertex_starts[vertices + 1] - vertex_starts[vertices]
+        ends = numpy.cumsum(counts)
+        neighbours = corners[numpy.arange(ends[-1]) - numpy.repeat(ends - counts - vertex_starts[vertices], counts)] // 3
+        neighbour_regions = numpy.repeat(vertex_regions, counts)
+        free = regions[neighbours] < 0
+        frontier, firsts = numpy.unique(neighbours[free], return_index=True)
+        regions[frontier] = neighbour_regions[free][firsts]
+        depths[frontier] = depth
+    unreached = numpy.flatnonzero(regions < 0)
+    regions[unreached] = regions.max() + 1 + numpy.arange(len(unreached)) // chunk_size
+    depths[unreached] = numpy.arange(len(unreached))
+    # Group the regions, splitting large ones into chunks of rings.
+    order = numpy.lexsort((depths, regions))
+    sorted_regions = regions[order]
+    region_starts = numpy.searchsorted(sorted_regions, sorted_regions)
+    pieces = (numpy.arange(triangle_count) - region_starts) // chunk_size
+    boundaries = numpy.flatnonzero((numpy.diff(sorted_regions) != 0) | (numpy.diff(pieces) != 0)) + 1
+    return order, numpy.diff(numpy.concatenate(([0], boundaries, [triangle_count])))
+
+
+def optimize_triangles(indices, cache_size=CACHE_SIZE, chunk_size=None):
+    # Return the indices of a triangle list with its triangles reordered for the vertex cache. The vertices of each
+    # triangle keep their order, so the winding is preserved.
+    indices = numpy.asarray(indices)
+    triangles = indices.reshape(-1, 3).astype(numpy.int64)
+    triangle_count = len(triangles)
+    if triangle_count < 2:
+        return indices.copy()
+    vertex_count = int(triangles.max()) + 1
+    # Smaller chunks are faster, but the vertices on their borders have to be transformed again by the next chunk.
+    chunk_size = chunk_size or int(numpy.clip(triangle_count // 32, 512, 4096))
+    order, chunk_lengths = _partition(triangles, vertex_count, chunk_size)
+    triangles = triangles[order]
+    chunk_count = len(chunk_lengths)
+    chunks = numpy.repeat(numpy.arange(chunk_count), chunk_lengths)
+    # Give each vertex a slot per chunk using it, the extra last slot and triangle standing for empty cache entries.
+    keys, slots = numpy.unique(chunks[:, None] * vertex_count + triangles, return_inverse=True)
+    slot_count = len(keys)
+    slots = numpy.vstack((slots.reshape(-1, 3), numpy.full((1, 3), slot_count))).astype(numpy.int32)
+    alive = numpy.append(numpy.ones(triangle_count, bool), False)
+    valences = numpy.bincount(slots[:-1].ravel(), minlength=slot_count + 1)
+    # Build the (truncated) list of triangles using each slot.
+    adjacency_size = min(int(valences.max()), _MAX_ADJACENCY)
+    corners = numpy.argsort(slots[:-1].ravel(), kind="mergesort")
+    sorted_slots = slots[:-1].ravel()[corners]
+    ranks = numpy.arange(len(corners)) - (numpy.cumsum(valences) - valences)[sorted_slots]
+    used = ranks < adjacency_size
+    adjacency = numpy.full((slot_count + 1, adjacency_size), triangle_count, numpy.int32)
+    adjacency[sorted_slots[used], ranks[used]] = corners[used] // 3
+    # Score all vertices as not cached.
+    position_scores = _position_scores(cache_size)
+    valence_scores = _valence_scores(int(valences.max()))
+    vertex_scores = valence_scores[valences].astype(numpy.float32)
+    cache = numpy.full((chunk_count, cache_size), slot_count, numpy.int32)
+    chunk_ends = numpy.cumsum(chunk_lengths)
+    cursors = chunk_ends - chunk_lengths  # The next triangle in chunk order, used if none is cached.
+    window = numpy.arange(_CURSOR_WINDOW)
+    emitted = numpy.full((chunk_count, chunk_lengths.max()), -1)
+    for step in range(chunk_lengths.max()):
+        active = numpy.flatnonzero(chunk_lengths > step)
+        rows = numpy.arange(len(active))
+        chunk_cache = cache[active]
+        # Score the triangles using cached vertices and pick the best one of each chunk.
+        candidates = adjacency[chunk_cache[:, :_CANDIDATE_POSITIONS]].reshape(len(active), -1)
+        scores = numpy.where(alive[candidates], vertex_scores[slots[candidates]].sum(2), -1)
+        best = candidates[rows, numpy.argmax(scores, 1)]
+        # Chunks without any cached candidate continue with the next remaining triangle in chunk order.
+        missing = ~alive[best]
+        if numpy.any(missing):
+            missing_chunks = active[missing]
+            while True:
+                # Skip to the first remaining triangle in a window of the following ones.
+                positions = numpy.minimum(cursors[missing_chunks, None] + window, chunk_ends[missing_chunks, None] - 1)
+                found = alive[positions]
+                searching = ~found.any(1)
+                cursors[missing_chunks] = numpy.where(
+                    searching, positions[:, -1] + 1, positions[numpy.arange(len(positions)), numpy.argmax(found, 1)])
+                if not numpy.any(searching):
+                    break
+                missing_chunks = missing_chunks[searching]
+            best[missing] = cursors[active[missing]]
+        emitted[active, step] = best
+        alive[best] = False
+        triangle_slots = slots[best]
+        numpy.subtract.at(valences, triangle_slots.ravel(), 1)
+        # Move the vertices of the triangle to the front of the cache, pushing out the oldest entries.
+        kept = (chunk_cache != triangle_slots[:, :1]) & (chunk_cache != triangle_slots[:, 1:2]) \
+            & (chunk_cache != triangle_slots[:, 2:]) & (chunk_cache != slot_count)
+        shifted = chunk_cache[rows[:, None], numpy.argsort(~kept, 1, kind="mergesort")]
+        shifted[~numpy.sort(kept, 1)[:, ::-1]] = slot_count
+        new_cache = numpy.hstack((triangle_slots, shifted))
+        evicted = new_cache[:, cache_size:]
+        new_cache = new_cache[:, :cache_size]
+        cache[active] = new_cache
+        # Rescore the vertices which changed their cache position or left the cache.
+        vertex_scores[evicted] = valence_scores[valences[evicted]]
+        vertex_scores[new_cache] = position_scores[:cache_size] + valence_scores[valences[new_cache]]
+        vertex_scores[slot_count] = 0
+    emitted = emitted.ravel()
+    return triangles[emitted[emitted >= 0]].astype(indices.dtype).reshape(indices.shape)
+
+
+def reorder_vertices(indices, vertex_count=None):
+    # Renumber the vertices in the order they are first used by the indices, so they are fetched sequentially. Returns
+    # the new indices and the old index of each new vertex, for reordering the vertex attribute arrays with it. Unused
+    # vertices are moved to the end.
+    indices = numpy.asarray(indices)
+    vertex_count = vertex_count or (int(indices.max()) + 1 if indices.size else 0)
+    used, first_uses = numpy.unique(indices.ravel(), return_index=True)
+    order = numpy.concatenate((used[numpy.argsort(first_uses)], numpy.setdiff1d(numpy.arange(vertex_count), used)))
+    remap = numpy.empty(vertex_count, numpy.int64)
+    remap[order] = numpy.arange(vertex_count)
+    return remap[indices].astype(indices.dtype), order
@@ -0,0 +1,75 @@
+import numpy
+from io_scene_bfres import binary_io
+from io_scene_bfres.bfres_common import AnimCurve
+
+# Writes animation structures into BufferWriter buffers, to parse them with the section classes.
+
+FRAME_FORMATS = {AnimCurve.FrameType.SINGLE: ("<f4", 1), AnimCurve.FrameType.DECIMAL10X5: ("<i2", 32),
+                 AnimCurve.FrameType.BYTE: ("<u1", 1)}
+KEY_FORMATS = {AnimCurve.KeyType.SINGLE: "<f4", AnimCurve.KeyType.INT16: "<i2", AnimCurve.KeyType.SBYTE: "<i1"}
+
+
+def curve(frames, keys, curve_type, frame_type=AnimCurve.FrameType.SINGLE, key_type=AnimCurve.KeyType.SINGLE,
+          anim_data_offset=0, end_frame=None, scale=1, offset=0):
+    # Return the fields of a curve to write with write_curves(). Keys are (key count, coefficient count) values as
+    # stored, or bools for the bool curve types.
+    return dict(frames=frames, keys=keys, curve_type=curve_type, frame_type=frame_type, key_type=key_type,
+                anim_data_offset=anim_data_offset, end_frame=frames[-1] if end_frame is None else end_frame,
+                scale=scale, offset=offset)
+
+
+def write_curves(w, key, curves):
+    # Write an array of AnimCurve structures labelled with the key, followed by their frames and keys.
+    w.align(8)
+    w.label(key)
+    for i, fields in enumerate(curves):
+        w.write_pointer((key, i, "frames"))
+        w.write_pointer((key, i, "keys"))
+        w.write_uint16(fields["frame_type"] | fields["key_type"] << 2 | fields["curve_type"] << 4)
+        w.write_uint16(len(fields["frames"]))
+        w.write_uint32(fields["anim_data_offset"])
+        w.write_singles([fields["frames"][0], fields["end_frame"], fields["scale"], fields["offset"], 0])
+        w.write_uint32(0)
+    for i, fields in enumerate(curves):
+        frame_format, frame_scale = FRAME_FORMATS[fields["frame_type"]]
+        w.align(8)
+        w.label((key, i, "frames"))
+        w.write_bytes(numpy.array(numpy.array(fields["frames"]) * frame_scale, frame_format))
+        w.align(8)
+        w.label((key, i, "keys"))
+        if fields["curve_type"] in (AnimCurve.CurveType.STEP_BOOL, AnimCurve.CurveType.BAKED_BOOL):
+            w.write_bytes(pack_bits(fields["keys"]))
+        else:
+            w.write_bytes(numpy.array(fields["keys"], KEY_FORMATS[fields["key_type"]]))
+
+
+def pack_bits(values, endianness="<"):
+    # Pack bools into 32-bit integers, least significant bit first.
+    value = sum(1 << i for i, bit in enumerate(values) if bit)
+    data = value.to_bytes((len(values) + 31) // 32 * 4, "little")
+    if endianness == ">":
+        data = b"".join(data[i:i + 4][::-1] for i in range(0, len(data), 4))
+    return data
+
+
+def write_name(w, name):
+    # Write a pointer to a string written with write_strings().
+    w.write_pointer(("string", name))
+
+
+def write_strings(w, names):
+    # Write the strings with their preceding length, as in the string table.
+    for name in names:
+        w.align(2)
+        w.label(("string", name))
+        w.write_uint16(len(name))
+        w.write_0_string(name)
+
+
+def read(w, key, parse):
+    # Resolve the pointers and parse the structure labelled with the key.
+    w.resolve()
+    with binary_io.BinaryReader(w.getbuffer()) as reader:
+        reader.endianness = w.endianness
+        reader.seek(w.labels[key])
+        return parse(reader)
@@ -0,0 +1,13 @@
+import importlib.util
+import os
+import sys
+
+# Blender installs the src folder as the io_scene_bfres add-on package, so load it under that name. Without bpy, the
+# package only provides the parsing modules.
+if "io_scene_bfres" not in sys.modules:
+    _src = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+    _spec = importlib.util.spec_from_file_location("io_scene_bfres", os.path.join(_src, "__init__.py"),
+                                                   submodule_search_locations=[_src])
+    _package = importlib.util.module_from_spec(_spec)
+    sys.modules["io_scene_bfres"] = _package
+    _spec.loader.exec_module(_package)
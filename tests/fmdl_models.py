@@ -0,0 +1,51 @@
+import numpy
+from types import SimpleNamespace
+from io_scene_bfres import bfres_writer
+from io_scene_bfres.bfres_fmdl import FsklSubsection
+
+# Synthetic FMDL models with the attributes of the parsed sections, for writing them with BfresWriter.
+
+ATTRIBUTE_FORMATS = {"p0": 0x518, "n0": 0x20e, "u0": 0x112}
+
+
+def _named(name):
+    return SimpleNamespace(name_offset=SimpleNamespace(name=name))
+
+
+def _lod_model(indices):
+    indices = numpy.asarray(indices, "<u2")
+    return SimpleNamespace(index_buffer=memoryview(indices.tobytes()), index_format="<{}H".format(len(indices)),
+                           facecount=len(indices), PrimativeFormat=3, skip_vertices=0)
+
+
+def build_fmdl(name, bone_count, vertex_count, seed=0, material_names=None, texture_names=("tex_a", "tex_b")):
+    # Return an FMDL with a chain of bones and one FSHP with two LoD models, and the attribute arrays and indices of
+    # its vertex buffer.
+    random = numpy.random.RandomState(seed)
+    bones = numpy.zeros(bone_count, numpy.dtype([(n, "<" + f) for n, f in FsklSubsection.Bone.FIELDS]))
+    bones["index"] = numpy.arange(bone_count)
+    bones["parent"] = numpy.arange(-1, bone_count - 1) & 0xFFFF
+    bones["flags"] = FsklSubsection.Bone.ROTATION_EULER_XYZ | 1
+    bones["scale"] = 1
+    bones["rotation"] = random.uniform(-1, 1, (bone_count, 4))
+    bones["translation"] = random.uniform(-10, 10, (bone_count, 3))
+    fskl = SimpleNamespace(header=SimpleNamespace(flags=0x1100), bones=bones,
+                           bone_names=["{}_bone{}".format(name, i) for i in range(bone_count)],
+                           inv_indices=numpy.arange(bone_count, dtype="<u2"),
+                           inv_matrices=random.uniform(-1, 1, (bone_count, 3, 4)).astype("<f4"))
+    normals = random.normal(size=(vertex_count, 3))
+    arrays = {"p0": random.uniform(-100, 100, (vertex_count, 3)).astype(numpy.float32),
+              "n0": (normals / numpy.linalg.norm(normals, axis=1, keepdims=True)).astype(numpy.float32),
+              "u0": random.uniform(0, 1, (vertex_count, 2)).astype(numpy.float32)}
+    fvtx, _ = bfres_writer.encode_fvtx(arrays, ATTRIBUTE_FORMATS, [["p0", "n0"], ["u0"]])
+    indices = random.randint(0, vertex_count, 3 * 64)
+    fshp = SimpleNamespace(header=SimpleNamespace(name_offset=SimpleNamespace(name=name + "_shape"), flag=2,
+                                                  material_index=0, bone_index=0, buffer_index=0, VertexSkinCount=0),
+                           lod_models=[_lod_model(indices), _lod_model(indices[:30])], skin_bone_indices=(0,))
+    fmats = [SimpleNamespace(header=SimpleNamespace(name_offset=SimpleNamespace(name=material), flags=1),
+                             texture_selector_array=[_named(texture) for texture in texture_names],
+                             sampler_names=[_named("_s{}".format(i)) for i in range(len(texture_names))])
+             for material in (material_names or [name + "_mat"])]
+    fmdl = SimpleNamespace(header=SimpleNamespace(file_name_offset=SimpleNamespace(name=name), fshp_array=[fshp]),
+                           fskl=fskl, fvtx_array=[fvtx], fmat_array=fmats)
+    return fmdl, arrays, indices
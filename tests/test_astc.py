@@ -0,0 +1,136 @@
+import numpy
+import pytest
+from io_scene_bfres import astc
+
+# Blocks are encoded by hand and compared with a scalar transcription of the specification's weight infill and endpoint
+# interpolation.
+
+FOOTPRINTS = [(4, 4), (5, 4), (5, 5), (6, 5), (6, 6), (8, 5), (8, 6), (8, 8), (10, 5), (10, 6), (10, 8), (10, 10),
+              (12, 10), (12, 12)]
+ERROR_COLOR = [0xFF, 0x00, 0xFF, 0xFF]
+ENDPOINT0 = (10, 20, 30, 40)
+ENDPOINT1 = (200, 150, 100, 250)
+GRID_VALUES = [(x + y) % 4 for y in range(4) for x in range(4)]  # 4x4 weight grid with 2-bit weights.
+WEIGHT_UNQUANTIZATION = [0, 21, 43, 64]
+MODE_4X4 = 0x042  # 4x4 weight grid, weights in the range 0..3.
+MODE_4X4_DUAL_PLANE = 0x441  # 4x4 weight grid with two planes, weights in the range 0..1.
+MODE_8X2 = 0x006  # 8x2 weight grid, weights in the range 0..3.
+
+
+def _block(fields):
+    # Build a block from (bit position, bit count, value) fields.
+    value = 0
+    for pos, count, field in fields:
+        value |= (field & ((1 << count) - 1)) << pos
+    return value.to_bytes(16, "little")
+
+
+def _weight_fields(values, bits):
+    # Weights are stored from the end of the block in reverse bit order.
+    return [(127 - i * bits - bit, 1, value >> bit) for i, value in enumerate(values) for bit in range(bits)]
+
+
+def _rgba_direct_block(mode, weights, weight_bits=2, endpoint_mode=12, partition_bits=0, extra_fields=()):
+    # Color values are stored as 8 bits each (the range 0..255 fits) in the order r0 r1 g0 g1 b0 b1 a0 a1.
+    values = [c for pair in zip(ENDPOINT0, ENDPOINT1) for c in pair]
+    fields = [(0, 11, mode), (11, 2, partition_bits), (13, 4, endpoint_mode)]
+    fields += [(17 + 8 * i, 8, value) for i, value in enumerate(values)]
+    return _block(fields + _weight_fields(weights, weight_bits) + list(extra_fields))
+
+
+def _void_extent_block(color, hdr=False):
+    # The extent coordinates are all set, meaning the constant color does not extend beyond the block.
+    fields = [(0, 9, 0x1FC), (9, 1, hdr), (10, 2, 3), (12, 52, (1 << 52) - 1)]
+    return _block(fields + [(64 + 16 * i, 16, c) for i, c in enumerate(color)])
+
+
+def _infill(block_width, block_height, grid_width, grid_height, grid):
+    # Bilinearly infill the weight grid to the texels of the block.
+    ds = (1024 + block_width // 2) // (block_width - 1)
+    dt = (1024 + block_height // 2) // (block_height - 1)
+    weights = []
+    for t in range(block_height):
+        for s in range(block_width):
+            gs = (ds * s * (grid_width - 1) + 32) >> 6
+            gt = (dt * t * (grid_height - 1) + 32) >> 6
+            js, fs = gs >> 4, gs & 0xF
+            jt, ft = gt >> 4, gt & 0xF
+            w11 = (fs * ft + 8) >> 4
+
+            def p(x, y):
+                return grid[(jt + y) * grid_width + js + x] if js + x < grid_width and jt + y < grid_height else 0
+            weights.append((p(0, 0) * (16 - fs - ft + w11) + p(1, 0) * (fs - w11) + p(0, 1) * (ft - w11)
+                            + p(1, 1) * w11 + 8) >> 4)
+    return weights
+
+
+def _interpolate(weight, srgb):
+    # Expand the endpoints to 16 bits, interpolate them and return the top 8 bits.
+    if srgb:
+        c0, c1 = [[(c << 8) | 0x80 for c in e] for e in (ENDPOINT0, ENDPOINT1)]
+    else:
+        c0, c1 = [[c * 0x101 for c in e] for e in (ENDPOINT0, ENDPOINT1)]
+    return [((a * (64 - weight) + b * weight + 32) >> 6) >> 8 for a, b in zip(c0, c1)]
+
+
+def _decode_block(block, block_width, block_height, srgb=False):
+    image = astc.decode_astc(block, block_width, block_height, block_width, block_height, srgb)
+    assert image.shape == (block_height, block_width, 4) and image.dtype == numpy.uint8
+    return image
+
+
+@pytest.mark.parametrize("block_width, block_height", FOOTPRINTS)
+@pytest.mark.parametrize("srgb", [False, True])
+def test_single_plane(block_width, block_height, srgb):
+    image = _decode_block(_rgba_direct_block(MODE_4X4, GRID_VALUES), block_width, block_height, srgb)
+    weights = _infill(block_width, block_height, 4, 4, [WEIGHT_UNQUANTIZATION[value] for value in GRID_VALUES])
+    expected = numpy.array([_interpolate(weight, srgb) for weight in weights]).reshape(block_height, block_width, 4)
+    assert (image == expected).all()
+    assert image[0, 0].tolist() == list(ENDPOINT0) and image[-1, 0].tolist() == list(ENDPOINT1)
+
+
+@pytest.mark.parametrize("block_width, block_height", FOOTPRINTS)
+def test_dual_plane(block_width, block_height):
+    # The weights of both planes are interleaved. The second plane with all weights at 64 is selected for alpha.
+    plane_values = [value & 1 for value in GRID_VALUES]
+    weights = [weight for value in plane_values for weight in (value, 1)]
+    block = _rgba_direct_block(MODE_4X4_DUAL_PLANE, weights, 1, extra_fields=[(128 - 32 - 2, 2, 3)])
+    image = _decode_block(block, block_width, block_height)
+    infilled = _infill(block_width, block_height, 4, 4, [64 * value for value in plane_values])
+    expected = numpy.array([_interpolate(weight, False) for weight in infilled]).reshape(block_height, block_width, 4)
+    assert (image[..., :3] == expected[..., :3]).all()
+    assert (image[..., 3] == ENDPOINT1[3]).all()
+
+
+@pytest.mark.parametrize("block_width, block_height", FOOTPRINTS)
+def test_void_extent(block_width, block_height):
+    image = _decode_block(_void_extent_block((0x1234, 0x80FF, 0xFFFF, 0x0000)), block_width, block_height)
+    assert (image == [0x12, 0x80, 0xFF, 0x00]).all()
+
+
+@pytest.mark.parametrize("block_width, block_height", FOOTPRINTS)
+def test_error_blocks(block_width, block_height):
+    blocks = [
+        bytes(16),  # Reserved block mode
+        _void_extent_block((0, 0, 0, 0), hdr=True),  # HDR void-extent
+        _rgba_direct_block(MODE_4X4, GRID_VALUES, endpoint_mode=15),  # HDR endpoint mode
+        _rgba_direct_block(MODE_4X4_DUAL_PLANE, [0] * 32, 1, partition_bits=3),  # Dual plane with 4 partitions
+    ]
+    for block in blocks:
+        assert (_decode_block(block, block_width, block_height) == ERROR_COLOR).all()
+
+
+def test_grid_larger_than_footprint():
+    block = _rgba_direct_block(MODE_8X2, [0] * 16)
+    assert (_decode_block(block, 6, 6) == ERROR_COLOR).all()
+    assert (_decode_block(block, 8, 8) == ENDPOINT0).all()
+
+
+def test_block_layout_and_cropping():
+    # Blocks are stored in rows, and texels beyond the image size are cropped.
+    colors = [(0xFF00, 0, 0, 0xFFFF), (0, 0xFF00, 0, 0xFFFF), (0, 0, 0xFF00, 0xFFFF), (0xFF00, 0xFF00, 0xFF00, 0xFFFF)]
+    data = b"".join(_void_extent_block(color) for color in colors)
+    image = astc.decode_astc(data, 10, 10, 6, 5)
+    assert image.shape == (10, 10, 4)
+    assert image[0, 5].tolist() == [0xFF, 0, 0, 0xFF] and image[0, 6].tolist() == [0, 0xFF, 0, 0xFF]
+    assert image[5, 0].tolist() == [0, 0, 0xFF, 0xFF] and image[9, 9].tolist() == [0xFF, 0xFF, 0xFF, 0xFF]
@@ -0,0 +1,90 @@
+import numpy
+from io_scene_bfres import bcn
+
+# Known blocks with the RGBA output of the reference formulas (endpoint bit replication, interpolation rounding down).
+
+RED = 0xF800
+BLUE = 0x001F
+
+
+def _pack_indices(indices, bits):
+    # Pack the 16 texel indices of a block, first texel in the least significant bits.
+    value = sum(index << (bits * i) for i, index in enumerate(indices))
+    return value.to_bytes(2 * bits, "little")
+
+
+def _color_block(c0, c1, indices):
+    return c0.to_bytes(2, "little") + c1.to_bytes(2, "little") + _pack_indices(indices, 2)
+
+
+def _channel_block(a0, a1, indices):
+    return bytes([a0 & 0xFF, a1 & 0xFF]) + _pack_indices(indices, 3)
+
+
+def test_bc1_four_colors():
+    image = bcn.decode_bc1(_color_block(RED, BLUE, [0, 1, 2, 3] * 4), 4, 4)
+    assert image.shape == (4, 4, 4) and image.dtype == numpy.uint8
+    expected = [[255, 0, 0, 255], [0, 0, 255, 255], [170, 0, 85, 255], [85, 0, 170, 255]]
+    assert (image == numpy.array(expected)[None]).all()
+
+
+def test_bc1_punch_through_alpha():
+    # Endpoint 0 <= endpoint 1 selects 3 colors and transparent black.
+    image = bcn.decode_bc1(_color_block(BLUE, RED, [0, 1, 2, 3] * 4), 4, 4)
+    expected = [[0, 0, 255, 255], [255, 0, 0, 255], [127, 0, 127, 255], [0, 0, 0, 0]]
+    assert (image == numpy.array(expected)[None]).all()
+
+
+def test_bc1_green_expansion():
+    # The 6-bit green channel is expanded by replicating its upper bits.
+    image = bcn.decode_bc1(_color_block(0x07E0, 0x0400, [0, 1, 2, 3] * 4), 4, 4)
+    assert image[0, :, 1].tolist() == [255, 130, 213, 171]
+
+
+def test_bc2_explicit_alpha():
+    alpha = bytes([(2 * i + 1) << 4 | 2 * i for i in range(8)])
+    image = bcn.decode_bc2(alpha + _color_block(BLUE, RED, [0] * 16), 4, 4)
+    # The color block always uses 4 colors in BC2, so the color is never transparent.
+    assert image[..., 3].ravel().tolist() == [i * 0x11 for i in range(16)]
+    assert (image[..., :3] == [0, 0, 255]).all()
+
+
+def test_bc3_interpolated_alpha():
+    block = _channel_block(255, 0, [i % 8 for i in range(16)]) + _color_block(RED, BLUE, [1] * 16)
+    image = bcn.decode_bc3(block, 4, 4)
+    assert image[..., 3].ravel().tolist() == [255, 0, 218, 182, 145, 109, 72, 36] * 2
+    assert (image[..., :3] == [0, 0, 255]).all()
+
+
+def test_bc4_six_values():
+    # Endpoint 0 <= endpoint 1 interpolates 4 values and adds the minimum and maximum.
+    image = bcn.decode_bc4(_channel_block(0, 250, [i % 8 for i in range(16)]), 4, 4)
+    assert image[..., 0].ravel().tolist() == [0, 250, 50, 100, 150, 200, 0, 255] * 2
+    assert (image[..., 1:3] == 0).all() and (image[..., 3] == 255).all()
+
+
+def test_bc4_signed():
+    # Signed values -127..127 are mapped to 0..255, and -128 is clamped to -127.
+    image = bcn.decode_bc4(_channel_block(127, -127, [i % 8 for i in range(16)]), 4, 4, signed=True)
+    assert image[..., 0].ravel().tolist() == [255, 0, 218, 182, 146, 108, 72, 36] * 2
+    image = bcn.decode_bc4(_channel_block(-128, 127, [0, 1, 6, 7] * 4), 4, 4, signed=True)
+    assert image[0, :, 0].tolist() == [0, 255, 0, 255]
+
+
+def test_bc5_unsigned_and_signed():
+    block = _channel_block(200, 100, [0] * 16) + _channel_block(10, 20, [1] * 16)
+    image = bcn.decode_bc5(block, 4, 4)
+    assert (image[..., :2] == [200, 20]).all() and (image[..., 2] == 0).all() and (image[..., 3] == 255).all()
+    block = _channel_block(127, -127, [0] * 16) + _channel_block(-127, 127, [0, 1, 6, 7] * 4)
+    image = bcn.decode_bc5(block, 4, 4, signed=True)
+    assert (image[..., 0] == 255).all()
+    assert image[0, :, 1].tolist() == [0, 255, 0, 255]
+
+
+def test_block_layout_and_cropping():
+    # Blocks are stored in rows, and the padding of images with sizes not divisible by 4 is cropped.
+    data = b"".join(_color_block(color, color, [0] * 16) for color in (RED, BLUE, 0x07E0, 0xFFFF))
+    image = bcn.decode_bc1(data, 8, 8)
+    assert image[0, 0].tolist() == [255, 0, 0, 255] and image[0, 4].tolist() == [0, 0, 255, 255]
+    assert image[4, 0].tolist() == [0, 255, 0, 255] and image[7, 7].tolist() == [255, 255, 255, 255]
+    assert (bcn.decode_bc1(data, 5, 6) == image[:6, :5]).all()
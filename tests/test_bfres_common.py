@@ -0,0 +1,198 @@
+import numpy
+import random
+import struct
+import time
+from io_scene_bfres import bfres_common
+from io_scene_bfres import binary_io
+from io_scene_bfres import bfres_writer
+from io_scene_bfres.bfres_common import AnimCurve
+from anim_buffers import curve, pack_bits, read, write_curves
+from fmdl_models import build_fmdl
+
+# No Index Groups of original files are available here, so the trees are parsed from written files and compared with a
+# textbook Patricia tree insertion working on the string bits, and with a tree derived by hand.
+
+
+def _bit(name, position):
+    # Return the bit of the name at the position, counting from the least significant bit of the last character.
+    index = position >> 3
+    return ord(name[-1 - index]) >> (position & 7) & 1 if index < len(name) else 0
+
+
+def _reference_index_group(names):
+    class Node:
+        def __init__(self, index, ref, name):
+            self.index, self.ref, self.name = index, ref, name
+            self.left = self.right = self
+
+    root = Node(0, -1, "")
+    nodes = [root]
+    for index, name in enumerate(names, 1):
+        parent, node = root, root.left
+        while parent.ref < node.ref:
+            parent, node = node, node.right if _bit(name, node.ref) else node.left
+        ref = 0
+        while _bit(name, ref) == _bit(node.name, ref):
+            ref += 1
+        parent, node = root, root.left
+        while parent.ref < node.ref < ref:
+            parent, node = node, node.right if _bit(name, node.ref) else node.left
+        new = Node(index, ref, name)
+        new.left, new.right = (node, new) if _bit(name, ref) else (new, node)
+        if parent is not root and _bit(name, parent.ref):
+            parent.right = new
+        else:
+            parent.left = new
+        nodes.append(new)
+    return [(node.ref & 0xFFFFFFFF, node.left.index, node.right.index) for node in nodes]
+
+
+def _lookup(nodes, names, name):
+    # Return the index of the node with the name as the game looks it up, or -1 if there is none.
+    def ref(index):
+        return -1 if index == 0 else nodes[index][0]
+    parent, node = 0, nodes[0][1]
+    while ref(parent) < ref(node):
+        parent, node = node, nodes[node][2 if _bit(name, ref(node)) else 1]
+    return node if node and names[node - 1] == name else -1
+
+
+def _read_index_groups(data):
+    # Return the names and (search value, left index, right index) nodes of all Index Groups in the file.
+    groups = []
+    position = data.find(b"_DIC")
+    while position >= 0:
+        count = struct.unpack_from("<I", data, position + 4)[0]
+        names, nodes = [], []
+        for i in range(count + 1):
+            search_value, left, right, name_pointer = struct.unpack_from("<IHHQ", data, position + 8 + 16 * i)
+            nodes.append((search_value, left, right))
+            if i:
+                names.append(data[name_pointer + 2:data.index(b"\0", name_pointer + 2)].decode("ascii"))
+        groups.append((names, nodes))
+        position = data.find(b"_DIC", position + 8)
+    return groups
+
+
+def test_known_tree():
+    # "a" tests bit 0 first, "b" and "c" then differ from the names found at bit 1. "x" (0x78) has bit 3 set, so its
+    # node links to itself on the right.
+    assert bfres_common.build_index_group(["a", "b", "c"]) == [(0xFFFFFFFF, 1, 0), (0, 2, 3), (1, 0, 2), (1, 1, 3)]
+    assert bfres_common.build_index_group(["x"]) == [(0xFFFFFFFF, 1, 0), (3, 0, 1)]
+
+
+def test_random_names_match_reference():
+    generator = random.Random(1)
+    for _ in range(200):
+        names = list({"".join(generator.choice("abcAB_0129") for _ in range(generator.randint(1, 12)))
+                      for _ in range(generator.randint(1, 60))})
+        generator.shuffle(names)
+        nodes = bfres_common.build_index_group(names)
+        assert nodes == _reference_index_group(names)
+        assert all(_lookup(nodes, names, name) == index for index, name in enumerate(names, 1))
+        assert _lookup(nodes, names, "zzzz") == -1
+
+
+def test_written_index_groups():
+    materials = ["Mt_Body", "Mt_Body_Alb", "Mt_Eye", "Mt_EyeL", "Mt_EyeR", "Mt_Hair_00", "Mt_Hair_01", "mt_body",
+                 "Mat", "M", "_", "Mt_Body__", "Zz", "Mt_Face"]
+    fmdl_array = [build_fmdl("ModelA", 300, 20, material_names=materials)[0], build_fmdl("ModelB", 5, 10)[0]]
+    data = bytes(bfres_writer.BfresWriter("test", fmdl_array).write())
+    groups = _read_index_groups(data)
+    assert ["ModelA", "ModelB"] in [names for names, _ in groups]
+    assert materials in [names for names, _ in groups]
+    assert ["ModelA_bone{}".format(i) for i in range(300)] in [names for names, _ in groups]
+    for names, nodes in groups:
+        assert nodes == _reference_index_group(names)
+        assert all(_lookup(nodes, names, name) == index for index, name in enumerate(names, 1))
+
+
+def test_large_index_group():
+    names = ["gsys_param_{:05}".format(i) for i in range(10000)]
+    start_time = time.perf_counter()
+    nodes = bfres_common.build_index_group(names)
+    # The build descends the tree twice per name, which takes far less time than a quadratic build would.
+    assert time.perf_counter() - start_time < 5
+    assert all(_lookup(nodes, names, name) == index for index, name in enumerate(names, 1))
+    assert _lookup(nodes, names, "gsys_param_10000") == -1
+
+
+def test_duplicate_names():
+    for names in (["a", "b", "a"], [""]):
+        try:
+            bfres_common.build_index_group(names)
+        except AssertionError:
+            pass
+        else:
+            raise AssertionError("Accepted invalid names {}.".format(names))
+
+
+# ---- Animation curves ----
+
+def _read_curve(*args, **kwargs):
+    w = binary_io.BufferWriter()
+    write_curves(w, "curves", [curve(*args, **kwargs)])
+    return read(w, "curves", AnimCurve)
+
+
+def test_curve_frame_types():
+    # Frames are stored as floats, fixed point numbers with 5 fractional bits or bytes.
+    keys = [[0]] * 3
+    for frame_type, frames in ((AnimCurve.FrameType.SINGLE, [0, 2.3, 10]),
+                               (AnimCurve.FrameType.DECIMAL10X5, [0, 2.25, 1000.5]),
+                               (AnimCurve.FrameType.BYTE, [0, 2, 255])):
+        parsed = _read_curve(frames, keys, AnimCurve.CurveType.BAKED_FLOAT, frame_type)
+        assert parsed.frame_type == frame_type and parsed.frames.dtype == numpy.float32
+        assert numpy.allclose(parsed.frames, frames)
+
+
+def test_curve_key_types():
+    # Keys are scaled, and the offset is added to their first coefficient.
+    keys = [[10, 4], [-20, -6]]
+    for key_type in (AnimCurve.KeyType.INT16, AnimCurve.KeyType.SBYTE):
+        parsed = _read_curve([0, 10], keys, AnimCurve.CurveType.LINEAR, key_type=key_type, scale=0.5, offset=3)
+        assert parsed.key_type == key_type and parsed.keys.tolist() == [[8, 2], [-7, -3]]
+    # Float keys may have no scale.
+    parsed = _read_curve([0, 10], keys, AnimCurve.CurveType.LINEAR, scale=0, offset=1)
+    assert parsed.keys.tolist() == [[11, 4], [-19, -6]]
+
+
+def test_curve_linear():
+    parsed = _read_curve([0, 10], [[1, 2], [3, -1]], AnimCurve.CurveType.LINEAR, end_frame=20)
+    frames = numpy.array([-5, 0, 5, 10, 15, 20, 25], numpy.float32)
+    # Frames outside of the curve get the values at its ends.
+    assert parsed.evaluate(frames).tolist() == [1, 1, 2, 3, 2.5, 2, 2]
+
+
+def test_curve_cubic():
+    parsed = _read_curve([0, 4], [[1, 2, 3, 4], [10, 0, 0, -8]], AnimCurve.CurveType.CUBIC, end_frame=8)
+    values = parsed.evaluate(numpy.array([0, 2, 3, 4, 6, 8], numpy.float32))
+    assert numpy.allclose(values, [1, 1 + 1 + 0.75 + 0.5, 1 + 1.5 + 1.6875 + 1.6875, 10, 9, 2])
+
+
+def test_curve_baked_and_step():
+    # Curves with a single value per key hold it until the next key.
+    for curve_type, key_type in ((AnimCurve.CurveType.BAKED_FLOAT, AnimCurve.KeyType.SINGLE),
+                                 (AnimCurve.CurveType.STEP_INT, AnimCurve.KeyType.INT16),
+                                 (AnimCurve.CurveType.BAKED_INT, AnimCurve.KeyType.SBYTE)):
+        parsed = _read_curve([0, 1, 3], [[5], [7], [-2]], curve_type, key_type=key_type)
+        assert parsed.evaluate(numpy.array([0, 0.5, 1, 2.9, 3, 4], numpy.float32)).tolist() == [5, 5, 7, 7, -2, -2]
+
+
+def test_curve_bool():
+    # Bool keys are stored as bits, least significant bit first, spanning several 32-bit integers here.
+    bits = [i % 3 == 0 for i in range(40)]
+    for curve_type in (AnimCurve.CurveType.STEP_BOOL, AnimCurve.CurveType.BAKED_BOOL):
+        parsed = _read_curve(list(range(40)), bits, curve_type)
+        assert parsed.keys.shape == (40, 1) and parsed.keys[:, 0].tolist() == bits
+        assert parsed.evaluate(numpy.array([0, 1, 2.5, 33, 39, 50], numpy.float32)).tolist() == [1, 0, 0, 1, 1, 1]
+
+
+def test_read_bits():
+    bits = [i % 5 in (0, 3) for i in range(37)]
+    for endianness in ("<", ">"):
+        with binary_io.BinaryReader(pack_bits(bits, endianness) + b"\xFF") as reader:
+            reader.endianness = endianness
+            assert bfres_common.read_bits(reader, 37).tolist() == bits
+            # The bits are padded to whole 32-bit integers.
+            assert reader.tell() == 8
@@ -0,0 +1,49 @@
+import numpy
+from io_scene_bfres import binary_io
+from io_scene_bfres.bfres_common import AnimCurve
+from io_scene_bfres.bfres_fmaa import MaterialAnim
+from anim_buffers import curve, read, write_curves, write_name, write_strings
+
+
+def _write_material_anim(w, pattern_anims, curves, constants):
+    # Write a material animation with texture pattern animations given by (sampler name, curve index, constant index).
+    w.label("material_anim")
+    write_name(w, "Mt_Body")
+    w.write_pointer(None)
+    w.write_pointer("pattern_anims")
+    w.write_pointer("curves" if curves else None)
+    w.write_pointer("constants")
+    for value in (0xFFFF, 1, 0xFFFF, 0xFFFF, 0, len(pattern_anims), len(constants), len(curves)):
+        w.write_uint16(value)
+    w.write_uint64(0)
+    w.align(8)
+    w.label("pattern_anims")
+    for name, curve_index, constant_index in pattern_anims:
+        write_name(w, name)
+        w.write_bytes(numpy.array([curve_index, constant_index], "<i2"))
+        w.write_bytes(bytes(4))
+    w.align(8)
+    w.label("constants")
+    for anim_data_offset, value in constants:
+        w.write_uint32(anim_data_offset)
+        w.write_int32(value)
+    # The texture pattern curves start at index 1 of the material's curves.
+    write_curves(w, "curves", curves)
+    write_strings(w, ["Mt_Body"] + [name for name, _, _ in pattern_anims])
+
+
+def test_texture_pattern():
+    w = binary_io.BufferWriter()
+    curves = [curve([0], [[0]], AnimCurve.CurveType.BAKED_FLOAT),
+              curve([0, 2, 5], [[3], [1], [2]], AnimCurve.CurveType.STEP_INT, key_type=AnimCurve.KeyType.INT16)]
+    _write_material_anim(w, [("_a0", 0, -1), ("_n0", -1, 1), ("_s0", -1, 5)], curves, [(0, 4), (8, 6)])
+    material_anim = read(w, "material_anim", MaterialAnim)
+    assert material_anim.name == "Mt_Body"
+    assert [anim.name for anim in material_anim.texture_pattern_anims] == ["_a0", "_n0", "_s0"]
+    assert material_anim.constants["anim_data_offset"].tolist() == [0, 8]
+    frames = numpy.array([0, 1, 2, 4, 5, 9], numpy.float32)
+    animated, constant, missing = (material_anim.evaluate_texture_pattern(anim, frames)
+                                   for anim in material_anim.texture_pattern_anims)
+    assert animated.dtype == numpy.int32 and animated.tolist() == [3, 3, 1, 1, 2, 2]
+    # Animations without a curve use their constant, or the first texture if it is missing.
+    assert constant.tolist() == [6] * 6 and missing.tolist() == [0] * 6
@@ -0,0 +1,84 @@
+import numpy
+import pytest
+from io_scene_bfres.bfres_fmdl import FvtxSubsection
+
+Attribute = FvtxSubsection.Attribute
+
+# The range of encodable values and the largest error after decoding for each format.
+FORMATS = {
+    0x109: (0, 1, 0.5 / 0xFF),  # 2x unorm8
+    0x112: (0, 1, 0.5 / 0xFFFF),  # 2x unorm16
+    0x10B: (0, 0xFF, 0.5),  # 4x uint8
+    0x302: (0, 0xFF, 0.5),  # uint8
+    0x309: (0, 0xFF, 0.5),  # 2x uint8
+    0x30B: (0, 0xFF, 0.5),  # 4x uint8
+    0x212: (0, 0xFFFF / 0x7FFF, 0.5 / 0x7FFF),  # 2x uint16 / 0x7FFF
+    0x20B: (-0x80, 0x7F, 0.5),  # 4x int8
+    0x20E: (-1, 1, 0.5 / 511),  # 3x snorm10, packed
+    0x512: (-1000, 1000, 2 ** -11),  # 2x float16, relative error
+    0x517: (-1000, 1000, 0),  # 2x float32
+    0x515: (-1000, 1000, 2 ** -11),  # 4x float16, relative error
+    0x518: (-1000, 1000, 0),  # 3x float32
+}
+FLOAT16_FORMATS = (0x512, 0x515)
+
+
+def _decode(format, encoded):
+    # Decode the encoded array with get_array() as if it was the only attribute of a vertex buffer.
+    attribute = Attribute.__new__(Attribute)
+    attribute.format = format
+    attribute.element_offset = 0
+    data = numpy.ascontiguousarray(encoded).view(numpy.uint8).ravel()
+    return attribute.get_array(FvtxSubsection.buffData(len(data), data.size // len(encoded), 0, data), len(encoded))
+
+
+def _component_count(format):
+    return 3 if format == 0x20E else Attribute._array_formats[format][1]
+
+
+def test_all_formats_covered():
+    assert set(FORMATS) == set(Attribute._array_formats)
+
+
+@pytest.mark.parametrize("format", sorted(FORMATS))
+def test_encode_decode(format):
+    low, high, max_error = FORMATS[format]
+    values = numpy.random.RandomState(format).uniform(low, high, (1000, _component_count(format))).astype(numpy.float32)
+    values[:2] = [[low], [high]]  # Include the range limits.
+    encoded, decoded = Attribute.encode_array(format, values)
+    # The decoded values returned by the encoder are the ones get_array() reads from the encoded data.
+    assert numpy.array_equal(_decode(format, encoded), decoded)
+    error = numpy.abs(decoded - values)
+    if format in FLOAT16_FORMATS:
+        error /= numpy.maximum(numpy.abs(values), 2 ** -14)
+    assert error.max() <= max_error * (1 + 1e-6)
+
+
+@pytest.mark.parametrize("format", sorted(FORMATS))
+def test_encode_exact_values(format):
+    # Values which are representable in the format are encoded without any error.
+    low, high, _ = FORMATS[format]
+    divisor = 511 if format == 0x20E else Attribute._array_formats[format][2] or 1
+    steps = numpy.arange(int(numpy.ceil(low * divisor)), int(numpy.floor(high * divisor)) + 1)[:4096]
+    values = (steps / float(divisor)).reshape(-1, 1).repeat(_component_count(format), 1)
+    _, decoded = Attribute.encode_array(format, values)
+    assert numpy.array_equal(decoded, values.astype(numpy.float32))
+
+
+def test_clamp_out_of_range():
+    _, decoded = Attribute.encode_array(0x109, [[-0.5, 1.5]])
+    assert decoded.tolist() == [[0, 1]]
+    _, decoded = Attribute.encode_array(0x20E, [[-2, 2, 0]])
+    assert decoded.tolist() == [[-1, 1, 0]]
+
+
+def test_missing_components_are_zero():
+    encoded, decoded = Attribute.encode_array(0x515, [[1, 2], [3, 4]])
+    assert encoded.shape == (2, 4) and decoded.tolist() == [[1, 2, 0, 0], [3, 4, 0, 0]]
+
+
+def test_invalid_arguments():
+    with pytest.raises(AssertionError, match="_p0.*0x123"):
+        Attribute.encode_array(0x123, [[0]], "_p0")
+    with pytest.raises(AssertionError, match="_u0.*0x109"):
+        Attribute.encode_array(0x109, [[0, 0, 0]], "_u0")
@@ -0,0 +1,50 @@
+import numpy
+from io_scene_bfres import binary_io
+from io_scene_bfres.bfres_common import AnimCurve
+from io_scene_bfres.bfres_fska import BoneAnim
+from anim_buffers import curve, read, write_curves, write_name, write_strings
+
+
+def _write_bone_anim(w, name, flags, base_values, curves):
+    w.label(name)
+    write_name(w, name)
+    w.write_pointer((name, "curves") if curves else None)
+    w.write_pointer((name, "base"))
+    w.write_uint64(0)
+    w.write_uint64(0)
+    w.write_uint32(flags)
+    w.write_bytes(bytes([0, 0, len(curves), 0]))
+    w.write_int32(0)
+    w.write_uint32(0)
+    w.label((name, "base"))
+    w.write_singles(base_values)
+    write_curves(w, (name, "curves"), curves)
+    write_strings(w, [name])
+
+
+def test_bone_anim_base_values():
+    # The stored base values are read in the order scale, translation, rotation.
+    w = binary_io.BufferWriter()
+    flags = BoneAnim.FLAGS_BASE_SCALE | BoneAnim.FLAGS_BASE_ROTATE | BoneAnim.FLAGS_BASE_TRANSLATE
+    _write_bone_anim(w, "Arm", flags, [2, 3, 4, 5, 6, 7, 0, 0, 0.6, 0.8], [])
+    bone_anim = read(w, "Arm", BoneAnim)
+    assert bone_anim.name == "Arm" and bone_anim.curves == []
+    scale, rotation, translation = bone_anim.evaluate(numpy.arange(3, dtype=numpy.float32))
+    assert scale.shape == (3, 3) and rotation.shape == (3, 4) and translation.shape == (3, 3)
+    assert (scale == [2, 3, 4]).all() and (translation == [5, 6, 7]).all()
+    assert numpy.allclose(rotation, [0, 0, 0.6, 0.8])
+
+
+def test_bone_anim_identity_and_curves():
+    # Missing base values default to the identity, and curves replace the component at their offset.
+    w = binary_io.BufferWriter()
+    curves = [curve([0, 10], [[1, 5], [6, 0]], AnimCurve.CurveType.LINEAR, anim_data_offset=0x14),
+              curve([0], [[0.25]], AnimCurve.CurveType.BAKED_FLOAT, anim_data_offset=0x28),
+              curve([0], [[99]], AnimCurve.CurveType.BAKED_FLOAT, anim_data_offset=0x40)]
+    _write_bone_anim(w, "Leg", BoneAnim.FLAGS_BASE_SCALE, [1, 1, 1], curves)
+    bone_anim = read(w, "Leg", BoneAnim)
+    assert len(bone_anim.curves) == 3
+    scale, rotation, translation = bone_anim.evaluate(numpy.array([0, 4, 10], numpy.float32))
+    assert scale.dtype == translation.dtype == rotation.dtype == numpy.float32 and (scale == 1).all()
+    assert translation.tolist() == [[0, 1, 0], [0, 3, 0], [0, 6, 0]]
+    assert rotation.tolist() == [[0, 0, 0.25, 1]] * 3
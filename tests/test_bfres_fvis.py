@@ -0,0 +1,54 @@
+import numpy
+from io_scene_bfres import binary_io
+from io_scene_bfres.bfres_common import AnimCurve
+from io_scene_bfres.bfres_fvis import FvisSection
+from anim_buffers import curve, pack_bits, read, write_curves, write_name, write_strings
+
+NAMES = ["Root", "Hat", "Sword"]
+
+
+def _write_fvis(w, flags, base_values, curves):
+    w.label("fvis")
+    w.write_raw_string("FVIS")
+    w.write_uint32(0)
+    w.write_uint32(0)
+    w.write_uint32(0)
+    write_name(w, "Anim")
+    for key in (None, None, None, "names", "curves", "base_values", None, None):
+        w.write_pointer(key)
+    w.write_uint16(flags)
+    w.write_uint16(0)
+    w.write_int32(20)  # Frame count
+    w.write_uint16(len(NAMES))
+    w.write_uint16(len(curves))
+    w.write_uint32(0)
+    w.align(8)
+    w.label("names")
+    for name in NAMES:
+        write_name(w, name)
+    w.label("base_values")
+    w.write_bytes(pack_bits(base_values))
+    write_curves(w, "curves", curves)
+    write_strings(w, ["Anim"] + NAMES)
+
+
+def test_fvis_visibility():
+    # The base visibility bits are expanded to all frames, and bool curves replace them for the name at their index.
+    w = binary_io.BufferWriter()
+    curves = [curve([0, 5, 10], [False, True, False], AnimCurve.CurveType.STEP_BOOL, anim_data_offset=1),
+              curve([0], [True], AnimCurve.CurveType.BAKED_BOOL, anim_data_offset=7)]
+    _write_fvis(w, 0, [True, False, True], curves)
+    fvis = read(w, "fvis", FvisSection)
+    assert fvis.name == "Anim" and fvis.frame_count == 20 and fvis.is_bone_visibility
+    assert fvis.names == NAMES and fvis.base_values.tolist() == [True, False, True]
+    visible = fvis.evaluate(numpy.array([0, 4, 5, 9, 10, 19], numpy.float32))
+    assert visible.dtype == bool and visible.shape == (3, 6)
+    assert visible.tolist() == [[True] * 6, [False, False, True, True, False, False], [True] * 6]
+
+
+def test_fvis_material_visibility():
+    w = binary_io.BufferWriter()
+    _write_fvis(w, FvisSection.FLAGS_MATERIAL, [False, False, True], [])
+    fvis = read(w, "fvis", FvisSection)
+    assert not fvis.is_bone_visibility and fvis.curves == []
+    assert fvis.evaluate(numpy.arange(2, dtype=numpy.float32)).tolist() == [[False] * 2, [False] * 2, [True] * 2]
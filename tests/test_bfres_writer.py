@@ -0,0 +1,58 @@
+import numpy
+import struct
+from io_scene_bfres import bfres_file
+from io_scene_bfres import bfres_writer
+from fmdl_models import build_fmdl
+
+
+def _write_models():
+    models = [build_fmdl("ModelA", 40, 97, seed=1), build_fmdl("ModelB", 3, 10, seed=2)]
+    writer = bfres_writer.BfresWriter("test", [fmdl for fmdl, _, _ in models])
+    return bytes(writer.write()), writer, models
+
+
+def test_round_trip():
+    data, _, models = _write_models()
+    bfres = bfres_file.BfresFile(data)
+    assert bfres.header.file_name_offet.name == "test"
+    assert len(bfres.header.fmdl_array) == len(models)
+    for fmdl, (source, arrays, indices) in zip(bfres.header.fmdl_array, models):
+        assert fmdl.header.file_name_offset.name == source.header.file_name_offset.name
+        assert fmdl.fskl.bone_names == source.fskl.bone_names
+        for field in ("index", "parent", "flags", "scale", "rotation", "translation"):
+            assert numpy.array_equal(fmdl.fskl.bones[field], source.fskl.bones[field])
+        assert numpy.array_equal(fmdl.fskl.inv_matrices, source.fskl.inv_matrices)
+        # Attributes are decoded within the quantization of their formats.
+        decoded = fmdl.fvtx_array[0].get_attribute_arrays()
+        assert numpy.array_equal(decoded["p0"], arrays["p0"])
+        assert numpy.abs(decoded["n0"] - arrays["n0"]).max() <= 0.5 / 511 + 1e-6
+        assert numpy.abs(decoded["u0"] - arrays["u0"]).max() <= 0.5 / 0xFFFF + 1e-6
+        fshp = fmdl.header.fshp_array[0]
+        assert fshp.header.name_offset.name == source.header.fshp_array[0].header.name_offset.name
+        assert fshp.lod_models[0].indices == tuple(indices.tolist())
+        assert fshp.lod_models[1].indices == tuple(indices[:30].tolist())
+        fmat = fmdl.fmat_array[0]
+        assert fmat.header.name_offset.name == source.fmat_array[0].header.name_offset.name
+        assert [texture.name_offset.name for texture in fmat.texture_selector_array] == ["tex_a", "tex_b"]
+        assert [sampler.name_offset.name for sampler in fmat.sampler_names] == ["_s0", "_s1"]
+
+
+def test_rewrite_is_byte_identical():
+    data, _, _ = _write_models()
+    bfres = bfres_file.BfresFile(data)
+    assert bytes(bfres_writer.BfresWriter("test", bfres.header.fmdl_array).write()) == data
+
+
+def test_relocation_table_covers_all_pointers():
+    data, writer, _ = _write_models()
+    pointers = sorted(position for position, _, format in writer.writer.fixups if format == "Q")
+    table_offset = struct.unpack_from("<I", data, 0x18)[0]
+    entry_count = struct.unpack_from("<I", data, table_offset + 0x24)[0]
+    relocated = []
+    for i in range(entry_count):
+        position, struct_count, offset_count, padding_count = struct.unpack_from("<IHBB", data,
+                                                                                 table_offset + 0x40 + 8 * i)
+        for j in range(struct_count):
+            start = position + 8 * (offset_count + padding_count) * j
+            relocated.extend(range(start, start + 8 * offset_count, 8))
+    assert relocated == pointers
@@ -0,0 +1,59 @@
+import io
+import mmap
+import numpy
+from io_scene_bfres import bfres_file
+from io_scene_bfres import bfres_writer
+from io_scene_bfres import binary_io
+from fmdl_models import build_fmdl
+
+
+def _shares_memory(view, buffer):
+    return numpy.shares_memory(numpy.frombuffer(view, numpy.uint8), numpy.frombuffer(buffer, numpy.uint8))
+
+
+def test_read_view_of_buffer():
+    data = bytearray(range(64))
+    with binary_io.BinaryReader(data) as reader:
+        assert reader.read_uint32() == 0x03020100
+        view = reader.read_view(8)
+        # The view refers to the source buffer, and the position continues after it.
+        assert bytes(view) == bytes(range(4, 12)) and reader.tell() == 12 and reader.read_byte() == 12
+        assert _shares_memory(view, data)
+        data[4] = 0xFF
+        assert view[0] == 0xFF
+
+
+def test_read_view_of_mmap(tmp_path):
+    path = tmp_path / "data.bin"
+    path.write_bytes(bytes(range(256)) * 16)
+    with open(str(path), "rb") as file:
+        data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    with binary_io.BinaryReader(data) as reader:
+        reader.seek(0x800)
+        view = reader.read_view(0x100)
+    assert view.obj is data and bytes(view) == bytes(range(256))
+
+
+def test_read_view_of_stream():
+    # Readers on streams copy the read bytes.
+    stream = io.BytesIO(bytes(range(64)))
+    with binary_io.BinaryReader(stream) as reader:
+        reader.seek(60)
+        view = reader.read_view(8)
+        assert isinstance(view, memoryview) and bytes(view) == bytes(range(60, 64))
+
+
+def test_buffer_stream():
+    stream = binary_io.BufferStream(memoryview(bytes(range(16))))
+    assert stream.seek(4) == 4 and stream.read(4) == bytes(range(4, 8))
+    assert stream.seek(-2, io.SEEK_END) == 14 and stream.read(4) == bytes([14, 15]) and stream.read(4) == b""
+    assert stream.seek(-8, io.SEEK_CUR) == 8 and stream.tell() == 8
+
+
+def test_parsed_buffers_are_views():
+    # The vertex and index buffers of a parsed file refer to the file data instead of copies.
+    data = bytearray(bfres_writer.BfresWriter("test", [build_fmdl("Model", 3, 20)[0]]).write())
+    fmdl = bfres_file.BfresFile(data).header.fmdl_array[0]
+    for buffer in fmdl.fvtx_array[0].buffers:
+        assert _shares_memory(buffer.data, data)
+    assert _shares_memory(fmdl.header.fshp_array[0].lod_models[0].index_buffer, data)
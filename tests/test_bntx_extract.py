@@ -0,0 +1,98 @@
+import numpy
+import struct
+from io_scene_bfres import bntx_extract
+from io_scene_bfres import swizzle
+
+# A little-endian BNTX file with 4x4 R8G8B8A8 textures, laid out as the header, NX header, dictionary, info pointers,
+# BRTI infos with their mipmap pointers, names and the swizzled image data.
+
+NAMES = ["Alb", "Nrm", "Spm"]
+WIDTH = HEIGHT = 4
+IDENTITY = 0x05040302  # Component selectors of alpha, blue, green and red, from the highest to the lowest byte.
+RED_TO_GRAY = 0x05020202
+
+
+def _pixels(index):
+    return numpy.arange(WIDTH * HEIGHT * 4, dtype=numpy.uint8).reshape(HEIGHT, WIDTH, 4) + 64 * index
+
+
+def _build_bntx():
+    images = [swizzle.swizzle(WIDTH, HEIGHT, 1, 1, 4, 1, 512, 0, _pixels(i).tobytes()) for i in range(len(NAMES))]
+    dict_addr = 0x60
+    info_ptr_addr = dict_addr + 8 + 16 * (len(NAMES) + 1)
+    info_addr = info_ptr_addr + 8 * len(NAMES)
+    info_size = 0xA0  # The BRTI info followed by its mipmap pointer.
+    name_addr = info_addr + info_size * len(NAMES)
+    names = b"".join(struct.pack("<H", len(name)) + name.encode() + b"\0\0" for name in NAMES)
+    file_name_addr = name_addr + len(names)
+    data_addr = (file_name_addr + 16 + 0xFFF) & ~0xFFF
+    data = bytearray(data_addr + sum(len(image) for image in images))
+    struct.pack_into("<8si2Hi2xh2i", data, 0, b"BNTX", 0x40000, 0xFEFF, 0x0C, file_name_addr, 0, 0, len(data))
+    struct.pack_into("<4sI3qI", data, 0x20, b"NX  ", len(NAMES), info_ptr_addr, data_addr, dict_addr, 0)
+    struct.pack_into("<4si", data, dict_addr, b"_DIC", len(NAMES))
+    data[name_addr:name_addr + len(names)] = names
+    data[file_name_addr:file_name_addr + 5] = b"test\0"
+    name_pos = name_addr
+    image_addr = data_addr
+    for i, (name, image) in enumerate(zip(NAMES, images)):
+        # The search values and links of the dictionary nodes are not used for reading.
+        struct.pack_into("<i2Hq", data, dict_addr + 8 + 16 * (i + 1), 0, 0, 0, name_pos)
+        pos = info_addr + info_size * i
+        comp_sel = RED_TO_GRAY if name == "Nrm" else IDENTITY
+        struct.pack_into("<q", data, info_ptr_addr + 8 * i, pos)
+        struct.pack_into("<4siq2b3H3I5i6I4i3q", data, pos, b"BRTI", info_size, info_size, 1, 1, 0, 0, 1, 0, 0x0b01,
+                         1, WIDTH, HEIGHT, 1, 1, 0, 0, 0, 0, 0, 0, 0, len(image), 512, comp_sel, 1, name_pos, 0,
+                         pos + 120)
+        struct.pack_into("<q", data, pos + 120, image_addr)
+        data[image_addr:image_addr + len(image)] = image
+        name_pos += 2 + len(name) + 2
+        image_addr += len(image)
+    return data
+
+
+def test_index_parses_textures_on_demand(monkeypatch):
+    parsed = []
+    read_tex_info = bntx_extract.readTexInfo
+
+    def counting_read_tex_info(f, structs, pos):
+        parsed.append(pos)
+        return read_tex_info(f, structs, pos)
+
+    monkeypatch.setattr(bntx_extract, "readTexInfo", counting_read_tex_info)
+    index = bntx_extract.readBNTX(memoryview(_build_bntx()))
+    # Reading the file only indexes the names.
+    assert list(index) == NAMES and len(index) == 3 and "Nrm" in index and "Other" not in index
+    assert parsed == [] and index.textures == {}
+    tex = index.get("Nrm")
+    assert len(parsed) == 1 and list(index.textures) == ["Nrm"]
+    assert tex.name == "Nrm" and (tex.width, tex.height, tex.format, tex.numMips) == (WIDTH, HEIGHT, 0x0b01, 1)
+    assert tex.channelSels == [2, 2, 2, 5] and tex.compSel == [5, 2, 2, 2]
+    # Requesting a texture again returns the parsed info, and unknown names return None.
+    assert index.get("Nrm") is tex and index.get("Other") is None and len(parsed) == 1
+
+
+def test_texture_data_is_not_copied():
+    data = _build_bntx()
+    tex = bntx_extract.readBNTX(memoryview(data)).get("Spm")
+    view = tex.data
+    assert isinstance(view, memoryview) and len(view) == tex.imageSize
+    assert numpy.shares_memory(numpy.frombuffer(view, numpy.uint8), numpy.frombuffer(data, numpy.uint8))
+
+
+def test_decode_texture():
+    index = bntx_extract.readBNTX(memoryview(_build_bntx()))
+    assert (bntx_extract.decodeTexture(index.get("Alb")) == _pixels(0)).all()
+    # The component selectors replicate the red channel of the second texture.
+    pixels = bntx_extract.decodeTexture(index.get("Nrm"))
+    assert (pixels[..., :3] == _pixels(1)[..., :1]).all() and (pixels[..., 3] == _pixels(1)[..., 3]).all()
+
+
+def test_invalid_byte_order():
+    data = _build_bntx()
+    data[0xC:0xE] = b"\0\0"
+    try:
+        bntx_extract.readBNTX(memoryview(data))
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("Accepted an invalid byte order mark.")
@@ -0,0 +1,207 @@
+import numpy
+from io_scene_bfres import bptc
+
+# Blocks are encoded by hand field by field and compared with scalar transcriptions of the endpoint expansion,
+# unquantization and interpolation formulas of the specification.
+
+WEIGHTS = {
+    2: [0, 21, 43, 64],
+    3: [0, 9, 18, 27, 37, 46, 55, 64],
+    4: [0, 4, 9, 13, 17, 21, 26, 30, 34, 38, 43, 47, 51, 55, 60, 64],
+}
+# Subset of each texel and anchor texels of the 2 subset partition 17 and the 3 subset partition 0.
+PARTITION_2_17 = [0, 1, 1, 1, 0, 0, 0, 1, 0, 0, 0, 0, 0, 0, 0, 0]
+ANCHORS_2_17 = (0, 2)
+PARTITION_3_0 = [0, 0, 1, 1, 0, 0, 1, 1, 0, 2, 2, 1, 2, 2, 2, 2]
+ANCHORS_3_0 = (0, 3, 15)
+
+
+def _block(fields):
+    # Build a block from (bit count, value) fields in stream order, starting at the least significant bit.
+    value = 0
+    pos = 0
+    for count, field in fields:
+        value |= (field & ((1 << count) - 1)) << pos
+        pos += count
+    assert pos == 128
+    return value.to_bytes(16, "little")
+
+
+def _index_fields(indices, bits, anchors=(0,)):
+    # Anchor texels store their index with one bit less.
+    return [(bits - 1 if i in anchors else bits, index) for i, index in enumerate(indices)]
+
+
+def _interpolate(e0, e1, bits, index):
+    weight = WEIGHTS[bits][index]
+    return ((64 - weight) * e0 + weight * e1 + 32) >> 6
+
+
+# ---- BC7 ----
+
+def test_bc7_mode6_unique_pbits():
+    # 1 subset with 7-bit RGBA endpoints, a P-bit per endpoint and 4-bit indices.
+    e0, e1 = (10, 20, 30, 40), (100, 110, 120, 127)
+    fields = [(7, 0x40)] + [(7, c) for pair in zip(e0, e1) for c in pair] + [(1, 0), (1, 1)]
+    image = bptc.decode_bc7(_block(fields + _index_fields(range(16), 4)), 4, 4)
+    assert image.shape == (4, 4, 4) and image.dtype == numpy.uint8
+    # The P-bits become the least significant bits of the 8-bit endpoints.
+    e0, e1 = (20, 40, 60, 80), (201, 221, 241, 255)
+    assert image[0, 0].tolist() == list(e0) and image[3, 3].tolist() == list(e1)
+    expected = [[_interpolate(a, b, 4, i) for a, b in zip(e0, e1)] for i in range(16)]
+    assert image.reshape(16, 4).tolist() == expected
+
+
+def test_bc7_mode1_partition():
+    # 2 subsets with 6-bit RGB endpoints, a P-bit shared per subset and 3-bit indices, using partition 17 whose second
+    # subset has its anchor at texel 2.
+    endpoints = [(63, 0, 0), (0, 63, 0), (0, 0, 32), (32, 32, 63)]
+    indices = [i % 8 for i in range(16)]
+    fields = [(2, 0b10), (6, 17)] + [(6, e[c]) for c in range(3) for e in endpoints] + [(1, 1), (1, 0)]
+    image = bptc.decode_bc7(_block(fields + _index_fields(indices, 3, ANCHORS_2_17)), 4, 4)
+    # Endpoints are expanded from 7 bits by replicating the highest bit.
+    endpoints = [(255, 2, 2), (2, 255, 2), (0, 0, 129), (129, 129, 253)]
+    expected = []
+    for texel, subset in enumerate(PARTITION_2_17):
+        e0, e1 = endpoints[2 * subset], endpoints[2 * subset + 1]
+        expected.append([_interpolate(a, b, 3, indices[texel]) for a, b in zip(e0, e1)] + [255])
+    assert image.reshape(16, 4).tolist() == expected
+
+
+def test_bc7_mode2_three_subsets():
+    # 3 subsets with 5-bit RGB endpoints without P-bits and 2-bit indices, using partition 0.
+    endpoints = [(31, 0, 0), (0, 31, 0), (0, 0, 31), (16, 16, 16), (1, 2, 3), (30, 29, 28)]
+    indices = [0, 1, 2, 1, 0, 1, 2, 3, 0, 1, 2, 3, 0, 1, 2, 1]
+    fields = [(3, 0b100), (6, 0)] + [(5, e[c]) for c in range(3) for e in endpoints]
+    image = bptc.decode_bc7(_block(fields + _index_fields(indices, 2, ANCHORS_3_0)), 4, 4)
+    expanded = [tuple((c << 3) | (c >> 2) for c in e) for e in endpoints]
+    assert expanded[3] == (132, 132, 132)
+    expected = []
+    for texel, subset in enumerate(PARTITION_3_0):
+        e0, e1 = expanded[2 * subset], expanded[2 * subset + 1]
+        expected.append([_interpolate(a, b, 2, indices[texel]) for a, b in zip(e0, e1)] + [255])
+    assert image.reshape(16, 4).tolist() == expected
+
+
+def test_bc7_mode4_rotation_and_index_selection():
+    # 5-bit color and 6-bit alpha endpoints with 2-bit and 3-bit indices. The index selection bit interpolates the
+    # color with the 3-bit and the alpha with the 2-bit indices, and rotation 1 then swaps red and alpha.
+    colors = [(31, 0, 0), (0, 31, 16)]
+    alphas = [0, 63]
+    fields = [(5, 0x10), (2, 1), (1, 1)] + [(5, e[c]) for c in range(3) for e in colors] + [(6, a) for a in alphas]
+    indices2 = [i % 4 for i in range(16)]
+    indices3 = [i % 8 for i in range(16)]
+    block = _block(fields + _index_fields(indices2, 2) + _index_fields(indices3, 3))
+    image = bptc.decode_bc7(block, 4, 4)
+    colors = [(255, 0, 0), (0, 255, 132)]
+    for texel, (red_alpha, green, blue, alpha_red) in enumerate(image.reshape(16, 4).tolist()):
+        rgb = [_interpolate(a, b, 3, indices3[texel]) for a, b in zip(*colors)]
+        assert [alpha_red, green, blue] == rgb
+        assert red_alpha == _interpolate(0, 255, 2, indices2[texel])
+
+
+def test_bc7_invalid_mode():
+    # Blocks without a mode bit in their first byte decode to transparent black.
+    image = bptc.decode_bc7(bytes(16) + _block([(8, 0x40), (120, (1 << 120) - 1)]), 8, 4)
+    assert (image[:, :4] == 0).all() and (image[:, 4:] != 0).any()
+
+
+# ---- BC6H ----
+
+def _unquantize(value, bits, signed):
+    if signed:
+        magnitude = abs(value)
+        if magnitude == 0:
+            result = 0
+        elif magnitude >= (1 << (bits - 1)) - 1:
+            result = 0x7FFF
+        else:
+            result = ((magnitude << 15) + 0x4000) >> (bits - 1)
+        return -result if value < 0 else result
+    if value == 0:
+        return 0
+    if value == (1 << bits) - 1:
+        return 0xFFFF
+    return ((value << 16) + 0x8000) >> bits
+
+
+def _half_bits(value, signed):
+    # Scale an interpolated value to the bit pattern of the half float.
+    if not signed:
+        return (value * 31) >> 6
+    magnitude = (abs(value) * 31) >> 5
+    return magnitude | 0x8000 if value < 0 and magnitude else magnitude
+
+
+def _bc6h_expected(endpoints, partition, indices, bits, index_bits, signed):
+    unquantized = [[_unquantize(c, bits, signed) for c in e] for e in endpoints]
+    expected = []
+    for texel, subset in enumerate(partition):
+        e0, e1 = unquantized[2 * subset], unquantized[2 * subset + 1]
+        expected.append([_half_bits(_interpolate(a, b, index_bits, indices[texel]), signed) for a, b in zip(e0, e1)]
+                        + [0x3C00])
+    return expected
+
+
+def test_bc6h_mode11_unsigned():
+    # 1 subset with untransformed 10-bit endpoints and 4-bit indices.
+    endpoints = [(0, 512, 1023), (1023, 256, 1)]
+    fields = [(5, 0x03)] + [(10, c) for e in endpoints for c in e]
+    image = bptc.decode_bc6h(_block(fields + _index_fields(range(16), 4)), 4, 4)
+    assert image.shape == (4, 4, 4) and image.dtype == numpy.float16
+    bits = image.view(numpy.uint16).reshape(16, 4).tolist()
+    assert bits[0] == [0, 15887, 31743, 0x3C00]
+    assert bits == _bc6h_expected(endpoints, [0] * 16, range(16), 10, 4, False)
+
+
+def test_bc6h_mode11_signed():
+    endpoints = [(-511, 0, 100), (510, -100, -1)]
+    fields = [(5, 0x03)] + [(10, c) for e in endpoints for c in e]
+    image = bptc.decode_bc6h(_block(fields + _index_fields(range(16), 4)), 4, 4, signed=True)
+    bits = image.view(numpy.uint16).reshape(16, 4).tolist()
+    # The minimum value is clamped to the largest negative magnitude.
+    assert bits[0][0] == 0xFBFF and bits[0][1] == 0
+    assert bits == _bc6h_expected(endpoints, [0] * 16, range(16), 10, 4, True)
+    assert image[0, 0, 0] == -65504
+
+
+def test_bc6h_mode12_delta_transform():
+    # An 11-bit base endpoint and a 9-bit signed delta, which wraps around within the 11 bits.
+    base = (2000, 5, 1024)
+    deltas = (100, -10, -255)
+    fields = [(5, 0x07), (10, base[0]), (10, base[1]), (10, base[2]), (9, deltas[0]), (1, base[0] >> 10),
+              (9, deltas[1]), (1, base[1] >> 10), (9, deltas[2]), (1, base[2] >> 10)]
+    indices = [15 - i for i in range(16)]
+    indices[0] = 7
+    image = bptc.decode_bc6h(_block(fields + _index_fields(indices, 4)), 4, 4)
+    endpoints = [base, ((2000 + 100) & 0x7FF, (5 - 10) & 0x7FF, 1024 - 255)]
+    assert endpoints[1] == (52, 2043, 769)
+    bits = image.view(numpy.uint16).reshape(16, 4).tolist()
+    assert bits == _bc6h_expected(endpoints, [0] * 16, indices, 11, 4, False)
+
+
+def test_bc6h_mode9_partition():
+    # 2 subsets with untransformed 6-bit endpoints and 3-bit indices, using partition 17. The high bits of the second
+    # subset's green and blue channels are scattered through the block and left 0 here.
+    r, g, b = (10, 63, 1, 5), (20, 0, 15, 7), (30, 40, 2, 0)
+    fields = [(5, 0x1E), (6, r[0]), (4, 0), (6, g[0]), (4, 0), (6, b[0]), (4, 0), (6, r[1]), (4, g[2]), (6, g[1]),
+              (4, g[3]), (6, b[1]), (4, b[2]), (6, r[2]), (6, r[3]), (5, 17)]
+    indices = [i % 8 for i in range(16)]
+    image = bptc.decode_bc6h(_block(fields + _index_fields(indices, 3, ANCHORS_2_17)), 4, 4)
+    endpoints = list(zip(r, g, b))
+    bits = image.view(numpy.uint16).reshape(16, 4).tolist()
+    assert bits == _bc6h_expected(endpoints, PARTITION_2_17, indices, 6, 3, False)
+
+
+def test_bc6h_reserved_mode():
+    # Reserved modes decode to black with an alpha of 1.
+    image = bptc.decode_bc6h(_block([(5, 0x13), (123, (1 << 123) - 1)]), 4, 4)
+    assert (image == numpy.array([0, 0, 0, 1], numpy.float16)).all()
+
+
+def test_block_layout_and_cropping():
+    data = b"".join(_block([(7, 0x40)] + [(7, c) for c in (v, v, v, v, v, v, 127, 127)] + [(2, 0), (63, 0), (0, 0)])
+                    for v in (0, 40, 80, 127))
+    image = bptc.decode_bc7(data, 8, 8)
+    assert image[0, 0, 0] == 0 and image[0, 4, 0] == 80 and image[4, 0, 0] == 160 and image[7, 7, 0] == 254
+    assert (bptc.decode_bc7(data, 5, 6) == image[:6, :5]).all()
@@ -0,0 +1,40 @@
+import os
+from io_scene_bfres import catalog
+
+
+def _add_file(directory, name):
+    # Invalid files are cataloged with their parse error, which is enough to track them.
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, name), "wb") as file:
+        file.write(b"not a BFRES file")
+
+
+def _paths(database):
+    return sorted(path for path, in database.connection.execute("SELECT path FROM files"))
+
+
+def test_rescan_only_touches_own_directory(tmp_path):
+    # Wildcard characters and case differences in directory names must not match files of other directories.
+    directories = [str(tmp_path / name) for name in ("a_b", "axb", "Foo", "foo", "50%", "50x")]
+    for i, directory in enumerate(directories):
+        _add_file(directory, "file{}.bfres".format(i))
+    with catalog.Catalog(str(tmp_path / "catalog.db")) as database:
+        for directory in directories:
+            assert database.scan(directory, processes=1) == (1, 0)
+        paths = _paths(database)
+        assert len(paths) == len(directories)
+        for directory in directories:
+            assert database.scan(directory, processes=1) == (0, 0)
+        assert _paths(database) == paths
+        # Files removed from a directory are still removed from the catalog.
+        os.remove(os.path.join(directories[0], "file0.bfres"))
+        assert database.scan(directories[0], processes=1) == (0, 1)
+        assert _paths(database) == [path for path in paths if not path.startswith(directories[0] + os.sep)]
+
+
+def test_scan_records_parse_errors(tmp_path):
+    _add_file(str(tmp_path), "broken.szs")
+    with catalog.Catalog(str(tmp_path / "catalog.db")) as database:
+        database.scan(str(tmp_path), processes=1)
+        (error,), = database.connection.execute("SELECT error FROM files").fetchall()
+    assert error
@@ -0,0 +1,23 @@
+import numpy
+from io_scene_bfres import geometry
+
+
+def test_vertex_colors_unorm8():
+    colors = numpy.array([[0, 51, 255, 7], [255, 128, 1, 0]], numpy.uint8)
+    result = geometry.vertex_colors(colors)
+    assert result.dtype == numpy.float32 and result.shape == (2, 3)
+    assert numpy.allclose(result, [[0, 0.2, 1], [1, 128 / 255, 1 / 255]])
+
+
+def test_vertex_colors_snorm8():
+    # -127 and -128 both map to -1, and negative colors are clipped to 0.
+    colors = numpy.array([[127, 0, -127, 5], [-128, 64, -1, 0]], numpy.int8)
+    result = geometry.vertex_colors(colors)
+    assert result.dtype == numpy.float32
+    assert numpy.allclose(result, [[1, 0, 0], [0, 64 / 127, 0]])
+
+
+def test_vertex_colors_half_float():
+    colors = numpy.array([[0.5, 1.5, -0.25, 1], [0.25, 1, 0, 0]], numpy.float16)
+    result = geometry.vertex_colors(colors)
+    assert result.dtype == numpy.float32 and result.tolist() == [[0.5, 1, 0], [0.25, 1, 0]]
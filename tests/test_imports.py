@@ -0,0 +1,17 @@
+import os
+import subprocess
+import sys
+import pytest
+
+# Modules which are used on their own as libraries or tools, each imported first in a new interpreter to catch circular
+# imports hidden by the import order of the package.
+MODULES = ["bfres_file", "bfres_fmdl", "bfres_writer", "skeleton"]
+
+
+@pytest.mark.parametrize("module", MODULES)
+def test_import_standalone(module):
+    tests_directory = os.path.dirname(os.path.abspath(__file__))
+    code = "import sys; sys.path.insert(0, {!r}); import conftest; import io_scene_bfres.{}".format(tests_directory,
+                                                                                                   module)
+    process = subprocess.run([sys.executable, "-c", code], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    assert process.returncode == 0, process.stderr.decode()
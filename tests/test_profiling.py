@@ -0,0 +1,15 @@
+import numpy
+import pytest
+import sys
+from io_scene_bfres import profiling
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux") and sys.platform != "win32",
+                    reason="resident memory is only queried on Linux and Windows")
+def test_resident_memory():
+    # Touching newly allocated pages increases the resident memory, unlike only reserving them.
+    before = profiling.resident_memory()
+    data = numpy.ones(64 * 1024 * 1024, numpy.uint8)
+    after = profiling.resident_memory()
+    assert before > 0 and after - before >= 48 * 1024 * 1024
+    del data
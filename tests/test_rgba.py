@@ -0,0 +1,48 @@
+import numpy
+from io_scene_bfres import rgba
+
+
+def test_r8_g8_b8_a8():
+    data = bytes(range(32))
+    image = rgba.decode_r8_g8_b8_a8(data, 4, 2)
+    assert image.shape == (2, 4, 4) and image.dtype == numpy.uint8
+    assert image[0, 0].tolist() == [0, 1, 2, 3] and image[1, 3].tolist() == [28, 29, 30, 31]
+    # The pixels are a copy which can be modified.
+    image[0, 0, 0] = 99
+    assert data[0] == 0
+
+
+def test_r5_g6_b5():
+    # The channels are expanded to 8 bits by replicating their highest bits.
+    texels = [0xF800, 0x07E0, 0x001F, 0x8410, 0x0000, 0xFFFF]
+    image = rgba.decode_r5_g6_b5(numpy.array(texels, "<u2").tobytes(), 3, 2)
+    assert image.reshape(-1, 4).tolist() == [[255, 0, 0, 255], [0, 255, 0, 255], [0, 0, 255, 255],
+                                             [132, 130, 132, 255], [0, 0, 0, 255], [255, 255, 255, 255]]
+
+
+def test_r8():
+    image = rgba.decode_r8(bytes([0, 1, 128, 255]), 2, 2)
+    assert image.reshape(-1, 4).tolist() == [[0, 0, 0, 255], [1, 0, 0, 255], [128, 0, 0, 255], [255, 0, 0, 255]]
+
+
+def test_r8_g8():
+    image = rgba.decode_r8_g8(bytes([1, 2, 3, 4]), 2, 1)
+    assert image.reshape(-1, 4).tolist() == [[1, 2, 0, 255], [3, 4, 0, 255]]
+
+
+def test_remap_channels():
+    pixels = numpy.array([[[10, 20, 30, 40]]], numpy.uint8)
+    assert rgba.remap_channels(pixels, rgba.IDENTITY) is pixels
+    selectors = (rgba.SELECT_ALPHA, rgba.SELECT_ONE, rgba.SELECT_RED, rgba.SELECT_ZERO)
+    assert rgba.remap_channels(pixels, selectors).tolist() == [[[40, 255, 10, 0]]]
+    # A single channel can be replicated, like the red channel of R8 textures to grayscale.
+    selectors = (rgba.SELECT_RED, rgba.SELECT_RED, rgba.SELECT_RED, rgba.SELECT_GREEN)
+    assert rgba.remap_channels(pixels, selectors).tolist() == [[[10, 10, 10, 20]]]
+
+
+def test_remap_channels_float():
+    # The constant 1 selector is 1.0 for float pixels, like the half float output of BC6H.
+    pixels = numpy.array([[[0.5, 2, -1, 1]]], numpy.float16)
+    selectors = (rgba.SELECT_BLUE, rgba.SELECT_ZERO, rgba.SELECT_ONE, rgba.SELECT_RED)
+    result = rgba.remap_channels(pixels, selectors)
+    assert result.dtype == numpy.float16 and result.tolist() == [[[-1, 0, 1, 0.5]]]
@@ -0,0 +1,111 @@
+import io
+import numpy
+import os
+from types import SimpleNamespace
+from io_scene_bfres import texture_cache
+
+
+def _texture(data=b"\1\2\3\4" * 16, **fields):
+    tex = SimpleNamespace(name="tex", data=data, format=0x0b01, width=4, height=4, tileMode=0, sizeRange=4,
+                          alignment=512, numFaces=1, channelSels=[2, 3, 4, 5])
+    tex.__dict__.update(fields)
+    return tex
+
+
+def _pixels(value, size=16):
+    return numpy.full((size, size, 4), value, numpy.uint8)
+
+
+def _entry_size(pixels):
+    file = io.BytesIO()
+    numpy.save(file, pixels)
+    return len(file.getvalue())
+
+
+def _files(directory):
+    return sorted(os.listdir(str(directory)))
+
+
+def test_key_stability():
+    key = texture_cache.texture_key(_texture())
+    assert key == texture_cache.texture_key(_texture())
+    # The name does not matter, but the data and everything influencing the decoding does.
+    assert key == texture_cache.texture_key(_texture(name="other"))
+    assert key == texture_cache.texture_key(_texture(data=memoryview(b"\1\2\3\4" * 16)))
+    changed = [_texture(data=b"\0" * 64), _texture(format=0x0b06), _texture(width=8), _texture(tileMode=1),
+               _texture(channelSels=[2, 2, 2, 5])]
+    keys = {texture_cache.texture_key(tex) for tex in changed}
+    assert len(keys) == len(changed) and key not in keys
+
+
+def test_hit_and_miss(tmp_path):
+    cache = texture_cache.TextureCache(str(tmp_path), 1 << 20)
+    assert cache.get("a") is None
+    cache.put("a", _pixels(1))
+    assert (cache.get("a") == _pixels(1)).all()
+    # Another cache on the same directory, like the one of a later import, sees the entry.
+    assert (texture_cache.TextureCache(str(tmp_path), 1 << 20).get("a") == _pixels(1)).all()
+    # Entries removed by another import are misses.
+    os.remove(str(tmp_path / "a.npy"))
+    assert cache.get("a") is None and cache._size == 0
+
+
+def test_lru_eviction(tmp_path):
+    entry_size = _entry_size(_pixels(0))
+    cache = texture_cache.TextureCache(str(tmp_path), 3 * entry_size)
+    for key in "abc":
+        cache.put(key, _pixels(ord(key)))
+    assert _files(tmp_path) == ["a.npy", "b.npy", "c.npy"]
+    # A hit makes the entry the most recently used one, so the next one is evicted first.
+    cache.get("a")
+    cache.put("d", _pixels(4))
+    assert _files(tmp_path) == ["a.npy", "c.npy", "d.npy"]
+    cache.put("e", _pixels(5))
+    assert _files(tmp_path) == ["a.npy", "d.npy", "e.npy"]
+    assert cache._size == 3 * entry_size
+    # An entry larger than the budget is still kept as the newest.
+    cache.put("big", _pixels(6, 64))
+    assert _files(tmp_path) == ["big.npy"]
+
+
+def test_lru_order_restored_from_modification_times(tmp_path):
+    entry_size = _entry_size(_pixels(0))
+    cache = texture_cache.TextureCache(str(tmp_path), 3 * entry_size)
+    for key in "abc":
+        cache.put(key, _pixels(ord(key)))
+    for time, key in enumerate("bca"):
+        os.utime(str(tmp_path / (key + ".npy")), (1000 + time, 1000 + time))
+    cache = texture_cache.TextureCache(str(tmp_path), 3 * entry_size)
+    assert list(cache._entries) == ["b", "c", "a"] and cache._size == 3 * entry_size
+    cache.put("d", _pixels(4))
+    assert _files(tmp_path) == ["a.npy", "c.npy", "d.npy"]
+
+
+def test_atomic_write(tmp_path, monkeypatch):
+    cache = texture_cache.TextureCache(str(tmp_path), 1 << 20)
+    replace = os.replace
+    moves = []
+
+    def checked_replace(source, destination):
+        # The entry only appears when the fully written temporary file is renamed.
+        assert not os.path.exists(destination)
+        assert (numpy.load(source) == _pixels(1)).all()
+        moves.append((os.path.dirname(source), destination))
+        replace(source, destination)
+
+    monkeypatch.setattr(texture_cache.os, "replace", checked_replace)
+    cache.put("a", _pixels(1))
+    assert moves == [(str(tmp_path), str(tmp_path / "a.npy"))]
+    assert _files(tmp_path) == ["a.npy"]
+
+
+def test_failed_write(tmp_path, monkeypatch):
+    cache = texture_cache.TextureCache(str(tmp_path), 1 << 20)
+
+    def failing_replace(source, destination):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(texture_cache.os, "replace", failing_replace)
+    cache.put("a", _pixels(1))
+    # The temporary file is removed and the entry is not recorded.
+    assert _files(tmp_path) == [] and cache.get("a") is None and cache._size == 0
@@ -0,0 +1,48 @@
+import numpy
+import pytest
+from io_scene_bfres import vertex_cache
+
+
+def _grid_triangles(size, seed=0):
+    # Return the shuffled triangles of a regular grid of size x size vertices.
+    grid = numpy.arange(size * size).reshape(size, size)
+    corners = [grid[:-1, :-1], grid[1:, :-1], grid[:-1, 1:], grid[1:, :-1], grid[1:, 1:], grid[:-1, 1:]]
+    triangles = numpy.stack(corners, -1).reshape(-1, 3)
+    return triangles[numpy.random.RandomState(seed).permutation(len(triangles))].ravel().astype(numpy.uint16)
+
+
+def _triangle_list(indices):
+    return sorted(map(tuple, numpy.asarray(indices).reshape(-1, 3).tolist()))
+
+
+def test_acmr():
+    assert vertex_cache.acmr([0, 1, 2]) == 3
+    assert vertex_cache.acmr([0, 1, 2, 2, 1, 3]) == 2
+    # Vertices pushed out of the FIFO cache are transformed again.
+    assert vertex_cache.acmr([0, 1, 2, 3, 4, 5, 0, 1, 2], cache_size=3) == 3
+
+
+@pytest.mark.parametrize("chunk_size", [None, 200])
+def test_optimize_triangles(chunk_size):
+    indices = _grid_triangles(60)
+    optimized = vertex_cache.optimize_triangles(indices, chunk_size=chunk_size)
+    assert optimized.dtype == indices.dtype and optimized.shape == indices.shape
+    # The same triangles are kept with their vertex order, so the winding does not change.
+    assert _triangle_list(optimized) == _triangle_list(indices)
+    before = vertex_cache.acmr(indices)
+    after = vertex_cache.acmr(optimized)
+    assert before > 2 and after < 0.85
+
+
+def test_optimize_small_inputs():
+    assert vertex_cache.optimize_triangles(numpy.array([], numpy.uint16)).size == 0
+    assert vertex_cache.optimize_triangles([2, 1, 0]).tolist() == [2, 1, 0]
+
+
+def test_reorder_vertices():
+    indices = numpy.array([5, 3, 7, 3, 7, 0], numpy.uint16)
+    new_indices, order = vertex_cache.reorder_vertices(indices, 9)
+    # Vertices are numbered in the order of their first use, followed by the unused ones.
+    assert new_indices.tolist() == [0, 1, 2, 1, 2, 3]
+    assert order.tolist() == [5, 3, 7, 0, 1, 2, 4, 6, 8]
+    assert numpy.array_equal(order[new_indices], indices)